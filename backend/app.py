@@ -1,53 +1,88 @@
 import os
 import io
+import logging
 import wave
-import speech_recognition as sr
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Request, status
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from main import get_session_analysis
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any, Union
 import tempfile
 import subprocess
-import os
-import wave
-import speech_recognition as sr
 import uuid
 import json
+import asyncio
 import requests
+import shutil
+import threading
+import time
 from datetime import datetime
-from audio_analysis import audio_analyzer
+from audio_analysis import AnalysisCancelled, audio_analyzer
+from services.admission import AdmissionRejected, Ticket, admission_controller, audio_duration
+from services.analysis_store import DEBATE, SCORE_LABELS, SPEECH, analysis_store
+from services.context_index import context_index
 from services.debate_service import debate_service
+from services.inference_scheduler import BATCH, INTERACTIVE, NORMAL, analysis_scheduler
+from services.job_queue import Job, JobManager, JobStore, check_callback_url
+from services.quality_governor import quality_governor
+from services.llm_client import LLMUnavailableError, llm_client
+from services import runtime_config
+from services.rate_limiter import AsyncTokenBucket
+from services.singleflight import SingleFlight, text_hash
+from services.structured_logging import configure_logging, dropped_records, request_context
+from services.structured_output import SpeechFeedback, StructuredOutputError, parse_structured
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
+configure_logging()
 
-# Initialize OpenAI client for OpenRouter
-from openai import OpenAI
+logger = logging.getLogger(__name__)
 
-openai_client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.getenv("OPENROUTER_API_KEY"),
-    default_headers={
-        "HTTP-Referer": "http://localhost:3000",
-        "X-Title": "Reherz Speak Coach"
-    }
+# A debate round only needs the words and the delivery metrics built from them;
+# tone and tempo (wav2vec2 and beat tracking) are left out of the round's latency
+DEBATE_ROUND_METRICS = ["transcript", "prosody", "fillers"]
+
+# Models tried in order for speech feedback
+FEEDBACK_MODELS = [
+    model.strip()
+    for model in os.getenv("FEEDBACK_MODELS", "openai/gpt-4-turbo-preview").split(",")
+    if model.strip()
+]
+
+# Identical feedback requests that arrive while one is pending share its result
+feedback_requests = SingleFlight()
+
+# Batch scoring limits; the rate budget is shared by all batches in this process
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "200"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+batch_rate_limiter = AsyncTokenBucket(
+    rate=float(os.getenv("BATCH_RATE_LIMIT_RPS", "2")),
+    burst=int(os.getenv("BATCH_RATE_LIMIT_BURST", "4"))
 )
 
-# Initialize recognizer
-recognizer = sr.Recognizer()
+# Background analysis jobs for long recordings. A job runs in the worker that
+# accepted it; its state is shared through SQLite so any worker can report on
+# or cancel it
+audio_jobs = JobManager(
+    workers=int(os.getenv("AUDIO_JOB_WORKERS", "1")),
+    max_finished=int(os.getenv("JOB_MAX_FINISHED", "100")),
+    ttl=float(os.getenv("JOB_RESULT_TTL_SECONDS", "3600")),
+    store=JobStore()
+)
 
 # Models
 class DebateStartRequest(BaseModel):
     topic: str
     user_side: str  # 'affirmative' or 'negative'
     total_rounds: int = 3  # Default to 3 rounds
+    context_id: Optional[str] = None  # Uploaded notes to check the rounds against
 
 class DebateRoundRequest(BaseModel):
     session_id: str
     transcript: Optional[str] = None
+    user_id: Optional[str] = None  # Whose history the round is recorded under
     audio_file: Optional[UploadFile] = None
 
 class DebateAnalysisResponse(BaseModel):
@@ -68,6 +103,19 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Request ids and per-endpoint log sampling for everything below
+app.middleware("http")(request_context)
+
+@app.on_event("startup")
+async def warm_up_models():
+    """Build the emotion model's graphs in each worker before it takes requests"""
+    if runtime_config.applied_config is None:
+        # Not started through gunicorn.conf.py (e.g. plain uvicorn): one worker, no pinning
+        logger.info("Worker runtime: %s", runtime_config.configure_worker(workers=1))
+    try:
+        await asyncio.to_thread(audio_analyzer.warm_up)
+    except Exception as e:
+        logger.warning("Model warm-up failed, graphs will be built on first use: %s", e)
 
 class ScoreItem(BaseModel):
     metric: str
@@ -84,14 +132,27 @@ class AIResponseRequest(BaseModel):
     transcript: str
     mode: str = 'general'
     type: str = 'speech'
+    context_id: Optional[str] = None  # Uploaded notes to check the speech against
+
+class ContextDocumentRequest(BaseModel):
+    text: str
+    title: Optional[str] = None
+    context_id: Optional[str] = None  # Add to an existing context; a new one is created if omitted
 
 class AIResponse(BaseModel):
     status: str
     response: Optional[Dict[str, Any]] = None
     message: Optional[str] = None
 
-def convert_audio(input_path: str, output_path: str) -> bool:
-    """Convert audio file to WAV format using ffmpeg."""
+class BatchAIResponseItem(AIResponseRequest):
+    id: Optional[str] = None  # Echoed back so clients can match results
+
+class BatchAIResponseRequest(BaseModel):
+    items: List[BatchAIResponseItem]
+    concurrency: Optional[int] = None  # Capped at BATCH_MAX_CONCURRENCY
+
+def convert_audio(input_path: str, output_path: str, cancel_event: Optional[threading.Event] = None) -> bool:
+    """Convert audio file to WAV format using ffmpeg, killing it if cancel_event is set."""
     try:
         cmd = [
             'ffmpeg',
@@ -102,19 +163,121 @@ def convert_audio(input_path: str, output_path: str) -> bool:
             '-y',  # Overwrite output file if it exists
             output_path
         ]
-        subprocess.run(cmd, check=True, capture_output=True)
+        if cancel_event is None:
+            subprocess.run(cmd, check=True, capture_output=True)
+            return True
+        
+        with tempfile.TemporaryFile() as stderr:
+            proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=stderr)
+            while proc.poll() is None:
+                if cancel_event.wait(0.1):
+                    proc.kill()
+                    proc.wait()
+                    raise AnalysisCancelled("Audio conversion cancelled")
+            if proc.returncode != 0:
+                stderr.seek(0)
+                raise subprocess.CalledProcessError(proc.returncode, cmd, stderr=stderr.read())
         return True
     except subprocess.CalledProcessError as e:
-        print(f"Error converting audio: {e.stderr.decode()}")
+        logger.error("Error converting audio: %s", e.stderr.decode())
         return False
-    except Exception as e:
-        print(f"Unexpected error in convert_audio: {str(e)}")
+    except AnalysisCancelled:
+        raise
+    except Exception:
+        logger.exception("Unexpected error in convert_audio")
         return False
 
+def format_analysis_response(analysis_result: Dict[str, Any]) -> Dict[str, Any]:
+    """Lift transcript and word count out of a successful analysis for the client."""
+    if analysis_result["status"] != "success":
+        return analysis_result
+    transcript = analysis_result["analysis"].pop("transcript", "")
+    word_count = analysis_result["analysis"].pop("word_count", 0)
+    return {
+        "status": "success",
+        "transcript": transcript,
+        "word_count": word_count,
+        "analysis": analysis_result["analysis"]
+    }
+
+def parse_metrics(metrics: Optional[str]) -> Optional[List[str]]:
+    """Split a comma separated metrics parameter, rejecting unknown names with a 400."""
+    if not metrics:
+        return None
+    names = [name.strip() for name in metrics.split(",") if name.strip()]
+    try:
+        audio_analyzer.stage_graph.resolve(names)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return names
+
+def run_audio_job(job: Job, temp_dir: str, metrics: Optional[List[str]] = None,
+                  user_id: Optional[str] = None) -> Dict[str, Any]:
+    """Convert and analyze an uploaded recording inside a background job."""
+    input_path = os.path.join(temp_dir, "input.opus")
+    wav_path = os.path.join(temp_dir, "output.wav")
+    
+    job.report("converting", 0.0)
+    if not convert_audio(input_path, wav_path, job.cancel_event):
+        raise RuntimeError("Failed to convert audio format")
+    
+    job.report("waiting for analysis slot", 0.0)
+    with analysis_scheduler.slot(BATCH, job.cancel_event):
+        analysis_result = audio_analyzer.analyze_audio(
+            wav_path,
+            progress=job.report,
+            cancel_event=job.cancel_event,
+            metrics=metrics
+        )
+    if analysis_result["status"] != "success":
+        raise RuntimeError(analysis_result.get("message", "Analysis failed"))
+    analysis_store.record(user_id, SPEECH, analysis_result["analysis"])
+    return format_analysis_response(analysis_result)
+
+def analyze_admitted(ticket: Ticket, priority: str, wav_path: str,
+                     metrics: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Analyze in a scheduler slot, then hand the ticket back with the observed service time.
+
+    Quality adapts to load, so the ticket is re-attributed to whichever ASR
+    model actually ran before its timing is learned from.
+    """
+    service_seconds = None
+    try:
+        with analysis_scheduler.slot(priority):
+            admission_controller.start(ticket)
+            started = time.monotonic()
+            try:
+                result = audio_analyzer.analyze_audio(wav_path, adaptive=True, metrics=metrics)
+            finally:
+                service_seconds = time.monotonic() - started
+            ticket.model = result.get("analysis", {}).get("asr_model", ticket.model)
+            return result
+    finally:
+        admission_controller.release(ticket, service_seconds)
+
+def admission_error(e: AdmissionRejected) -> HTTPException:
+    """429 with Retry-After while the server is busy; 413 when the audio could never fit."""
+    if e.retry_after is None:
+        return HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"{e}. Submit it to /api/jobs/process-audio instead."
+        )
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
 @app.post("/api/process-audio")
-async def process_audio(file: UploadFile = File(...)):
-    """Process uploaded audio file and return transcription."""
-    print(f"Received file: {file.filename}, content type: {file.content_type}")
+async def process_audio(file: UploadFile = File(...), metrics: Optional[str] = None,
+                        user_id: Optional[str] = None):
+    """Process uploaded audio file and return transcription.
+    
+    metrics is an optional comma separated list of analysis stages to run
+    (e.g. transcript,fillers); only those and the stages they depend on run.
+    """
+    requested_metrics = parse_metrics(metrics)
+    logger.info("Received file: %s, content type: %s", file.filename, file.content_type)
     
     # Create a temporary directory for processing
     with tempfile.TemporaryDirectory() as temp_dir:
@@ -122,41 +285,38 @@ async def process_audio(file: UploadFile = File(...)):
         wav_path = os.path.join(temp_dir, "output.wav")
         
         try:
+            # Turn the request away before reading it if the queue is already too deep
+            admission_controller.check(NORMAL)
+            
             # Save the uploaded file
             with open(input_path, 'wb') as f:
                 content = await file.read()
                 f.write(content)
             
-            print(f"Saved input file to: {input_path} ({len(content)} bytes)")
+            logger.debug("Saved input file to: %s (%d bytes)", input_path, len(content))
             
             # Convert to WAV format
             if not convert_audio(input_path, wav_path):
                 return {"status": "error", "message": "Failed to convert audio format"}
             
-            print(f"Converted audio to WAV format: {wav_path}")
+            logger.debug("Converted audio to WAV format: %s", wav_path)
+            
+            ticket = admission_controller.admit(
+                audio_duration(wav_path), audio_analyzer.asr_model_name, NORMAL
+            )
             
             # Perform comprehensive audio analysis
-            analysis_result = audio_analyzer.analyze_audio(wav_path)
+            analysis_result = await asyncio.to_thread(analyze_admitted, ticket, NORMAL, wav_path, requested_metrics)
             
             if analysis_result["status"] == "success":
-                print("Audio analysis completed successfully")
-                # Extract transcript and word count before removing them from analysis
-                transcript = analysis_result["analysis"].pop("transcript", "")
-                word_count = analysis_result["analysis"].pop("word_count", 0)
-                
-                return {
-                    "status": "success",
-                    "transcript": transcript,
-                    "word_count": word_count,
-                    "analysis": analysis_result["analysis"]
-                }
-            else:
-                return analysis_result
+                logger.info("Audio analysis completed successfully")
+                await asyncio.to_thread(analysis_store.record, user_id, SPEECH, analysis_result["analysis"])
+            return format_analysis_response(analysis_result)
                 
+        except AdmissionRejected as e:
+            raise admission_error(e)
         except Exception as e:
-            print(f"Error in process_audio: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error in process_audio")
             return {"status": "error", "message": f"An error occurred: {str(e)}"}
 
 @app.get("/")
@@ -165,25 +325,152 @@ async def root():
         "message": "Reherz Speak Coach Backend is running",
         "version": "1.0.0",
         "endpoints": [
-            "POST /api/process-audio - Process audio and return transcript with analysis",
-            "POST /api/analysis - Get session analysis (legacy)",
+            "POST /api/process-audio - Process audio and return transcript with analysis (?metrics=transcript,fillers to run only some stages)",
+            "POST /api/jobs/process-audio - Queue a long recording for background analysis",
+            "GET /api/jobs/{job_id} - Poll job status and progress",
+            "GET /api/jobs/{job_id}/result - Fetch a finished job's analysis",
+            "DELETE /api/jobs/{job_id} - Cancel a queued or running job",
+            "POST /api/analysis - Latest analysed session for a user (sample data until one exists)",
+            "GET /api/analytics - Per-user trends, rolling averages and percentile ranks",
+            "POST /api/context - Upload presentation or debate notes for feedback to draw on",
+            "GET /api/context/{context_id} - List the documents in a context",
+            "DELETE /api/context/{context_id} - Delete a context and its documents",
             "POST /api/debate/start - Start a new debate session",
-            "POST /api/debate/round - Submit a debate round"
+            "POST /api/debate/round - Submit a debate round",
+            "POST /api/generate-ai-response/batch - Score many transcripts, streamed as NDJSON",
+            "GET /api/metrics/llm - Per-model LLM latency and error counts",
+            "GET /api/metrics/analysis - Analysis queue wait, admission stats and quality level over time",
+            "GET /api/metrics/logging - Log records dropped by this worker's background log writer",
+            "GET /api/models - Whether each analysis model is loaded, idle or being reloaded"
         ]
     }
 
-# Analysis Endpoint
-app.add_api_route("/api/analysis", get_session_analysis, methods=["POST"])
+# Audio Job Endpoints
+@app.post("/api/jobs/process-audio", status_code=status.HTTP_202_ACCEPTED)
+async def submit_audio_job(file: UploadFile = File(...), callback_url: Optional[str] = Form(None),
+                           metrics: Optional[str] = Form(None), user_id: Optional[str] = Form(None)):
+    """Queue an uploaded recording for analysis and return a job to poll."""
+    requested_metrics = parse_metrics(metrics)
+    if callback_url:
+        try:
+            await asyncio.to_thread(check_callback_url, callback_url)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    # The upload outlives this request, so the job owns (and removes) its directory
+    temp_dir = tempfile.mkdtemp(prefix="reherz-job-")
+    try:
+        with open(os.path.join(temp_dir, "input.opus"), 'wb') as f:
+            f.write(await file.read())
+    except Exception:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+    
+    job = await asyncio.to_thread(
+        audio_jobs.submit,
+        "process-audio",
+        run_audio_job,
+        temp_dir,
+        requested_metrics,
+        user_id,
+        callback_url=callback_url,
+        cleanup=lambda: shutil.rmtree(temp_dir, ignore_errors=True)
+    )
+    return {
+        **job.to_dict(),
+        "status_url": f"/api/jobs/{job.id}",
+        "result_url": f"/api/jobs/{job.id}/result"
+    }
+
+async def get_job_or_404(job_id: str) -> Job:
+    job = await asyncio.to_thread(audio_jobs.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
+
+@app.get("/api/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    return (await get_job_or_404(job_id)).to_dict()
+
+@app.get("/api/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    job = await get_job_or_404(job_id)
+    if not job.finished:
+        raise HTTPException(status_code=409, detail=f"Job is still {job.status}")
+    return {**job.to_dict(), "result": job.result}
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    await get_job_or_404(job_id)
+    return (await asyncio.to_thread(audio_jobs.cancel, job_id)).to_dict()
+
+# Analysis Endpoints
+@app.post("/api/analysis", response_model=SessionAnalysisResponse)
+async def session_analysis(user_id: Optional[str] = None):
+    """The user's most recent analysed session, or the sample analysis if there is none yet."""
+    try:
+        latest = await asyncio.to_thread(analysis_store.latest, user_id)
+    except Exception as e:
+        logger.warning("Error reading analysis history: %s", e)
+        latest = None
+    if latest is None:
+        return await get_session_analysis()
+    
+    scores = [
+        ScoreItem(metric=label, value=latest[column], max_value=100)
+        for column, label in SCORE_LABELS.items()
+        if latest[column] is not None
+    ]
+    return SessionAnalysisResponse(
+        transcript=latest["transcript"] or "",
+        summary=latest["summary"] or "",
+        overall_score=latest["overall_score"] or 0.0,
+        scores=scores
+    )
+
+@app.get("/api/analytics")
+async def analysis_analytics(user_id: Optional[str] = None, session_type: str = SPEECH,
+                             window: int = 5, limit: int = 50):
+    """Trends, rolling averages and percentile ranks over a user's analysed sessions."""
+    if session_type not in (SPEECH, DEBATE):
+        raise HTTPException(status_code=400, detail=f"session_type must be {SPEECH} or {DEBATE}")
+    return await asyncio.to_thread(
+        analysis_store.analytics, user_id, session_type, max(1, window), max(1, min(limit, 1000))
+    )
+
+# Context Endpoints
+@app.post("/api/context")
+async def upload_context(request: ContextDocumentRequest):
+    """Index a notes document; pass the returned context_id with feedback requests to use it."""
+    try:
+        return await asyncio.to_thread(context_index.add_document, request.text, request.context_id, request.title)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/context/{context_id}")
+async def get_context(context_id: str):
+    documents = await asyncio.to_thread(context_index.documents, context_id)
+    if not documents:
+        raise HTTPException(status_code=404, detail="Context not found")
+    return {"context_id": context_id, "documents": documents}
+
+@app.delete("/api/context/{context_id}")
+async def delete_context(context_id: str):
+    deleted = await asyncio.to_thread(context_index.delete, context_id)
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Context not found")
+    return {"context_id": context_id, "deleted_documents": deleted}
 
 # Debate Endpoints
-@app.post("/api/debate/start", response_model=Dict[str, str])
+@app.post("/api/debate/start", response_model=Dict[str, Any])
 async def start_debate(request: DebateStartRequest):
     """Start a new debate session"""
     try:
         session_id = debate_service.start_debate_session(
             topic=request.topic,
             user_side=request.user_side,
-            total_rounds=request.total_rounds
+            total_rounds=request.total_rounds,
+            context_id=request.context_id
         )
         return {
             "status": "success",
@@ -199,39 +486,64 @@ async def start_debate(request: DebateStartRequest):
 async def process_debate_round(request: Request, round_request: DebateRoundRequest = None, audio_file: UploadFile = None):
     """Process a debate round with either text transcript or audio file"""
     try:
+        audio_metrics = None
+        
         # Handle form data (for file uploads)
         if not round_request:
             form_data = await request.form()
             round_request = DebateRoundRequest(
                 session_id=form_data.get("session_id"),
-                transcript=form_data.get("transcript")
+                transcript=form_data.get("transcript"),
+                user_id=form_data.get("user_id")
             )
             audio_file = form_data.get("audio_file")
         
         # If audio file is provided, transcribe it
         if audio_file and hasattr(audio_file, 'file'):
+            admission_controller.check(INTERACTIVE)
             with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_audio:
                 content = await audio_file.read()
                 temp_audio.write(content)
                 temp_audio_path = temp_audio.name
             
             try:
-                # Use existing audio analysis to get transcript
-                analysis = audio_analyzer.analyze_audio(temp_audio_path)
+                # Use existing audio analysis to get transcript and delivery metrics
+                ticket = admission_controller.admit(
+                    audio_duration(temp_audio_path), audio_analyzer.asr_model_name, INTERACTIVE
+                )
+                analysis = await asyncio.to_thread(
+                    analyze_admitted, ticket, INTERACTIVE, temp_audio_path, DEBATE_ROUND_METRICS
+                )
                 if analysis["status"] == "success":
-                    round_request.transcript = analysis["analysis"].get("transcript", "")
-            except Exception as e:
-                print(f"Error in audio analysis: {str(e)}")
+                    audio_metrics = analysis["analysis"]
+                    round_request.transcript = audio_metrics.get("transcript", "")
+            except AdmissionRejected:
+                raise
+            except Exception:
+                logger.exception("Error in audio analysis")
             finally:
                 os.unlink(temp_audio_path)
         
         if not round_request.transcript:
             raise HTTPException(status_code=400, detail="No transcript provided and could not transcribe audio")
         
+        async def record_round(result: Dict[str, Any], coach_score: Optional[float]):
+            # Called once per newly scored round, so retries and fallbacks are not stored
+            await asyncio.to_thread(
+                analysis_store.record,
+                round_request.user_id,
+                DEBATE,
+                audio_metrics or {"transcript": round_request.transcript},
+                round_request.session_id,
+                coach_score
+            )
+        
         # Process the round with the debate service
         result = await debate_service.process_round(
             round_request.session_id,
-            round_request.transcript
+            round_request.transcript,
+            audio_metrics,
+            on_scored=record_round
         )
         
         return {
@@ -243,17 +555,29 @@ async def process_debate_round(request: Request, round_request: DebateRoundReque
             "overall_score": result.get('overall_score')
         }
         
+    except HTTPException:
+        raise
+    except AdmissionRejected as e:
+        raise admission_error(e)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except LLMUnavailableError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except StructuredOutputError as e:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=str(e))
     except Exception as e:
-        print(f"Error in process_debate_round: {str(e)}")
+        logger.exception("Error in process_debate_round")
         raise HTTPException(status_code=500, detail=str(e))
 
 async def generate_ai_feedback(transcript: str, mode: str, speech_type: str, 
                             round_number: int, total_rounds: int, 
-                            analysis_data: Dict[str, Any] = None) -> Dict[str, Any]:
+                            analysis_data: Dict[str, Any] = None,
+                            context_id: Optional[str] = None) -> Dict[str, Any]:
     """Generate AI feedback using OpenRouter with debate context."""
     try:
+        # Only the passages of the speaker's notes that match this speech, within a fixed budget
+        notes = await asyncio.to_thread(context_index.prompt_section, context_id, transcript)
+        
         # Prepare analysis metrics for the prompt
         metrics = ""
         if analysis_data:
@@ -280,6 +604,8 @@ async def generate_ai_feedback(transcript: str, mode: str, speech_type: str,
             {transcript}
             {metrics}
             
+            {notes}
+            
             Your response must be a valid JSON object with these exact fields:
             - suggestions: List of 3-5 specific, actionable suggestions for improvement
             - feedback: A detailed paragraph of feedback focusing on both content and delivery
@@ -299,6 +625,8 @@ async def generate_ai_feedback(transcript: str, mode: str, speech_type: str,
             
             {transcript}
             
+            {notes}
+            
             Your response should be a JSON object with these fields:
             - suggestions: List of 3-5 specific suggestions for improvement
             - feedback: A detailed paragraph of feedback
@@ -306,52 +634,51 @@ async def generate_ai_feedback(transcript: str, mode: str, speech_type: str,
             """
         
         # Call the OpenRouter API
-        response = openai_client.chat.completions.create(
-            model="openai/gpt-4-turbo-preview",
-            messages=[
+        content = await llm_client.complete(
+            [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
             ],
+            models=FEEDBACK_MODELS,
             response_format={"type": "json_object"},
             temperature=0.7,
             max_tokens=1000
         )
         
-        # Parse the response
-        content = response.choices[0].message.content
-        feedback_data = json.loads(content)
-        
-        # Ensure all required fields are present
-        if not all(key in feedback_data for key in ['suggestions', 'feedback', 'score']):
-            raise ValueError("Invalid response format from AI model")
+        # Parse the response; raises if the required fields are missing
+        feedback_data = parse_structured(content, SpeechFeedback)
             
         return {
             "status": "success",
-            "response": {
-                "suggestions": feedback_data["suggestions"],
-                "feedback": feedback_data["feedback"],
-                "score": feedback_data["score"]
-            }
+            "response": feedback_data.model_dump()
         }
         
+    except LLMUnavailableError:
+        raise
     except Exception as e:
-        print(f"Error generating AI feedback: {str(e)}")
+        logger.exception("Error generating AI feedback")
         return {
             "status": "error",
             "message": f"Failed to generate AI feedback: {str(e)}"
         }
 
+async def coalesced_ai_feedback(request: AIResponseRequest) -> Dict[str, Any]:
+    """Generate feedback, sharing the call with identical requests already in flight."""
+    key = ('feedback', text_hash(request.transcript), request.mode, request.type, request.context_id)
+    return await feedback_requests.do(key, lambda: generate_ai_feedback(
+        transcript=request.transcript,
+        mode=request.mode,
+        speech_type=request.type,
+        round_number=1,  # Default to round 1 if not specified
+        total_rounds=3,  # Default to 3 rounds if not specified
+        context_id=request.context_id
+    ))
+
 @app.post("/api/generate-ai-response", response_model=AIResponse)
 async def generate_ai_response(request: AIResponseRequest):
     """Generate AI-powered feedback for the given transcript."""
     try:
-        result = await generate_ai_feedback(
-            transcript=request.transcript,
-            mode=request.mode,
-            speech_type=request.type,
-            round_number=1,  # Default to round 1 if not specified
-            total_rounds=3   # Default to 3 rounds if not specified
-        )
+        result = await coalesced_ai_feedback(request)
         
         if result["status"] == "error":
             raise HTTPException(
@@ -364,13 +691,99 @@ async def generate_ai_response(request: AIResponseRequest):
             "response": result["response"]
         }
         
+    except HTTPException:
+        raise
+    except LLMUnavailableError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"AI provider unavailable: {str(e)}"
+        )
     except Exception as e:
-        print(f"Error in generate-ai-response: {str(e)}")
+        logger.exception("Error in generate-ai-response")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to generate AI response: {str(e)}"
         )
 
+@app.post("/api/generate-ai-response/batch")
+async def generate_ai_response_batch(request: BatchAIResponseRequest):
+    """Score many transcripts, streaming one NDJSON line per item as each completes.
+
+    Items run under a concurrency limit and the shared batch rate budget. A
+    failed item is reported on its own line and does not stop the batch. The
+    last line is a summary.
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="No items provided")
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch exceeds {BATCH_MAX_ITEMS} items"
+        )
+    
+    concurrency = max(1, min(request.concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def score_item(index: int, item: BatchAIResponseItem) -> Dict[str, Any]:
+        async with semaphore:
+            await batch_rate_limiter.acquire()
+            try:
+                result = await coalesced_ai_feedback(item)
+            except Exception as e:
+                result = {"status": "error", "message": str(e)}
+        return {"index": index, "id": item.id, **result}
+    
+    async def stream():
+        tasks = [asyncio.ensure_future(score_item(i, item)) for i, item in enumerate(request.items)]
+        succeeded = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                succeeded += result["status"] == "success"
+                yield json.dumps(result) + "\n"
+            yield json.dumps({
+                "done": True,
+                "total": len(tasks),
+                "succeeded": succeeded,
+                "failed": len(tasks) - succeeded
+            }) + "\n"
+        finally:
+            # Client went away: stop scoring what has not started yet
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.get("/api/metrics/llm")
+async def llm_metrics():
+    """Per-model call counts and p50/p99 latency for OpenRouter calls"""
+    return {
+        "models": llm_client.stats(),
+        "coalescing": {
+            "feedback": feedback_requests.stats(),
+            "debate_rounds": debate_service._inflight_rounds.stats()
+        }
+    }
+
+@app.get("/api/metrics/analysis")
+async def analysis_metrics():
+    """Slot usage and queue wait per priority class, admission control state and quality level"""
+    return {
+        **analysis_scheduler.stats(),
+        "admission": admission_controller.stats(),
+        "quality": quality_governor.stats()
+    }
+
+@app.get("/api/metrics/logging")
+async def logging_metrics():
+    """Log records this worker dropped because its log writer fell behind"""
+    return {"dropped_records": dropped_records()}
+
+@app.get("/api/models")
+async def model_residency():
+    """Residency state of the analysis models (loaded, loading or unloaded after idling)"""
+    return audio_analyzer.model_residency()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
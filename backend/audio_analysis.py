@@ -1,20 +1,48 @@
 import os
 import json
+import logging
 import librosa
 import numpy as np
 import torch
 import warnings
 import soundfile as sf
-from typing import Dict, Any
+import threading
+from typing import Dict, Any, Callable, List, Optional
 from transformers import (
     AutoModelForAudioClassification, 
-    AutoFeatureExtractor, 
-    AutoProcessor,
-    AutoModelForSpeechSeq2Seq
+    AutoFeatureExtractor
+)
+from services.asr import TranscriptionCancelled, create_asr_backend
+from services.emotion_runtime import BucketedEmotionModel
+from services.model_residency import IdleReaper, ResidentModel
+from services.prosody import extract_prosody
+from services.analysis_graph import Stage, StageGraph
+from services.stage_pool import stage_pool
+from services.vad import VAD_ENABLED, SpeechRegions, detect_speech
+from services.quality_governor import (
+    FULL, GREEDY, SMALL_MODEL, TONE_WINDOWED, TONE_SKIPPED,
+    QUALITY_LEVEL_NAMES, quality_governor
 )
 
 warnings.filterwarnings("ignore", category=UserWarning)
 
+logger = logging.getLogger(__name__)
+
+# Length of the centre window the tone model sees at TONE_WINDOWED
+TONE_WINDOW_SECONDS = float(os.getenv("TONE_WINDOW_SECONDS", "10"))
+# Unload a model after this many idle seconds and reload it on next use; 0 keeps models resident
+MODEL_IDLE_SECONDS = float(os.getenv("MODEL_IDLE_SECONDS", "0"))
+EMOTION_MODEL = "superb/wav2vec2-base-superb-er"
+# Whisper's context window; longer speech is transcribed in pieces this long at most
+ASR_CHUNK_SECONDS = float(os.getenv("ASR_CHUNK_SECONDS", "30"))
+# A gap between words at least this long counts as a pause
+PAUSE_MIN_SECONDS = float(os.getenv("PAUSE_MIN_SECONDS", "0.3"))
+# Pauses at least this long split the speech into segments for per-segment speaking rate
+SEGMENT_BREAK_SECONDS = float(os.getenv("SEGMENT_BREAK_SECONDS", "1.0"))
+
+class AnalysisCancelled(Exception):
+    """Raised when an analysis is stopped through its cancel event"""
+
 class AudioAnalyzer:
     def __init__(self):
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
@@ -26,68 +54,187 @@ class AudioAnalyzer:
             'actually', 'literally', 'really', 'very', 'essentially', 'honestly',
             'just', 'sort of', 'kind of', 'i mean', 'i guess', 'needless to say'
         }
+        self._warmed_up = False
         self._load_models()
     
     def _load_models(self):
         """Load all required models and processors"""
         # Emotion classification model
-        self.emotion_extractor = AutoFeatureExtractor.from_pretrained("superb/wav2vec2-base-superb-er")
-        self.emotion_model = AutoModelForAudioClassification.from_pretrained("superb/wav2vec2-base-superb-er").to(self.device)
+        self.emotion = ResidentModel(EMOTION_MODEL, self._load_emotion, MODEL_IDLE_SECONDS)
         
-        # Improved speech recognition model - Using a larger, more accurate model
-        model_name = "openai/whisper-small"  # Can be upgraded to medium or large for better accuracy
-        self.asr_processor = AutoProcessor.from_pretrained(model_name)
-        self.asr_model = AutoModelForSpeechSeq2Seq.from_pretrained(
-            model_name,
-            torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
-            low_cpu_mem_usage=True,
-            use_safetensors=True
-        ).to(self.device)
+        # Speech recognition (engine and model set by ASR_ENGINE / ASR_MODEL)
+        self.asr = create_asr_backend(idle_seconds=MODEL_IDLE_SECONDS)
+        self.asr_model_name = self.asr.model_name
         
-        # Enable better decoding strategy
-        self.asr_model.config.forced_decoder_ids = None
-        self.asr_model.config.suppress_tokens = []
+        # Cheaper model for SMALL_MODEL quality, only loaded once load first pushes analyses down to it
+        self.fallback_asr = create_asr_backend(fallback=True, idle_seconds=MODEL_IDLE_SECONDS)
+        
+        # Load eagerly so a preloading server master shares the weights with its
+        # workers; weights inherited that way are never idle-unloaded
+        self.emotion.load()
+        self.asr.model.load()
+        self.reaper = IdleReaper([self.emotion, self.asr.model, self.fallback_asr.model])
+        self.stage_graph = self._build_stage_graph()
+    
+    def _load_emotion(self) -> tuple:
+        """Load the wav2vec2 emotion feature extractor and its bucketed classifier"""
+        extractor = AutoFeatureExtractor.from_pretrained(EMOTION_MODEL)
+        model = AutoModelForAudioClassification.from_pretrained(EMOTION_MODEL).to(self.device)
+        classifier = BucketedEmotionModel(model, sr=extractor.sampling_rate)
+        if self._warmed_up:
+            # Reloaded after an idle unload inside a worker: rebuild the graphs before serving
+            classifier.warm_up()
+        return extractor, classifier
     
-    def analyze_audio(self, audio_path: str) -> Dict[str, Any]:
+    def warm_up(self):
+        """Build the emotion model's per-bucket graphs ahead of the first request
+        
+        Called from each worker at startup rather than at import, so graphs are
+        never traced or compiled in a preloading master and inherited by fork.
+        """
+        self._warmed_up = True
+        with self.emotion.use() as (_, classifier):
+            classifier.warm_up()
+            logger.info("Emotion model ready: %s", classifier.stats())
+    
+    def _build_stage_graph(self) -> StageGraph:
+        """The analysis stages and which earlier results each one reads"""
+        def words(results):
+            return results["transcript"]["words"]
+        
+        return StageGraph([
+            Stage("transcript", self._run_transcription, progress=0.1),
+            Stage("fillers", lambda ctx, results: self._analyze_fillers(
+                results["transcript"]["transcript"], words(results)
+            ), requires=("transcript",), progress=0.6),
+            Stage("pauses", lambda ctx, results: self._analyze_pauses(
+                words(results), ctx["duration_sec"]
+            ), requires=("transcript",), progress=0.65),
+            Stage("rate", lambda ctx, results: self._analyze_speaking_rate(
+                words(results), ctx["duration_sec"]
+            ), requires=("transcript",), progress=0.65),
+            Stage("prosody", lambda ctx, results: extract_prosody(
+                ctx["speech_audio"], ctx["sr"], words(results),
+                results["pauses"]["pause_spans"],
+                results["fillers"]["total_fillers"],
+                ctx["duration_sec"]
+            ), requires=("transcript", "pauses", "fillers"), progress=0.7),
+            Stage("tempo", lambda ctx, results: self._analyze_tempo(
+                ctx["y"], ctx["sr"]
+            ), concurrent=True, progress=0.75),
+            Stage("tone", lambda ctx, results: self._analyze_tone(
+                ctx["speech_audio"], ctx["sr"], ctx["quality_level"]
+            ), concurrent=True, progress=0.75),
+        ])
+    
+    def _run_transcription(self, ctx: Dict[str, Any], results: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """Transcript stage: text, word timings and the ASR model that produced them"""
+        asr_model_name, transcript, words = self._transcribe_audio(
+            ctx["y"], ctx["sr"], ctx["cancel_event"], ctx["quality_level"], ctx["speech"]
+        )
+        return {
+            "transcript": transcript,
+            "word_count": len(transcript.split()),
+            "words": words,
+            "asr_model": asr_model_name
+        }
+    
+    def model_residency(self) -> Dict[str, Any]:
+        """Residency state of every model the analyzer can use"""
+        return {
+            model.name: model.stats()
+            for model in (self.asr.model, self.fallback_asr.model, self.emotion)
+        }
+    
+    def _get_asr(self, quality_level: int):
+        """Return the ASR backend to transcribe with at this quality level"""
+        return self.asr if quality_level < SMALL_MODEL else self.fallback_asr
+    
+    def analyze_audio(self, audio_path: str,
+                      progress: Optional[Callable[[str, float], None]] = None,
+                      cancel_event: Optional[threading.Event] = None,
+                      quality_level: Optional[int] = None,
+                      adaptive: bool = False,
+                      metrics: Optional[List[str]] = None) -> Dict[str, Any]:
         """
         Analyze audio file and return comprehensive analysis
         
         Args:
             audio_path: Path to the audio file to analyze
+            progress: Optional callback receiving (stage, fraction complete)
+            cancel_event: Optional event; once set, the analysis stops at the
+                next stage boundary (or Whisper token) and raises AnalysisCancelled
+            quality_level: Degradation level to run at (see services.quality_governor),
+                FULL by default
+            adaptive: Pick the quality level from the current load instead
+            metrics: Names of the stages whose results are wanted (transcript,
+                fillers, pauses, rate, prosody, tempo, tone); the stages they
+                depend on run too. All stages by default
             
         Returns:
             Dictionary containing analysis results
         """
+        def checkpoint(stage: str, fraction: float):
+            if cancel_event is not None and cancel_event.is_set():
+                raise AnalysisCancelled(f"Analysis cancelled before {stage}")
+            if progress is not None:
+                progress(stage, fraction)
+        
+        # Started lazily so the idle reaper thread lives in the worker, not a preloading master
+        self.reaper.start()
+        if adaptive:
+            quality_level = quality_governor.select_level()
+        elif quality_level is None:
+            quality_level = FULL
+        
         try:
             # Load and preprocess audio
+            checkpoint("loading", 0.05)
             y, sr = librosa.load(audio_path, sr=16000)
             duration_sec = librosa.get_duration(y=y, sr=sr)
             
-            # 1. Speech Recognition
-            transcript = self._transcribe_audio(y, sr)
-            
-            # 2. Filler word analysis
-            filler_analysis = self._analyze_fillers(transcript)
+            # Find speech once; the models only ever see these regions
+            if VAD_ENABLED:
+                speech = detect_speech(y, sr)
+            else:
+                speech = SpeechRegions([(0, len(y))] if len(y) else [], sr)
             
-            # 3. Tempo and pause analysis
-            tempo, pause_metrics = self._analyze_tempo_and_pauses(y, sr, duration_sec)
-            
-            # 4. Tone/Emotion Analysis
-            tone_analysis = self._analyze_tone(y, sr)
+            # Only the stages behind the requested metrics run. Tone and tempo
+            # only need the waveform, so they run on the stage pool while this
+            # thread transcribes; latency tends to the slowest stage rather
+            # than the sum of them
+            order = self.stage_graph.resolve(metrics)
+            context = {
+                "y": y,
+                "sr": sr,
+                "speech": speech,
+                "speech_audio": speech.audio(y),
+                "duration_sec": duration_sec,
+                "quality_level": quality_level,
+                "cancel_event": cancel_event,
+            }
+            timings: Dict[str, float] = {}
+            stage_results = self.stage_graph.run(order, context, stage_pool, checkpoint, timings)
+            checkpoint("finishing", 0.95)
             
             # Combine all results
             results = {
-                "transcript": transcript,
                 "duration_sec": round(duration_sec, 2),
-                "word_count": len(transcript.split()),
-                **tempo,
-                **pause_metrics,
-                **tone_analysis,
-                **filler_analysis
+                "speech_sec": round(speech.speech_seconds, 2),
             }
+            for name in order:
+                results.update(stage_results[name])
+            results.update({
+                "quality_level": quality_level,
+                "quality": QUALITY_LEVEL_NAMES[quality_level],
+                "metrics": order,
+                "stage_seconds": timings
+            })
             
             return {"status": "success", "analysis": results}
             
+        except AnalysisCancelled:
+            raise
         except Exception as e:
             return {"status": "error", "message": f"Analysis failed: {str(e)}"}
     
@@ -106,56 +253,64 @@ class AudioAnalyzer:
         
         return y
     
-    def _transcribe_audio(self, y: np.ndarray, sr: int) -> str:
-        """Transcribe audio using Whisper model with better preprocessing"""
+    def _transcribe_audio(self, y: np.ndarray, sr: int, cancel_event: Optional[threading.Event] = None,
+                          quality_level: int = FULL, speech: Optional[SpeechRegions] = None) -> tuple:
+        """Transcribe audio using Whisper model with better preprocessing
+        
+        Only the speech regions are transcribed, in pieces of at most
+        ASR_CHUNK_SECONDS, and word times are mapped back onto the recording.
+        
+        Returns:
+            Tuple of (ASR model name used, transcript, word timestamps)
+        """
+        backend = self._get_asr(quality_level)
+        if speech is None:
+            speech = SpeechRegions([(0, len(y))] if len(y) else [], sr)
         try:
-            # Preprocess audio
-            y = self._preprocess_audio(y, sr)
-            
-            # Prepare input features
-            input_features = self.asr_processor(
-                y, 
-                sampling_rate=16000, 
-                return_tensors="pt"
-            ).input_features.to(self.device)
-            
-            # Generate transcription with better parameters
-            with torch.no_grad():
-                predicted_ids = self.asr_model.generate(
-                    input_features,
-                    max_length=448,  # Increased max length for longer sentences
-                    num_beams=5,     # Beam search for better accuracy
-                    temperature=0.7,  # Balance between randomness and determinism
-                    do_sample=True,   # Enable sampling for better results
-                    top_p=0.95,       # Nucleus sampling
-                    top_k=50,         # Top-k sampling
-                    return_dict_in_generate=True,
-                    output_scores=True
+            texts = []
+            words = []
+            for chunk in speech.chunks(ASR_CHUNK_SECONDS):
+                if cancel_event is not None and cancel_event.is_set():
+                    raise AnalysisCancelled("Analysis cancelled during transcription")
+                
+                # Preprocess audio
+                audio = self._preprocess_audio(chunk.audio(y), sr)
+                
+                transcription = backend.transcribe(
+                    audio, 16000,
+                    greedy=quality_level >= GREEDY,
+                    cancel_event=cancel_event
                 )
+                texts.append(transcription.text)
+                words.extend(
+                    {
+                        **word,
+                        "start": round(chunk.to_original(word["start"]), 2),
+                        "end": round(chunk.to_original(word["end"], is_end=True), 2)
+                    }
+                    for word in transcription.words
+                )
+            return backend.model_name, " ".join(text for text in texts if text), words
             
-            # Decode the generated tokens
-            transcript = self.asr_processor.batch_decode(
-                predicted_ids.sequences, 
-                skip_special_tokens=True
-            )[0]
-            
-            return transcript.strip()
-            
-        except Exception as e:
-            print(f"Error in transcription: {str(e)}")
-            return ""
+        except TranscriptionCancelled:
+            raise AnalysisCancelled("Analysis cancelled during transcription")
+        except Exception:
+            logger.exception("Error in transcription")
+            return backend.model_name, "", []
         
-    def _analyze_fillers(self, text: str) -> dict:
+    def _analyze_fillers(self, text: str, timed_words: Optional[List[Dict[str, Any]]] = None) -> dict:
         """
         Analyze the transcript for filler words and phrases.
-        Returns a dictionary with filler word counts and statistics.
+        Returns a dictionary with filler word counts and statistics, plus
+        when each filler was said if word timestamps are available.
         """
         if not text:
             return {
                 "filler_words": {},
                 "total_fillers": 0,
                 "filler_rate_per_minute": 0.0,
-                "unique_fillers": 0
+                "unique_fillers": 0,
+                "filler_positions": []
             }
             
         # Convert to lowercase and split into words
@@ -187,59 +342,105 @@ class AudioAnalyzer:
             "filler_words": filler_counts,
             "total_fillers": total_fillers,
             "filler_rate_per_minute": (total_fillers / (word_count / 100)) if word_count > 0 else 0.0,
-            "unique_fillers": len(filler_counts)
+            "unique_fillers": len(filler_counts),
+            "filler_positions": self._locate_fillers(timed_words or [])
         }
     
-    def _analyze_tempo_and_pauses(self, y: np.ndarray, sr: int, duration_sec: float) -> tuple:
-        """Analyze tempo and pauses in audio"""
-        # Tempo analysis
+    def _locate_fillers(self, words: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Find when each filler word or phrase was said, from the aligned words"""
+        tokens = [word["word"].lower().strip('.,!?;:"\'()[]{}') for word in words]
+        positions = []
+        for i in range(len(tokens)):
+            for phrase_length in range(1, 4):
+                if i + phrase_length > len(tokens):
+                    break
+                phrase = ' '.join(tokens[i:i + phrase_length])
+                if phrase in self.filler_words:
+                    positions.append({
+                        "filler": phrase,
+                        "start": words[i]["start"],
+                        "end": words[i + phrase_length - 1]["end"]
+                    })
+        return positions
+    
+    def _analyze_tempo(self, y: np.ndarray, sr: int) -> Dict[str, Any]:
+        """Analyze tempo and loudness variation in audio"""
         tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
-        
-        # Pause analysis
         energy = librosa.feature.rms(y=y)[0]
-        frames = range(len(energy))
-        times = librosa.frames_to_time(frames, sr=sr)
-        silence_threshold = np.percentile(energy, 10)
-        pause_indices = np.where(energy < silence_threshold)[0]
+        energy_var = float(np.var(energy)) if len(energy) > 0 else 0.0
+        return {"tempo_bpm": float(tempo), "energy_variation": round(energy_var, 6)}
+    
+    def _analyze_pauses(self, words: List[Dict[str, Any]], duration_sec: float) -> Dict[str, Any]:
+        """Find pauses as the silent gaps between consecutive aligned words"""
+        pause_spans = []
+        for previous, current in zip(words, words[1:]):
+            gap = current["start"] - previous["end"]
+            if gap >= PAUSE_MIN_SECONDS:
+                pause_spans.append({
+                    "start": previous["end"],
+                    "end": current["start"],
+                    "duration": round(gap, 2)
+                })
         
-        pause_durations = []
-        if len(pause_indices) > 1:
-            pause_times = times[pause_indices]
-            pause_gaps = np.diff(pause_times)
-            pause_durations = pause_gaps[pause_gaps > 0.2]
-            
-        pause_count = len(pause_durations)
-        avg_pause_sec = float(np.mean(pause_durations)) if pause_count > 0 else 0.0
+        pause_count = len(pause_spans)
+        avg_pause_sec = float(np.mean([p["duration"] for p in pause_spans])) if pause_count > 0 else 0.0
         pauses_per_min = (pause_count / (duration_sec / 60)) if duration_sec > 0 else 0.0
-        energy_var = float(np.var(energy)) if len(energy) > 0 else 0.0
         
-        return (
-            {"tempo_bpm": float(tempo)},
-            {
-                "pause_count": int(pause_count),
-                "pauses_per_min": round(pauses_per_min, 2),
-                "avg_pause_sec": round(avg_pause_sec, 3),
-                "energy_variation": round(energy_var, 6)
-            }
-        )
+        return {
+            "pause_count": pause_count,
+            "pauses_per_min": round(pauses_per_min, 2),
+            "avg_pause_sec": round(avg_pause_sec, 3),
+            "pause_spans": pause_spans
+        }
+    
+    def _analyze_speaking_rate(self, words: List[Dict[str, Any]], duration_sec: float) -> Dict[str, Any]:
+        """Words per minute overall and for each stretch of speech between long pauses"""
+        wpm = (len(words) / (duration_sec / 60)) if duration_sec > 0 else 0.0
+        
+        segments = []
+        segment_start = 0
+        for i in range(1, len(words) + 1):
+            if i < len(words) and words[i]["start"] - words[i - 1]["end"] < SEGMENT_BREAK_SECONDS:
+                continue
+            segment = words[segment_start:i]
+            span = segment[-1]["end"] - segment[0]["start"]
+            segments.append({
+                "start": segment[0]["start"],
+                "end": segment[-1]["end"],
+                "word_count": len(segment),
+                "wpm": round(len(segment) / (span / 60), 1) if span > 0 else 0.0
+            })
+            segment_start = i
+        
+        return {"wpm": round(wpm, 1), "rate_segments": segments}
     
-    def _analyze_tone(self, y: np.ndarray, sr: int) -> Dict[str, Any]:
+    def _analyze_tone(self, y: np.ndarray, sr: int, quality_level: int = FULL) -> Dict[str, Any]:
         """Analyze tone and emotion of speech"""
+        if quality_level >= TONE_SKIPPED:
+            return {"tone": "skipped", "emotion": "skipped", "confidence": 0.0}
+        if len(y) == 0:
+            # Nothing but silence was recorded
+            return {"tone": "unknown", "emotion": "unknown", "confidence": 0.0}
+        if quality_level >= TONE_WINDOWED:
+            # wav2vec2 cost grows with length; the middle of a speech is a fair sample
+            window = int(TONE_WINDOW_SECONDS * sr)
+            start = max(0, (len(y) - window) // 2)
+            y = y[start:start + window]
         try:
-            inputs = self.emotion_extractor(
-                y, 
-                sampling_rate=sr, 
-                return_tensors="pt", 
-                padding=True
-            ).to(self.device)
+            with self.emotion.use() as (extractor, classifier):
+                inputs = extractor(
+                    y, 
+                    sampling_rate=sr, 
+                    return_tensors="np"
+                )
             
-            with torch.no_grad():
-                logits = self.emotion_model(**inputs).logits
+                # Padded to a fixed length bucket so a prebuilt graph is reused
+                logits = classifier.logits(inputs.input_values[0])
                 probs = torch.nn.functional.softmax(logits, dim=-1)
                 pred_idx = torch.argmax(probs, dim=-1).item()
                 confidence = probs[0, pred_idx].item()
             
-            emotion_raw = self.emotion_model.config.id2label[pred_idx]
+                emotion_raw = classifier.config.id2label[pred_idx]
             
             tone_map = {
                 "angry": "tense",
@@ -259,7 +460,7 @@ class AudioAnalyzer:
             }
             
         except Exception as e:
-            print(f"Tone analysis failed: {e}")
+            logger.warning("Tone analysis failed: %s", e)
             return {
                 "tone": "unknown",
                 "emotion": "unknown",
@@ -0,0 +1,64 @@
+"""Gunicorn settings for serving app.py with several workers.
+
+The app (and with it AudioAnalyzer's Whisper and wav2vec2 weights) is
+imported once in the master and then forked, so every worker shares the same
+read-only copy of the model parameters instead of loading its own.
+
+Preloading and idle unloading (MODEL_IDLE_SECONDS) work against each other:
+a worker cannot free pages the master still holds, so models inherited from
+the master are never unloaded. With MODEL_IDLE_SECONDS set, preloading is
+therefore off unless PRELOAD_APP=1 is given explicitly, and each worker
+loads, unloads and reloads its own copy.
+
+Each worker then limits its torch threads to its share of the physical
+cores and, with CPU_AFFINITY=1, is pinned to them (services/runtime_config.py).
+
+Workers share no memory after the fork, so anything a later request must
+find has to live on disk. Background jobs run in the worker that accepted
+them, but their status, results and cancel requests go through the SQLite
+file at JOB_DB_PATH (services/job_queue.JobStore), so any worker can answer
+for them. That file, like the analysis history and context index, must be
+on storage every worker can reach.
+
+Usage:
+    gunicorn -c gunicorn.conf.py app:app
+"""
+import gc
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services import runtime_config  # noqa: E402
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = runtime_config.WORKERS
+worker_class = "uvicorn.workers.UvicornWorker"
+# Long analyses hold a request open well past gunicorn's 30s default
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "180"))
+graceful_timeout = 30
+
+# Set PRELOAD_APP=0 to compare against one model copy per worker. Idle
+# unloading only frees memory in models a worker loaded itself, so it turns
+# preloading off by default.
+_idle_unloading = float(os.getenv("MODEL_IDLE_SECONDS", "0")) > 0
+preload_app = os.getenv("PRELOAD_APP", "0" if _idle_unloading else "1") == "1"
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    # Move everything loaded so far out of the collector's reach. Otherwise
+    # the first collection in each worker writes to every object header and
+    # copy-on-write duplicates the pages they live on.
+    gc.collect()
+    gc.freeze()
+    server.log.info("Froze %d objects before forking workers", gc.get_freeze_count())
+
+
+def post_fork(server, worker):
+    # Ages count up from 1 across restarts, so a replacement worker takes the
+    # next block of cores round-robin rather than exactly its predecessor's
+    index = (worker.age - 1) % workers
+    applied = runtime_config.configure_worker(index, workers)
+    server.log.info("Worker %s (pid %s) runtime: %s", index, worker.pid, applied)
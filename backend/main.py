@@ -1,26 +1,55 @@
+"""Lightweight transcription-only backend.
+
+app.py imports get_session_analysis from here, so nothing in this module may
+load a model or build an app at import time. To serve this backend on its own:
+
+    uvicorn --factory main:create_app
+"""
 import os
-import wave
-import speech_recognition as sr
+import asyncio
+import logging
+import threading
+import librosa
 from fastapi import FastAPI, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 import tempfile
+from services.asr import ASRBackend, create_asr_backend
+from services.structured_logging import configure_logging, request_context
+from services.vad import VAD_ENABLED, SpeechRegions, detect_speech
+
+logger = logging.getLogger(__name__)
 
-# Initialize recognizer
-recognizer = sr.Recognizer()
+# Whisper only sees 30 seconds at a time
+ASR_CHUNK_SECONDS = float(os.getenv("ASR_CHUNK_SECONDS", "30"))
 
-# Initialize FastAPI app
-app = FastAPI(title="Reherz Speak Coach Backend", version="0.1.0")
+# Created on first transcription, not at import
+_transcriber: Optional[ASRBackend] = None
+_transcriber_lock = threading.Lock()
 
-# Configure CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:8080", "http://localhost:3000"],  # Frontend URLs
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+def get_transcriber() -> ASRBackend:
+    """Return the shared local ASR backend (engine and model from ASR_ENGINE / ASR_MODEL)."""
+    global _transcriber
+    with _transcriber_lock:
+        if _transcriber is None:
+            _transcriber = create_asr_backend()
+    return _transcriber
+
+def transcribe_file(wav_path: str) -> str:
+    """Transcribe an audio file with the local ASR backend.
+
+    The audio is resampled to 16 kHz mono, and only its speech is
+    transcribed, in pieces of at most ASR_CHUNK_SECONDS.
+    """
+    y, sr = librosa.load(wav_path, sr=16000, mono=True)
+    if VAD_ENABLED:
+        speech = detect_speech(y, sr)
+    else:
+        speech = SpeechRegions([(0, len(y))] if len(y) else [], sr)
+    transcriber = get_transcriber()
+    texts = [transcriber.transcribe(chunk.audio(y), sr).text for chunk in speech.chunks(ASR_CHUNK_SECONDS)]
+    return " ".join(text for text in texts if text)
 
 # --- Pydantic Models for Response ---
 
@@ -46,7 +75,7 @@ def convert_audio(input_path: str, output_path: str) -> bool:
     """
     try:
         import ffmpeg
-        print(f"Converting audio from {input_path} to {output_path}...")
+        logger.debug("Converting audio from %s to %s", input_path, output_path)
         (
             ffmpeg
             .input(input_path)
@@ -55,20 +84,19 @@ def convert_audio(input_path: str, output_path: str) -> bool:
         )
         return True
     except ImportError:
-        print("Error: python-ffmpeg not installed. Please run: pip install python-ffmpeg")
+        logger.error("python-ffmpeg not installed. Please run: pip install python-ffmpeg")
         return False
     except Exception as e:
-        print(f"Error converting audio: {str(e)}")
+        logger.error("Error converting audio: %s", e)
         # If the file format is already compatible, conversion might fail but be unnecessary
         # You might add a check here, but for safety, we'll return False on error.
         return False
 
 # --- Endpoints ---
 
-@app.post("/api/process-audio")
 async def process_audio(file: UploadFile = File(...)):
     """Process uploaded audio file and return transcription."""
-    print(f"Received file: {file.filename}, content type: {file.content_type}")
+    logger.info("Received file: %s, content type: %s", file.filename, file.content_type)
     
     # Create a temporary directory for processing
     with tempfile.TemporaryDirectory() as temp_dir:
@@ -82,50 +110,37 @@ async def process_audio(file: UploadFile = File(...)):
             with open(input_path, 'wb') as f:
                 f.write(content)
             
-            print(f"Saved input file to: {input_path} ({len(content)} bytes)")
+            logger.debug("Saved input file to: %s (%d bytes)", input_path, len(content))
             
-            # 2. Convert to WAV format (16kHz mono) required by SpeechRecognition
+            # 2. Convert to WAV format (16kHz mono) expected by the ASR backend
             if not convert_audio(input_path, wav_path):
                 # If conversion fails, try to use the original file path as a fallback 
                 # if it's already a WAV or a compatible format
                 if file.content_type in ["audio/wav", "audio/x-wav"]:
                     wav_path = input_path
-                    print("FFmpeg conversion skipped, attempting to use original file as WAV.")
+                    logger.info("FFmpeg conversion skipped, attempting to use original file as WAV.")
                 else:
                     return {"status": "error", "message": "Failed to convert audio format. Check server logs for ffmpeg error."}
             
-            print(f"Audio ready for recognition at: {wav_path}")
+            logger.debug("Audio ready for recognition at: %s", wav_path)
             
-            # 3. Read the WAV file and transcribe
-            with sr.AudioFile(wav_path) as source:
-                # Adjust for ambient noise and then read the entire audio file
-                recognizer.adjust_for_ambient_noise(source)
-                audio_data = recognizer.record(source)
+            # 3. Transcribe locally, off the event loop
+            logger.debug("Recognizing speech with the local ASR backend")
+            transcript = await asyncio.to_thread(transcribe_file, wav_path)
             
-            print("Audio loaded, recognizing speech using Google Speech Recognition...")
-            
-            transcript = recognizer.recognize_google(audio_data)
-            print(f"Speech recognition successful: '{transcript[:50]}...'")
+            if not transcript:
+                logger.info("Speech recognition could not understand audio.")
+                return {"status": "error", "message": "Could not understand audio. Try speaking more clearly."}
             
+            logger.debug("Speech recognition successful: %r", transcript[:50])
             return {"status": "success", "transcript": transcript}
-                 
-        except sr.UnknownValueError:
-            print("Speech recognition could not understand audio.")
-            return {"status": "error", "message": "Could not understand audio. Try speaking more clearly."}
-            
-        except sr.RequestError as e:
-            print(f"Speech recognition request failed: {str(e)}")
-            return {"status": "error", "message": f"Could not request results from Google Speech Recognition; {e}"}
             
         except Exception as e:
-            print(f"Unexpected error during speech recognition: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Unexpected error during speech recognition")
             return {"status": "error", "message": f"An error occurred during processing: {str(e)}"}
 
 # Keep the existing analysis endpoint for backward compatibility
-@app.post("/api/analysis", response_model=SessionAnalysisResponse)
-async def get_session_analysis():
+async def get_session_analysis() -> SessionAnalysisResponse:
     """Return mocked analysis data after a recording session has finished."""
     return SessionAnalysisResponse(
         transcript="Hello everyone, today I'm going to talk about our quarterly performance...",
@@ -138,6 +153,25 @@ async def get_session_analysis():
         ],
     )
 
+def create_app() -> FastAPI:
+    """Build the transcription-only app."""
+    configure_logging()
+    app = FastAPI(title="Reherz Speak Coach Backend", version="0.1.0")
+    
+    # Configure CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["http://localhost:8080", "http://localhost:3000"],  # Frontend URLs
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.middleware("http")(request_context)
+    
+    app.add_api_route("/api/process-audio", process_audio, methods=["POST"])
+    app.add_api_route("/api/analysis", get_session_analysis, methods=["POST"], response_model=SessionAnalysisResponse)
+    return app
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    uvicorn.run("main:create_app", factory=True, host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -0,0 +1,175 @@
+import itertools
+import math
+import os
+import threading
+from typing import Any, Dict, Optional
+
+import librosa
+import soundfile as sf
+from dotenv import load_dotenv
+
+from services.inference_scheduler import PRIORITY_RANK, InferenceScheduler, analysis_scheduler
+
+load_dotenv()
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request could not finish within the deadline if accepted now
+
+    retry_after is the number of seconds until enough queued work should have
+    drained, or None when the request is too large to ever fit.
+    """
+
+    def __init__(self, message: str, retry_after: Optional[int] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def audio_duration(path: str) -> float:
+    """Duration of an audio file in seconds, read from its header when possible"""
+    try:
+        return sf.info(path).duration
+    except Exception:
+        # Compressed uploads soundfile cannot parse (webm, opus) are probed by librosa
+        return librosa.get_duration(path=path)
+
+
+class Ticket:
+    def __init__(self, ticket_id: int, priority: str, model: str, cost: float, duration_sec: float):
+        self.id = ticket_id
+        self.priority = priority
+        self.model = model
+        self.cost = cost
+        self.duration_sec = duration_sec
+        self.started = False
+
+
+class AdmissionController:
+    """Rejects analysis work that would miss its deadline instead of queueing it
+
+    The cost of a request is estimated as its audio duration times the
+    observed real-time factor (processing seconds per audio second) of the
+    ASR model, plus a fixed per-request overhead. Work already admitted at the
+    same or a higher priority is assumed to drain across that class's share of
+    scheduler slots. If the expected queue wait plus the request's own cost
+    exceeds the deadline, the request is rejected with a Retry-After hint.
+    """
+
+    def __init__(self, scheduler: InferenceScheduler, deadline_seconds: float = 60.0,
+                 default_rtf: float = 0.5, overhead_seconds: float = 1.0, smoothing: float = 0.2):
+        self.scheduler = scheduler
+        self.deadline_seconds = deadline_seconds
+        self.default_rtf = default_rtf
+        self.overhead_seconds = overhead_seconds
+        self.smoothing = smoothing
+        self._rtf: Dict[str, float] = {}
+        self._outstanding: Dict[int, Ticket] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.rejected = 0
+
+    def estimate_cost(self, duration_sec: float, model: str) -> float:
+        """Expected processing seconds for duration_sec of audio on the given model"""
+        return self.overhead_seconds + duration_sec * self._rtf.get(model, self.default_rtf)
+
+    def _expected_wait(self, priority: str) -> float:
+        rank = PRIORITY_RANK[priority]
+        backlog = sum(
+            ticket.cost for ticket in self._outstanding.values()
+            if PRIORITY_RANK[ticket.priority] <= rank
+        )
+        return backlog / self.scheduler.shares[priority]
+
+    def expected_wait(self, priority: str) -> float:
+        """Seconds admitted work at this priority or above should take to drain"""
+        with self._lock:
+            return self._expected_wait(priority)
+
+    def queued_wait(self, priority: str) -> float:
+        """Like expected_wait, but only counting work that has not started yet"""
+        with self._lock:
+            rank = PRIORITY_RANK[priority]
+            backlog = sum(
+                ticket.cost for ticket in self._outstanding.values()
+                if not ticket.started and PRIORITY_RANK[ticket.priority] <= rank
+            )
+            return backlog / self.scheduler.shares[priority]
+
+    def start(self, ticket: Ticket) -> None:
+        """Mark a ticket's work as running, so it no longer counts as queued"""
+        ticket.started = True
+
+    def _reject(self, message: str, retry_after: Optional[float]) -> AdmissionRejected:
+        self.rejected += 1
+        return AdmissionRejected(message, None if retry_after is None else max(1, math.ceil(retry_after)))
+
+    def check(self, priority: str) -> None:
+        """Fail fast when the queue alone already exceeds the deadline, before any decoding"""
+        with self._lock:
+            wait = self._expected_wait(priority)
+            if wait >= self.deadline_seconds:
+                raise self._reject(
+                    f"Analysis queue is full ({wait:.0f}s of {priority} work ahead)",
+                    wait - self.deadline_seconds + self.overhead_seconds
+                )
+
+    def admit(self, duration_sec: float, model: str, priority: str) -> Ticket:
+        """Reserve capacity for a request or raise AdmissionRejected
+
+        Args:
+            duration_sec: Decoded audio duration in seconds
+            model: Name of the ASR model that will process it
+            priority: Scheduler priority class the request will run in
+
+        Returns:
+            Ticket: Handle to pass to release() once the work is done
+        """
+        cost = self.estimate_cost(duration_sec, model)
+        with self._lock:
+            if cost > self.deadline_seconds:
+                raise self._reject(
+                    f"{duration_sec:.0f}s of audio needs about {cost:.0f}s to analyze, "
+                    f"over the {self.deadline_seconds:.0f}s deadline",
+                    None
+                )
+            wait = self._expected_wait(priority)
+            if wait + cost > self.deadline_seconds:
+                # Time for enough of the backlog to drain that this request fits
+                raise self._reject(
+                    f"Server is busy (about {wait:.0f}s of queued analysis)",
+                    wait + cost - self.deadline_seconds
+                )
+            ticket = Ticket(next(self._ids), priority, model, cost, duration_sec)
+            self._outstanding[ticket.id] = ticket
+            self.admitted += 1
+            return ticket
+
+    def release(self, ticket: Ticket, service_seconds: Optional[float] = None) -> None:
+        """Return a ticket's capacity and learn from how long the work actually took"""
+        with self._lock:
+            self._outstanding.pop(ticket.id, None)
+            if service_seconds is None or ticket.duration_sec <= 0:
+                return
+            observed = max(0.0, service_seconds - self.overhead_seconds) / ticket.duration_sec
+            previous = self._rtf.get(ticket.model, self.default_rtf)
+            self._rtf[ticket.model] = previous + self.smoothing * (observed - previous)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "deadline_seconds": self.deadline_seconds,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "outstanding": len(self._outstanding),
+                "outstanding_cost_seconds": round(sum(t.cost for t in self._outstanding.values()), 2),
+                "real_time_factor": {model: round(rtf, 3) for model, rtf in self._rtf.items()},
+            }
+
+
+admission_controller = AdmissionController(
+    analysis_scheduler,
+    deadline_seconds=float(os.getenv("ANALYSIS_DEADLINE_SECONDS", "60")),
+    default_rtf=float(os.getenv("ANALYSIS_DEFAULT_RTF", "0.5")),
+    overhead_seconds=float(os.getenv("ANALYSIS_OVERHEAD_SECONDS", "1.0"))
+)
@@ -0,0 +1,102 @@
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from services.stage_pool import StagePool
+
+
+class Stage:
+    """One step of the analysis and the stages whose results it reads
+
+    fn is called as fn(context, results): context holds the request's inputs
+    (waveform, speech regions, quality level...) and results maps every stage
+    that has finished to the dict it returned. A concurrent stage runs on the
+    stage pool as soon as its dependencies are done instead of on the
+    request thread.
+    """
+
+    def __init__(self, name: str, fn: Callable[[Dict[str, Any], Dict[str, Dict[str, Any]]], Dict[str, Any]],
+                 requires: Tuple[str, ...] = (), concurrent: bool = False, progress: float = 0.0):
+        self.name = name
+        self.fn = fn
+        self.requires = requires
+        self.concurrent = concurrent
+        self.progress = progress
+
+
+class StageGraph:
+    """Runs just the stages needed for the requested metrics, in dependency order"""
+
+    def __init__(self, stages: List[Stage]):
+        self.stages = {stage.name: stage for stage in stages}
+
+    def resolve(self, metrics: Optional[Iterable[str]] = None) -> List[str]:
+        """Stages to run for the requested metrics, dependencies first
+
+        Args:
+            metrics: Names of the wanted stages; None means every stage
+
+        Returns:
+            List[str]: Stage names in an order where each follows its dependencies
+        """
+        wanted = list(self.stages) if metrics is None else list(metrics)
+        unknown = [name for name in wanted if name not in self.stages]
+        if unknown:
+            raise ValueError(f"Unknown metrics {unknown}; expected any of {sorted(self.stages)}")
+
+        order: List[str] = []
+
+        def visit(name: str, path: Tuple[str, ...]):
+            if name in order:
+                return
+            if name in path:
+                raise ValueError(f"Stage dependency cycle: {' -> '.join(path + (name,))}")
+            for dependency in self.stages[name].requires:
+                visit(dependency, path + (name,))
+            order.append(name)
+
+        for name in wanted:
+            visit(name, ())
+        return order
+
+    def run(self, order: List[str], context: Dict[str, Any], pool: StagePool,
+            checkpoint: Callable[[str, float], None], timings: Dict[str, float]) -> Dict[str, Dict[str, Any]]:
+        """Run the resolved stages and return each one's result by name
+
+        Concurrent stages without dependencies start before anything else, so
+        they overlap the whole chain of sequential stages. Any stage still
+        queued on the pool is cancelled if a stage fails or the caller's
+        checkpoint raises.
+        """
+        results: Dict[str, Dict[str, Any]] = {}
+        futures: Dict[str, Future] = {}
+
+        def submit(stage: Stage):
+            futures[stage.name] = pool.submit(stage.name, stage.fn, context, results, timings=timings)
+
+        try:
+            for name in order:
+                stage = self.stages[name]
+                if stage.concurrent and not stage.requires:
+                    submit(stage)
+
+            for name in order:
+                if name in futures:
+                    continue
+                stage = self.stages[name]
+                for dependency in stage.requires:
+                    if dependency not in results:
+                        results[dependency] = futures[dependency].result()
+                checkpoint(name, stage.progress)
+                if stage.concurrent:
+                    submit(stage)
+                else:
+                    results[name] = pool.run(name, stage.fn, context, results, timings=timings)
+
+            for name in order:
+                if name not in results:
+                    checkpoint(name, self.stages[name].progress)
+                    results[name] = futures[name].result()
+            return results
+        finally:
+            for future in futures.values():
+                future.cancel()
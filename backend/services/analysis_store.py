@@ -0,0 +1,328 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_DB_PATH = os.getenv(
+    "ANALYSIS_DB_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "analysis_history.db")
+)
+# Session rows kept in memory as NumPy arrays for analytics, across all users
+ANALYSIS_CACHE_ROWS = int(os.getenv("ANALYSIS_CACHE_ROWS", "500000"))
+DEFAULT_USER = "anonymous"
+SPEECH = "speech"
+DEBATE = "debate"
+
+# Numeric columns stored for every session; analytics are computed over these
+METRIC_COLUMNS = (
+    "duration_sec", "word_count", "wpm", "fillers_per_min", "pause_count",
+    "avg_pause_sec", "pitch_variation", "articulation_rate",
+    "pace_score", "filler_score", "pause_score", "clarity_score", "overall_score",
+)
+SCORE_LABELS = {
+    "pace_score": "Pace",
+    "filler_score": "Filler Words",
+    "pause_score": "Pauses",
+    "clarity_score": "Clarity",
+}
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    session_type TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    session_ref TEXT,
+    {", ".join(f"{column} REAL" for column in METRIC_COLUMNS)}
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_user_type_time ON sessions (user_id, session_type, created_at);
+CREATE TABLE IF NOT EXISTS user_totals (
+    user_id TEXT NOT NULL,
+    session_type TEXT NOT NULL,
+    {", ".join(f"{column}_sum REAL NOT NULL DEFAULT 0, {column}_n INTEGER NOT NULL DEFAULT 0" for column in METRIC_COLUMNS)},
+    PRIMARY KEY (user_id, session_type)
+);
+CREATE TABLE IF NOT EXISTS session_texts (
+    session_id INTEGER PRIMARY KEY REFERENCES sessions (id) ON DELETE CASCADE,
+    transcript TEXT,
+    summary TEXT
+);
+"""
+
+
+def _band_score(value: Optional[float], low: float, high: float, slope: float) -> Optional[float]:
+    """100 inside [low, high], losing slope points per unit outside it"""
+    if value is None:
+        return None
+    distance = max(low - value, value - high, 0.0)
+    return round(max(0.0, 100.0 - slope * distance), 1)
+
+
+def score_delivery(analysis: Dict[str, Any]) -> Dict[str, Optional[float]]:
+    """Turn raw delivery metrics into 0-100 scores
+
+    A metric scores 100 inside the band DebateService._format_audio_metrics
+    calls good (150-160 wpm, under 2 fillers a minute, 0.5-1.5s pauses,
+    3.5-6.5 syllables/s); keep the two in step.
+
+    Metrics a selective analysis did not produce score as None and are
+    left out of the overall score.
+    """
+    duration = analysis.get("duration_sec") or 0.0
+    fillers_per_min = analysis.get("filler_words_per_minute")
+    if fillers_per_min is None and "total_fillers" in analysis and duration > 0:
+        fillers_per_min = analysis["total_fillers"] / (duration / 60)
+
+    scores = {
+        "pace_score": _band_score(analysis.get("wpm"), 150, 160, 2.0),
+        "filler_score": _band_score(fillers_per_min, 0, 2, 12.0),
+        "pause_score": _band_score(analysis.get("avg_pause_duration", analysis.get("avg_pause_sec")), 0.5, 1.5, 80.0),
+        "clarity_score": _band_score(analysis.get("articulation_rate"), 3.5, 6.5, 25.0),
+    }
+    present = [score for score in scores.values() if score is not None]
+    scores["overall_score"] = round(sum(present) / len(present), 1) if present else None
+    return scores
+
+
+def summarize(row: Dict[str, Any]) -> str:
+    """One line description of a stored session's delivery"""
+    parts = []
+    if row.get("wpm") is not None:
+        parts.append(f"spoke at {row['wpm']:.0f} words per minute")
+    if row.get("fillers_per_min") is not None:
+        parts.append(f"used {row['fillers_per_min']:.1f} filler words per minute")
+    if row.get("avg_pause_sec") is not None and row.get("pause_count"):
+        parts.append(f"paused {int(row['pause_count'])} times for {row['avg_pause_sec']:.1f}s on average")
+    if not parts:
+        return "No delivery metrics were recorded for this session."
+    return "Speaker " + ", ".join(parts) + "."
+
+
+class AnalysisStore:
+    """Every analysis result, one narrow typed row per session, in SQLite
+
+    Rows hold only numeric metrics so that scans for analytics stay small;
+    transcripts live in a side table and are read only for single sessions.
+    The (user_id, session_type, created_at) index keeps every per-user query
+    a range scan, the numbers are worked on as NumPy arrays, and running
+    per-user totals make ranking against all users one row per user.
+    One connection is shared behind a lock; each call is a short statement.
+    """
+
+    def __init__(self, path: str = ANALYSIS_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._cache: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._cached_rows = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # Opened on first use so a preloading master never holds a handle its workers inherit
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def record(self, user_id: Optional[str], session_type: str, analysis: Dict[str, Any],
+               session_ref: Optional[str] = None, overall_score: Optional[float] = None) -> Optional[int]:
+        """Store one analysis; failures are logged and never reach the caller
+
+        Args:
+            user_id: Who the session belongs to; DEFAULT_USER if not given
+            session_type: SPEECH or DEBATE
+            analysis: Analysis dict as returned by AudioAnalyzer.analyze_audio
+            session_ref: Optional external id, e.g. the debate session id
+            overall_score: Score from elsewhere (e.g. the debate coach) to store
+                instead of the delivery score
+
+        Returns:
+            The new row id, or None if it could not be stored
+        """
+        scores = score_delivery(analysis)
+        if overall_score is not None:
+            scores["overall_score"] = float(overall_score)
+        duration = analysis.get("duration_sec") or 0.0
+        row = {
+            "duration_sec": analysis.get("duration_sec"),
+            "word_count": analysis.get("word_count", len(analysis.get("transcript", "").split())),
+            "wpm": analysis.get("wpm"),
+            "fillers_per_min": analysis.get("filler_words_per_minute", (
+                analysis["total_fillers"] / (duration / 60) if "total_fillers" in analysis and duration > 0 else None
+            )),
+            "pause_count": analysis.get("pause_count"),
+            "avg_pause_sec": analysis.get("avg_pause_duration", analysis.get("avg_pause_sec")),
+            "pitch_variation": analysis.get("pitch_variation"),
+            "articulation_rate": analysis.get("articulation_rate"),
+            **scores,
+        }
+        columns = ("user_id", "session_type", "created_at", "session_ref") + METRIC_COLUMNS
+        values = (user_id or DEFAULT_USER, session_type, time.time(), session_ref) + tuple(row[c] for c in METRIC_COLUMNS)
+        totals = {}
+        for column in METRIC_COLUMNS:
+            totals[f"{column}_sum"] = row[column] if row[column] is not None else 0.0
+            totals[f"{column}_n"] = int(row[column] is not None)
+        try:
+            with self._lock:
+                conn = self._connection()
+                with conn:
+                    cursor = conn.execute(
+                        f"INSERT INTO sessions ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                        values
+                    )
+                    # Running per-user sums, so ranking against everyone reads one row per user
+                    conn.execute(
+                        f"INSERT INTO user_totals (user_id, session_type, {', '.join(totals)}) "
+                        f"VALUES (?, ?, {', '.join('?' * len(totals))}) "
+                        f"ON CONFLICT (user_id, session_type) DO UPDATE SET "
+                        + ", ".join(f"{name} = {name} + excluded.{name}" for name in totals),
+                        values[:2] + tuple(totals.values())
+                    )
+                    conn.execute(
+                        "INSERT INTO session_texts (session_id, transcript, summary) VALUES (?, ?, ?)",
+                        (cursor.lastrowid, analysis.get("transcript", ""), summarize(row))
+                    )
+                return cursor.lastrowid
+        except sqlite3.Error as e:
+            logger.error("Failed to store analysis: %s", e)
+            return None
+
+    def latest(self, user_id: Optional[str] = None, session_type: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """The user's most recent session with its transcript, or None"""
+        query = (
+            "SELECT s.*, t.transcript, t.summary FROM sessions s "
+            "LEFT JOIN session_texts t ON t.session_id = s.id WHERE s.user_id = ?"
+        )
+        params: List[Any] = [user_id or DEFAULT_USER]
+        if session_type:
+            query += " AND s.session_type = ?"
+            params.append(session_type)
+        query += " ORDER BY s.created_at DESC LIMIT 1"
+        with self._lock:
+            cursor = self._connection().execute(query, params)
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            return dict(zip([column[0] for column in cursor.description], row))
+
+    def _metric_arrays(self, user_id: str, session_type: str) -> Dict[str, np.ndarray]:
+        """All of a user's sessions of one type as one float array per column, oldest first
+
+        The arrays are cached per user and only rows newer than the cached
+        ones are read, so a long history is converted from SQLite once per
+        worker. Row ids grow in commit order, so rows written by other
+        workers are never skipped.
+        """
+        key = (user_id, session_type)
+        columns = ("id", "created_at") + METRIC_COLUMNS
+        with self._lock:
+            cached = self._cache.pop(key, None)
+            last_id = int(cached[-1, 0]) if cached is not None and len(cached) else 0
+            rows = self._connection().execute(
+                f"SELECT {', '.join(columns)} FROM sessions "
+                "WHERE user_id = ? AND session_type = ? AND id > ? ORDER BY id",
+                (user_id, session_type, last_id)
+            ).fetchall()
+            # NULL becomes NaN so missing metrics drop out of the reductions
+            fresh = np.array(rows, dtype=float).reshape(len(rows), len(columns))
+            matrix = fresh if cached is None else np.concatenate((cached, fresh))
+            self._cache[key] = matrix
+            self._cached_rows += len(fresh)
+            self._evict()
+        return {column: matrix[:, i] for i, column in enumerate(columns) if column != "id"}
+
+    def _evict(self) -> None:
+        # Least recently used users go first once the cache holds too many rows
+        while self._cached_rows > ANALYSIS_CACHE_ROWS and len(self._cache) > 1:
+            _, matrix = self._cache.popitem(last=False)
+            self._cached_rows -= len(matrix)
+
+    def _population_means(self, session_type: str) -> Dict[str, np.ndarray]:
+        """Every user's mean of each metric, to rank a user against"""
+        columns = ", ".join(f"{column}_sum, {column}_n" for column in METRIC_COLUMNS)
+        with self._lock:
+            rows = self._connection().execute(
+                f"SELECT {columns} FROM user_totals WHERE session_type = ?", (session_type,)
+            ).fetchall()
+        matrix = np.array(rows, dtype=float).reshape(len(rows), 2 * len(METRIC_COLUMNS))
+        means = {}
+        for i, column in enumerate(METRIC_COLUMNS):
+            sums, counts = matrix[:, 2 * i], matrix[:, 2 * i + 1]
+            means[column] = sums[counts > 0] / counts[counts > 0]
+        return means
+
+    def analytics(self, user_id: Optional[str] = None, session_type: str = SPEECH,
+                  window: int = 5, limit: int = 50) -> Dict[str, Any]:
+        """Trends, rolling averages and percentile ranks over a user's history
+
+        Args:
+            user_id: Whose sessions to analyse
+            session_type: SPEECH or DEBATE
+            window: Sessions per rolling average
+            limit: How many of the most recent points of each series to return
+
+        Returns:
+            Dict with the session count and, per metric: latest value, overall
+            mean, trend (change per week from a least-squares fit over time),
+            rolling average series, and percentile rank of the user's mean
+            among all users' means and of the latest value in their own history
+        """
+        user_id = user_id or DEFAULT_USER
+        window = max(1, window)
+        arrays = self._metric_arrays(user_id, session_type)
+        times = arrays["created_at"]
+        result: Dict[str, Any] = {"user_id": user_id, "session_type": session_type,
+                                  "sessions": int(len(times)), "metrics": {}}
+        if len(times) == 0:
+            return result
+        result["first_session"] = float(times[0])
+        result["last_session"] = float(times[-1])
+        population_means = self._population_means(session_type)
+
+        for metric in METRIC_COLUMNS:
+            values = arrays[metric]
+            present = ~np.isnan(values)
+            if not present.any():
+                continue
+            observed, observed_times = values[present], times[present]
+
+            # Rolling mean from a cumulative sum: one pass regardless of window
+            cumulative = np.concatenate(([0.0], np.cumsum(observed)))
+            if len(observed) >= window:
+                rolling = (cumulative[window:] - cumulative[:-window]) / window
+            else:
+                rolling = cumulative[1:] / np.arange(1, len(observed) + 1)
+
+            # Fitting over less than a day would extrapolate one sitting to a week
+            trend = None
+            if len(observed) > 1 and np.ptp(observed_times) >= 86400:
+                days = (observed_times - observed_times[0]) / 86400
+                trend = float(np.polyfit(days, observed, 1)[0] * 7)
+
+            population = population_means[metric]
+            user_mean = float(observed.mean())
+            result["metrics"][metric] = {
+                "latest": round(float(observed[-1]), 3),
+                "mean": round(user_mean, 3),
+                "trend_per_week": round(trend, 3) if trend is not None else None,
+                "rolling_average": np.round(rolling[-limit:], 3).tolist(),
+                "percentile_vs_users": round(float((population < user_mean).mean() * 100), 1) if len(population) else None,
+                "percentile_vs_own_history": round(float((observed < observed[-1]).mean() * 100), 1),
+            }
+        return result
+
+
+analysis_store = AnalysisStore()
@@ -0,0 +1,258 @@
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import torch
+from dotenv import load_dotenv
+from transformers import (
+    AutoModelForSpeechSeq2Seq,
+    AutoProcessor,
+    StoppingCriteria,
+    StoppingCriteriaList
+)
+
+from services.model_residency import ResidentModel
+
+load_dotenv()
+
+# Which engine transcribes speech: "transformers" (Whisper via Hugging Face)
+# or "faster-whisper" (CTranslate2 int8, CPU friendly)
+ASR_ENGINE = os.getenv("ASR_ENGINE", "transformers")
+DEFAULT_MODELS = {
+    "transformers": ("openai/whisper-small", "openai/whisper-base"),
+    "faster-whisper": ("small", "base"),
+}
+
+
+class TranscriptionCancelled(Exception):
+    """Raised when a transcription is stopped through its cancel event"""
+
+
+class Transcription:
+    """Text produced by an ASR backend, its word timings and the model used
+
+    words holds one {"word", "start", "end"} dict per word, times in seconds
+    from the start of the audio passed in.
+    """
+
+    def __init__(self, text: str, model: str, words: Optional[List[Dict[str, Any]]] = None):
+        self.text = text
+        self.model = model
+        self.words = words or []
+
+
+class ASRBackend:
+    """Interface every speech recognition engine implements
+
+    Backends load their model through a ResidentModel so idle unloading and
+    single-flight reloads work the same way for every engine.
+    """
+
+    engine = "base"
+
+    def __init__(self, model_name: str, idle_seconds: float = 0.0):
+        self.model_name = model_name
+        self.model = ResidentModel(model_name, self._load, idle_seconds)
+
+    def _load(self):
+        raise NotImplementedError
+
+    def transcribe(self, y: np.ndarray, sr: int, greedy: bool = False,
+                   cancel_event: Optional[threading.Event] = None) -> Transcription:
+        """Transcribe mono audio
+
+        Args:
+            y: Audio samples
+            sr: Sample rate of y; backends expect 16 kHz
+            greedy: Trade accuracy for speed with single-hypothesis decoding
+            cancel_event: Optional event that stops decoding early once set
+
+        Returns:
+            Transcription: The recognised text, word timestamps and the model name
+        """
+        raise NotImplementedError
+
+
+class _CancelCriteria(StoppingCriteria):
+    """Stops Whisper decoding between tokens once cancellation is requested"""
+
+    def __init__(self, cancel_event: threading.Event):
+        self.cancel_event = cancel_event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.cancel_event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+
+def _group_words(tokenizer, token_ids: List[int], token_times: List[float]) -> List[Dict[str, Any]]:
+    """Merge Whisper sub-word tokens into words with start and end times
+
+    token_times[i] is when token i starts, so a word ends where the token
+    after its last piece begins. Tokens that open with a space start a new word.
+    """
+    words: List[Dict[str, Any]] = []
+    tokens = tokenizer.convert_ids_to_tokens(token_ids)
+    for i, (token_id, token) in enumerate(zip(token_ids, tokens)):
+        if token_id in tokenizer.all_special_ids or token.startswith("<|"):
+            continue
+        piece = tokenizer.decode([token_id])
+        if not piece.strip():
+            continue
+        start = token_times[i]
+        end = token_times[i + 1] if i + 1 < len(token_times) else start
+        if words and not piece.startswith(" "):
+            words[-1]["word"] += piece
+            words[-1]["end"] = end
+        else:
+            words.append({"word": piece.strip(), "start": start, "end": end})
+    for word in words:
+        word["start"] = round(word["start"], 2)
+        word["end"] = round(max(word["end"], word["start"]), 2)
+    return words
+
+
+class TransformersWhisperBackend(ASRBackend):
+    """Whisper run locally through Hugging Face transformers
+
+    Word timings come from the same generate call through the model's
+    cross-attention alignment heads (return_token_timestamps), so no second
+    alignment pass is needed.
+    """
+
+    engine = "transformers"
+
+    def __init__(self, model_name: str, idle_seconds: float = 0.0, device: Optional[str] = None):
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        super().__init__(model_name, idle_seconds)
+
+    def _load(self):
+        processor = AutoProcessor.from_pretrained(self.model_name)
+        model = AutoModelForSpeechSeq2Seq.from_pretrained(
+            self.model_name,
+            torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
+            low_cpu_mem_usage=True,
+            use_safetensors=True
+        ).to(self.device)
+
+        # Enable better decoding strategy
+        model.config.forced_decoder_ids = None
+        model.config.suppress_tokens = []
+        return processor, model
+
+    def transcribe(self, y, sr, greedy=False, cancel_event=None):
+        with self.model.use() as (processor, model):
+            inputs = processor(
+                y,
+                sampling_rate=sr,
+                return_tensors="pt",
+                # generate cannot infer which frames are padding for timestamp alignment
+                return_attention_mask=True
+            )
+            input_features = inputs.input_features.to(self.device, dtype=model.dtype)
+            attention_mask = inputs.attention_mask.to(self.device)
+
+            if greedy:
+                # One hypothesis, no sampling: several times cheaper than beam search
+                decoding = {"num_beams": 1, "do_sample": False}
+            else:
+                decoding = {
+                    "num_beams": 5,     # Beam search for better accuracy
+                    "temperature": 0.7,  # Balance between randomness and determinism
+                    "do_sample": True,   # Enable sampling for better results
+                    "top_p": 0.95,       # Nucleus sampling
+                    "top_k": 50,         # Top-k sampling
+                }
+
+            with torch.no_grad():
+                predicted_ids = model.generate(
+                    input_features,
+                    attention_mask=attention_mask,
+                    max_length=448,  # Increased max length for longer sentences
+                    return_dict_in_generate=True,
+                    return_token_timestamps=True,
+                    stopping_criteria=StoppingCriteriaList([_CancelCriteria(cancel_event)]) if cancel_event else None,
+                    **decoding
+                )
+            if cancel_event is not None and cancel_event.is_set():
+                raise TranscriptionCancelled("Transcription cancelled")
+
+            sequence = predicted_ids.sequences[0].tolist()
+            text = processor.batch_decode(predicted_ids.sequences, skip_special_tokens=True)[0]
+            words = _group_words(processor.tokenizer, sequence, predicted_ids.token_timestamps[0].tolist())
+        return Transcription(text.strip(), self.model_name, words)
+
+
+class FasterWhisperBackend(ASRBackend):
+    """Whisper on CTranslate2 with int8 weights: no torch at inference, fast on CPU
+
+    Requires the optional faster-whisper package.
+    """
+
+    engine = "faster-whisper"
+
+    def __init__(self, model_name: str, idle_seconds: float = 0.0,
+                 compute_type: Optional[str] = None, cpu_threads: int = 0):
+        self.compute_type = compute_type or os.getenv("FASTER_WHISPER_COMPUTE_TYPE", "int8")
+        self.cpu_threads = cpu_threads
+        super().__init__(model_name, idle_seconds)
+
+    def _load(self):
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError:
+            raise RuntimeError("faster-whisper is not installed. Please run: pip install faster-whisper")
+        return WhisperModel(self.model_name, device="cpu", compute_type=self.compute_type,
+                            cpu_threads=self.cpu_threads)
+
+    def transcribe(self, y, sr, greedy=False, cancel_event=None):
+        with self.model.use() as model:
+            segments, _ = model.transcribe(
+                y.astype(np.float32),
+                beam_size=1 if greedy else 5,
+                condition_on_previous_text=False,
+                word_timestamps=True
+            )
+            texts = []
+            words = []
+            # Segments are decoded lazily, so cancellation takes effect between them
+            for segment in segments:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise TranscriptionCancelled("Transcription cancelled")
+                texts.append(segment.text.strip())
+                words.extend(
+                    {"word": word.word.strip(), "start": round(word.start, 2), "end": round(word.end, 2)}
+                    for word in segment.words or []
+                )
+        return Transcription(" ".join(texts), self.model_name, words)
+
+
+ENGINES = {
+    TransformersWhisperBackend.engine: TransformersWhisperBackend,
+    FasterWhisperBackend.engine: FasterWhisperBackend,
+}
+
+
+def create_asr_backend(engine: Optional[str] = None, model_name: Optional[str] = None,
+                       fallback: bool = False, idle_seconds: float = 0.0) -> ASRBackend:
+    """Build an ASR backend
+
+    Args:
+        engine: Engine name, ASR_ENGINE by default
+        model_name: Model to load; defaults to the engine's primary model
+            (ASR_MODEL) or, with fallback set, its smaller one (ASR_FALLBACK_MODEL)
+        fallback: Whether this is the cheaper model used under load
+        idle_seconds: Unload the model after this long unused; 0 keeps it resident
+
+    Returns:
+        ASRBackend: The backend, with its model not yet loaded
+    """
+    engine = engine or ASR_ENGINE
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown ASR engine {engine!r}; expected one of {sorted(ENGINES)}")
+    primary, smaller = DEFAULT_MODELS[engine]
+    if model_name is None:
+        if fallback:
+            model_name = os.getenv("ASR_FALLBACK_MODEL", smaller)
+        else:
+            model_name = os.getenv("ASR_MODEL", primary)
+    return ENGINES[engine](model_name, idle_seconds=idle_seconds)
@@ -0,0 +1,231 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from services.token_budget import token_budget
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_DB_PATH = os.getenv(
+    "CONTEXT_DB_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "context_index.db")
+)
+# Passage size and overlap, in words; overlap keeps a sentence cut at a boundary findable
+CHUNK_WORDS = int(os.getenv("CONTEXT_CHUNK_WORDS", "120"))
+CHUNK_OVERLAP_WORDS = int(os.getenv("CONTEXT_CHUNK_OVERLAP_WORDS", "20"))
+# Passages injected into a feedback prompt, and the most tokens they may take
+CONTEXT_TOP_K = int(os.getenv("CONTEXT_TOP_K", "3"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "500"))
+# Largest upload accepted per document
+MAX_DOCUMENT_CHARS = int(os.getenv("CONTEXT_MAX_DOCUMENT_CHARS", "2000000"))
+# Only the most frequent distinct transcript terms go into the query
+MAX_QUERY_TERMS = 48
+
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "from", "has", "have", "he",
+    "i", "in", "is", "it", "its", "of", "on", "or", "our", "so", "that", "the", "their", "there",
+    "they", "this", "to", "was", "we", "were", "will", "with", "you", "your", "um", "uh", "like",
+}
+_WORD = re.compile(r"[A-Za-z0-9][A-Za-z0-9'-]*")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS context_documents (
+    id TEXT PRIMARY KEY,
+    context_id TEXT NOT NULL,
+    title TEXT,
+    chunk_count INTEGER NOT NULL,
+    word_count INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_context_documents_context ON context_documents (context_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS context_chunks USING fts5(
+    body,
+    context_id UNINDEXED,
+    document_id UNINDEXED,
+    tokenize = 'porter unicode61'
+);
+"""
+
+
+def chunk_text(text: str, size: int = CHUNK_WORDS, overlap: int = CHUNK_OVERLAP_WORDS) -> List[str]:
+    """Split a document into overlapping passages of about size words
+
+    Paragraphs are packed whole while they fit, so passages tend to end at
+    natural breaks; a paragraph longer than size is cut into windows.
+    """
+    step = max(1, size - overlap)
+    chunks: List[str] = []
+    current: List[str] = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        words = paragraph.split()
+        if not words:
+            continue
+        if current and len(current) + len(words) > size:
+            chunks.append(" ".join(current))
+            current = current[-overlap:] if overlap else []
+        if len(words) > size:
+            for start in range(0, len(words), step):
+                chunks.append(" ".join(words[start:start + size]))
+                if start + size >= len(words):
+                    break
+            current = []
+        else:
+            current.extend(words)
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def query_terms(text: str, limit: int = MAX_QUERY_TERMS) -> List[str]:
+    """The transcript's most frequent content words, for a BM25 OR query"""
+    counts = Counter(
+        word for word in (match.group(0).lower().strip("'-") for match in _WORD.finditer(text))
+        if len(word) > 2 and word not in _STOPWORDS
+    )
+    return [word for word, _ in counts.most_common(limit)]
+
+
+class ContextIndex:
+    """Uploaded presentation and debate notes, searchable by BM25
+
+    Documents are split into passages and stored in an SQLite FTS5 table,
+    which keeps an inverted index and ranks matches with BM25. A feedback
+    prompt asks for the top few passages matching the transcript, so its
+    size depends on top_k and the token budget, never on how much was
+    uploaded. Being on disk, the index is shared by every server worker.
+    """
+
+    def __init__(self, path: str = CONTEXT_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # Opened on first use so a preloading master never holds a handle its workers inherit
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def add_document(self, text: str, context_id: Optional[str] = None, title: Optional[str] = None) -> Dict[str, Any]:
+        """Chunk and index one document
+
+        Args:
+            text: Document text
+            context_id: Collection to add it to; a new one is created if not given
+            title: Optional name shown when listing documents
+
+        Returns:
+            Dict with context_id, document_id, chunk_count and word_count
+        """
+        if len(text) > MAX_DOCUMENT_CHARS:
+            raise ValueError(f"Document exceeds {MAX_DOCUMENT_CHARS} characters")
+        chunks = chunk_text(text)
+        if not chunks:
+            raise ValueError("Document has no text")
+        context_id = context_id or str(uuid.uuid4())
+        document_id = str(uuid.uuid4())
+        word_count = len(text.split())
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "INSERT INTO context_documents (id, context_id, title, chunk_count, word_count, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (document_id, context_id, title, len(chunks), word_count, time.time())
+                )
+                conn.executemany(
+                    "INSERT INTO context_chunks (body, context_id, document_id) VALUES (?, ?, ?)",
+                    [(chunk, context_id, document_id) for chunk in chunks]
+                )
+        return {"context_id": context_id, "document_id": document_id,
+                "chunk_count": len(chunks), "word_count": word_count}
+
+    def documents(self, context_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT id, title, chunk_count, word_count, created_at FROM context_documents "
+                "WHERE context_id = ? ORDER BY created_at",
+                (context_id,)
+            ).fetchall()
+        return [
+            {"document_id": row[0], "title": row[1], "chunk_count": row[2], "word_count": row[3], "created_at": row[4]}
+            for row in rows
+        ]
+
+    def delete(self, context_id: str) -> int:
+        """Remove a context and everything in it; returns how many documents went"""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM context_chunks WHERE context_id = ?", (context_id,))
+                return conn.execute("DELETE FROM context_documents WHERE context_id = ?", (context_id,)).rowcount
+
+    def search(self, context_id: str, text: str, top_k: int = CONTEXT_TOP_K) -> List[Dict[str, Any]]:
+        """The passages of a context that best match text, best first
+
+        Args:
+            context_id: Collection to search
+            text: Query text, normally the speech transcript
+            top_k: Passages to return at most
+
+        Returns:
+            List of {"text", "document_id", "score"}; higher score is a better match
+        """
+        terms = query_terms(text)
+        if not terms:
+            return []
+        match = " OR ".join(f'"{term}"' for term in terms)
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT body, document_id, bm25(context_chunks) AS rank FROM context_chunks "
+                "WHERE context_chunks MATCH ? AND context_id = ? ORDER BY rank LIMIT ?",
+                (match, context_id, top_k)
+            ).fetchall()
+        # FTS5's bm25() is negated so that ascending order puts the best match first
+        return [{"text": row[0], "document_id": row[1], "score": round(-row[2], 3)} for row in rows]
+
+    def prompt_section(self, context_id: Optional[str], transcript: str,
+                       max_tokens: int = CONTEXT_TOKEN_BUDGET, top_k: int = CONTEXT_TOP_K) -> str:
+        """Prompt block with the passages most relevant to the transcript, within max_tokens
+
+        Returns an empty string when there is no context or nothing matches, and
+        logs rather than raises if the index cannot be read.
+        """
+        if not context_id:
+            return ""
+        try:
+            passages = self.search(context_id, transcript, top_k)
+        except sqlite3.Error as e:
+            logger.error("Context search failed for %s: %s", context_id, e)
+            return ""
+        if not passages:
+            return ""
+        lines = [f"[{i}] {passage['text']}" for i, passage in enumerate(passages, 1)]
+        # Best passages first, so when the budget runs out the weakest are dropped
+        kept: List[str] = []
+        remaining = max_tokens
+        for line in lines:
+            cost = token_budget.count(line) + 1
+            if cost > remaining:
+                if remaining > 20:
+                    kept.append(token_budget.truncate(line, remaining - 1))
+                break
+            kept.append(line)
+            remaining -= cost
+        return "SPEAKER'S OWN NOTES (most relevant excerpts; check the speech against them):\n" + "\n".join(kept)
+
+
+context_index = ContextIndex()
@@ -1,32 +1,69 @@
+import asyncio
 import json
-from typing import Dict, List, Optional, Tuple
-from openai import OpenAI
-import os
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Type, TypeVar
 import random
 from dotenv import load_dotenv
 from datetime import datetime
+from services.llm_client import LLMUnavailableError, llm_client
+from services.structured_output import (
+    ClosingContentAnalysis,
+    ClosingDeliveryAnalysis,
+    FinalEvaluation,
+    FinalRoundAnalysis,
+    MiddleRoundAnalysis,
+    OpeningRoundAnalysis,
+    StructuredOutputError,
+    TopicMaterial,
+    parse_structured,
+)
+from services.context_index import context_index
+from services.singleflight import SingleFlight, text_hash
+from services.token_budget import token_budget
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
 class DebateService:
+    # Token budgets for the variable-size parts of each round prompt. Keeping
+    # these fixed keeps prompt size flat no matter how many rounds a debate has.
+    TRANSCRIPT_TOKEN_BUDGET = 1200
+    OPPONENT_ARGUMENT_TOKEN_BUDGET = 200
+    ROUND_LINE_TOKEN_BUDGET = 80
+    ROUNDS_SUMMARY_TOKEN_BUDGET = 400
+    DEBATE_SUMMARY_TOKEN_BUDGET = 900
+    # Excerpts from the speaker's uploaded notes, however large the upload
+    CONTEXT_TOKEN_BUDGET = 500
+    # Completion caps; rounds that reuse prefetched material need less output
+    RESPONSE_MAX_TOKENS = 2000
+    SHORT_RESPONSE_MAX_TOKENS = 1200
+    # Final-round judging is fanned out into sections, each parsed and retried on its own
+    SECTION_MAX_TOKENS = 700
+    SECTION_ATTEMPTS = 2
+    # How long a round waits for still-running topic prefetch before
+    # falling back to generating the counter-argument itself
+    PREFETCH_WAIT_SECONDS = 3.0
+
     def __init__(self):
-        self.client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=os.getenv("OPENROUTER_API_KEY"),
-            default_headers={
-                "HTTP-Referer": "http://localhost:3000",
-                "X-Title": "Reherz Debate Coach"
-            }
-        )
+        self.llm = llm_client
         self.debate_sessions = {}
+        # Duplicate submissions of the same round share one LLM call, and
+        # different submissions for one session are processed one at a time
+        self._inflight_rounds = SingleFlight()
+        self._session_locks: Dict[str, asyncio.Lock] = {}
         
-    def start_debate_session(self, topic: str, user_side: str, total_rounds: int = 3) -> str:
+    def start_debate_session(self, topic: str, user_side: str, total_rounds: int = 3,
+                             context_id: Optional[str] = None) -> str:
         """Initialize a new debate session
         
         Args:
             topic: The debate topic
             user_side: 'affirmative' or 'negative'
             total_rounds: Number of debate rounds (default: 3)
+            context_id: Uploaded notes to check each round against (optional)
             
         Returns:
             str: Session ID for the new debate
@@ -37,21 +74,142 @@ class DebateService:
             'topic': topic,
             'user_side': user_side,
             'total_rounds': total_rounds,
+            'context_id': context_id,
             'rounds': {},
             'current_round': 1,
             'opponent_arguments': [],
+            # Prefetched opposing arguments used so far; rounds that fell back to
+            # a live argument do not advance it
+            'prepared_arguments_used': 0,
+            'summary_lines': [],
+            'summary_blocks': [],
+            'rounds_summary': "No previous rounds completed.",
+            'last_submission': None,
+            'topic_material': None,
+            'prefetch_task': None,
             'created_at': datetime.utcnow().isoformat(),
             'status': 'in_progress'
         }
+        self._start_prefetch(self.debate_sessions[session_id])
         return session_id
     
-    async def process_round(self, session_id: str, transcript: str, audio_metrics: Optional[Dict] = None) -> Dict:
+    def _start_prefetch(self, session: Dict) -> None:
+        """Kick off background generation of topic material for a new session
+        
+        The user spends a while preparing their opening statement, so opposing
+        arguments, rebuttal prompts and evidence angles are generated then,
+        off the critical path of the first round.
+        
+        Args:
+            session: The debate session data
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # Called outside the event loop; rounds generate arguments inline
+        session['prefetch_task'] = loop.create_task(self._prefetch_topic_material(session))
+    
+    async def _prefetch_topic_material(self, session: Dict) -> Optional[TopicMaterial]:
+        """Generate and cache topic-level material for the session
+        
+        Args:
+            session: The debate session data
+            
+        Returns:
+            TopicMaterial: The generated material, or None if generation failed
+        """
+        opposing_side = 'negative' if session['user_side'].lower() == 'affirmative' else 'affirmative'
+        prompt = f"""
+        You are preparing the opposing team for a debate. Provide material in valid JSON format.
+        
+        DEBATE TOPIC: {session['topic']}
+        USER'S POSITION: {session['user_side']}
+        OPPONENT'S POSITION: {opposing_side}
+        
+        YOUR TASK:
+        1. List the strongest arguments the {opposing_side} side will make, strongest first
+        2. For each argument, write one question that helps the user prepare a rebuttal
+        3. List evidence angles (studies, statistics, precedents) the user's side could draw on
+        
+        RESPONSE FORMAT (must be valid JSON):
+        {{
+            "opposing_arguments": ["argument 1 (3-4 sentences)", "argument 2", "argument 3", "argument 4"],
+            "rebuttal_prompts": ["question for argument 1", "question for argument 2", "question for argument 3", "question for argument 4"],
+            "evidence_angles": ["angle 1", "angle 2", "angle 3"]
+        }}
+        """
+        try:
+            material = await self._get_ai_response(prompt, TopicMaterial)
+        except (LLMUnavailableError, StructuredOutputError) as e:
+            logger.warning("Topic prefetch failed: %s", str(e)[:200])
+            return None
+        session['topic_material'] = material
+        return material
+    
+    async def _get_topic_material(self, session: Dict) -> Optional[TopicMaterial]:
+        """Return prefetched topic material, briefly waiting if it is still being generated"""
+        if session.get('topic_material') is not None:
+            return session['topic_material']
+        task = session.get('prefetch_task')
+        if task is None:
+            return None
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout=self.PREFETCH_WAIT_SECONDS)
+        except asyncio.TimeoutError:
+            return None
+    
+    def _next_prepared_argument(self, session: Dict, material: Optional[TopicMaterial]) -> Optional[str]:
+        """Take the next unused prefetched opposing argument, if any are left"""
+        if material is None:
+            return None
+        index = session['prepared_arguments_used']
+        if index < len(material.opposing_arguments):
+            return material.opposing_arguments[index]
+        return None
+    
+    def _add_opponent_argument(self, session: Dict, argument: str, prepared: bool) -> None:
+        """Record the argument the user answers next, consuming the prefetched one if it was used"""
+        session['opponent_arguments'].append(argument)
+        if prepared:
+            session['prepared_arguments_used'] += 1
+    
+    def _rebuttal_hint(self, session: Dict, material: Optional[TopicMaterial], prepared_argument: Optional[str]) -> str:
+        """Rebuttal question matching the most recent opponent argument, if it was prefetched"""
+        if material is None or prepared_argument is None:
+            return ""
+        index = session['prepared_arguments_used'] - 1
+        if 0 <= index < len(material.rebuttal_prompts):
+            return f" Consider: {material.rebuttal_prompts[index]}"
+        return ""
+    
+    async def _context_section(self, session: Dict, transcript: str) -> str:
+        """Excerpts of the speaker's notes most relevant to this round's speech"""
+        return await asyncio.to_thread(
+            context_index.prompt_section, session.get('context_id'), transcript, self.CONTEXT_TOKEN_BUDGET
+        )
+    
+    def _format_evidence_angles(self, material: Optional[TopicMaterial]) -> str:
+        """Prompt section listing prefetched evidence angles for the user's side"""
+        if material is None or not material.evidence_angles:
+            return ""
+        angles = "\n        ".join(f"- {angle}" for angle in material.evidence_angles[:5])
+        return token_budget.truncate(
+            f"EVIDENCE ANGLES FOR THIS SIDE (reference these when suggesting improvements):\n        {angles}",
+            self.OPPONENT_ARGUMENT_TOKEN_BUDGET
+        )
+    
+    async def process_round(self, session_id: str, transcript: str, audio_metrics: Optional[Dict] = None,
+                            on_scored: Optional[Callable[[Dict, Optional[float]], Awaitable[None]]] = None) -> Dict:
         """Process a debate round and return analysis
         
         Args:
             session_id: The debate session ID
             transcript: User's speech transcript
             audio_metrics: Optional audio analysis metrics (tone, tempo, etc.)
+            on_scored: Awaited with the result and the round's score once per
+                round that is newly and successfully scored; not for retries
+                answered from the last submission, coalesced duplicates or
+                fallback feedback
             
         Returns:
             Dict: Analysis of the round and instructions for next steps
@@ -60,6 +218,58 @@ class DebateService:
             raise ValueError("Invalid session ID")
             
         session = self.debate_sessions[session_id]
+        transcript_hash = text_hash(transcript)
+        
+        # A retry of a round that already finished gets the same result back
+        # instead of being scored as the next round
+        last_submission = session.get('last_submission')
+        if last_submission and last_submission['transcript_hash'] == transcript_hash:
+            return last_submission['result']
+        
+        key = ('debate_round', session_id, session['current_round'], transcript_hash)
+        return await self._inflight_rounds.do(
+            key,
+            lambda: self._process_round_serialized(session_id, transcript, transcript_hash, audio_metrics, on_scored)
+        )
+    
+    async def _process_round_serialized(self, session_id: str, transcript: str, transcript_hash: str,
+                                        audio_metrics: Optional[Dict] = None,
+                                        on_scored: Optional[Callable[[Dict, Optional[float]], Awaitable[None]]] = None) -> Dict:
+        """Process a round while holding the session's lock
+        
+        Args:
+            session_id: The debate session ID
+            transcript: User's speech transcript
+            transcript_hash: Digest of the transcript, used to recognise retries
+            audio_metrics: Optional audio analysis metrics (tone, tempo, etc.)
+            on_scored: See process_round
+            
+        Returns:
+            Dict: Analysis of the round and instructions for next steps
+        """
+        lock = self._session_locks.setdefault(session_id, asyncio.Lock())
+        async with lock:
+            session = self.debate_sessions[session_id]
+            last_submission = session.get('last_submission')
+            if last_submission and last_submission['transcript_hash'] == transcript_hash:
+                return last_submission['result']
+            
+            result = await self._dispatch_round(session, transcript, audio_metrics)
+            
+            # Only remember rounds that succeeded so a retry after a failure runs again
+            if 'error' not in result.get('feedback', {}):
+                session['last_submission'] = {
+                    'round': result['round'],
+                    'transcript_hash': transcript_hash,
+                    'result': result
+                }
+                if on_scored is not None:
+                    analysis = session['rounds'][result['round']]['analysis']
+                    await on_scored(result, self.round_score(analysis))
+            return result
+    
+    async def _dispatch_round(self, session: Dict, transcript: str, audio_metrics: Optional[Dict] = None) -> Dict:
+        """Route the submission to the handler for the session's current round"""
         current_round = session['current_round']
         
         # Process the round based on its type
@@ -84,6 +294,14 @@ class DebateService:
         # Prepare audio metrics for the prompt
         audio_analysis = self._format_audio_metrics(audio_metrics) if audio_metrics else {}
         
+        # With prefetched material the model only has to critique the speech
+        material = await self._get_topic_material(session)
+        prepared_argument = self._next_prepared_argument(session, material)
+        notes = await self._context_section(session, transcript)
+        opponent_field = "" if prepared_argument else (
+            ',\n            "opponent_argument": "Generate a strong counter-argument (3-4 sentences) to use in the next round"'
+        )
+        
         prompt = f"""
         You are an expert debate coach analyzing an opening statement. Provide structured feedback in valid JSON format.
         
@@ -91,11 +309,15 @@ class DebateService:
         USER'S POSITION: {session['user_side']}
         
         SPEECH TRANSCRIPT:
-        {transcript}
+        {token_budget.truncate(transcript, self.TRANSCRIPT_TOKEN_BUDGET)}
         
         SPEECH METRICS:
         {json.dumps(audio_analysis, indent=2) if audio_analysis else 'No audio metrics available'}
         
+        {self._format_evidence_angles(material)}
+        
+        {notes}
+        
         YOUR TASK:
         1. Analyze the opening statement for structure, clarity, and argument strength
         2. Evaluate the delivery based on the provided speech metrics
@@ -121,17 +343,18 @@ class DebateService:
                 "pace_analysis": "Analysis of speaking rate and rhythm"
             }},
             "feedback_summary": "Overall feedback on the opening statement",
-            "suggested_improvements": ["suggestion 1", "suggestion 2"],
-            "opponent_argument": "Generate a strong counter-argument (3-4 sentences) to use in the next round"
+            "suggested_improvements": ["suggestion 1", "suggestion 2"]{opponent_field}
         }}
         """
         
-        response = self._get_ai_response(prompt)
-        analysis = json.loads(response)
+        analysis = await self._get_ai_response(
+            prompt, OpeningRoundAnalysis,
+            max_tokens=self.SHORT_RESPONSE_MAX_TOKENS if prepared_argument else self.RESPONSE_MAX_TOKENS
+        )
         
         # Extract and store the opponent's argument
-        opponent_argument = analysis.pop('opponent_argument', "No counter-argument generated.")
-        session['opponent_arguments'].append(opponent_argument)
+        opponent_argument = prepared_argument or analysis.opponent_argument or "No counter-argument generated."
+        self._add_opponent_argument(session, opponent_argument, prepared_argument is not None)
         
         # Store round data
         current_round = session['current_round']
@@ -140,8 +363,10 @@ class DebateService:
             'transcript': transcript,
             'analysis': analysis,
             'audio_metrics': audio_metrics,
+            'prompt_tokens': token_budget.count(prompt),
             'timestamp': datetime.utcnow().isoformat()
         }
+        self._update_rolling_summary(session, current_round)
         
         # Move to next round
         session['current_round'] += 1
@@ -149,8 +374,9 @@ class DebateService:
         return {
             'round': current_round,
             'total_rounds': session['total_rounds'],
-            'feedback': analysis,
-            'next_round_prompt': f"Prepare your response to the following argument: {opponent_argument}",
+            'feedback': analysis.model_dump(exclude={'opponent_argument'}),
+            'next_round_prompt': f"Prepare your response to the following argument: {opponent_argument}"
+                                 + self._rebuttal_hint(session, material, prepared_argument),
             'session_complete': False,
             'opponent_argument': opponent_argument
         }
@@ -173,6 +399,19 @@ class DebateService:
         audio_analysis = self._format_audio_metrics(audio_metrics) if audio_metrics else {}
         previous_rounds = self._get_rounds_summary(session)
         
+        # Check if the next round is the closing statement
+        is_last_round = current_round >= session['total_rounds'] - 1
+        
+        # Only ask the model for a counter-argument when one is still needed
+        # and none was prefetched
+        material = await self._get_topic_material(session)
+        prepared_counter = None if is_last_round else self._next_prepared_argument(session, material)
+        needs_counter = not is_last_round and prepared_counter is None
+        notes = await self._context_section(session, transcript)
+        opponent_field = "" if not needs_counter else (
+            ',\n            "opponent_counter": "Generate a strong counter-argument (3-4 sentences) to use in the next round"'
+        )
+        
         prompt = f"""
         You are an expert debate coach analyzing a debate round. Provide structured feedback in valid JSON format.
         
@@ -181,10 +420,10 @@ class DebateService:
         CURRENT ROUND: {current_round} of {session['total_rounds']}
         
         PREVIOUS ARGUMENT TO RESPOND TO:
-        {opponent_argument}
+        {token_budget.truncate(opponent_argument, self.OPPONENT_ARGUMENT_TOKEN_BUDGET)}
         
         USER'S RESPONSE TRANSCRIPT:
-        {transcript}
+        {token_budget.truncate(transcript, self.TRANSCRIPT_TOKEN_BUDGET)}
         
         SPEECH METRICS:
         {json.dumps(audio_analysis, indent=2) if audio_analysis else 'No audio metrics available'}
@@ -192,6 +431,10 @@ class DebateService:
         PREVIOUS ROUNDS SUMMARY:
         {previous_rounds}
         
+        {self._format_evidence_angles(material)}
+        
+        {notes}
+        
         YOUR TASK:
         1. Analyze how well the user addressed the opponent's points
         2. Evaluate the logical consistency and persuasiveness
@@ -220,18 +463,20 @@ class DebateService:
                 "clarity_analysis": "Analysis of speech clarity and enunciation"
             }},
             "feedback_summary": "Overall feedback on the rebuttal",
-            "suggested_improvements": ["suggestion 1", "suggestion 2"],
-            "opponent_counter": "Generate a strong counter-argument (3-4 sentences) to use in the next round"
+            "suggested_improvements": ["suggestion 1", "suggestion 2"]{opponent_field}
         }}
         """
         
         try:
-            response = self._get_ai_response(prompt)
-            analysis = json.loads(response)
+            analysis = await self._get_ai_response(
+                prompt, MiddleRoundAnalysis,
+                max_tokens=self.RESPONSE_MAX_TOKENS if needs_counter else self.SHORT_RESPONSE_MAX_TOKENS
+            )
             
             # Extract and store the opponent's counter-argument
-            opponent_counter = analysis.pop('opponent_counter', "No counter-argument generated.")
-            session['opponent_arguments'].append(opponent_counter)
+            if not is_last_round:
+                opponent_counter = prepared_counter or analysis.opponent_counter or "No counter-argument generated."
+                self._add_opponent_argument(session, opponent_counter, prepared_counter is not None)
             
             # Store round data
             session['rounds'][current_round] = {
@@ -240,35 +485,34 @@ class DebateService:
                 'analysis': analysis,
                 'audio_metrics': audio_metrics,
                 'opponent_argument': opponent_argument,
+                'prompt_tokens': token_budget.count(prompt),
                 'timestamp': datetime.utcnow().isoformat()
             }
+            self._update_rolling_summary(session, current_round)
             
-            # Check if this is the last round
-            is_last_round = current_round >= session['total_rounds'] - 1
-            
-            # Move to next round if not the last one
-            if not is_last_round:
-                session['current_round'] += 1
+            # Move to next round; the closing round is still to come
+            session['current_round'] += 1
             
             return {
                 'round': current_round,
                 'total_rounds': session['total_rounds'],
-                'feedback': analysis,
-                'next_round_prompt': f"Prepare your response to the following argument: {opponent_counter}" if not is_last_round 
+                'feedback': analysis.model_dump(exclude={'opponent_counter'}),
+                'next_round_prompt': f"Prepare your response to the following argument: {opponent_counter}"
+                                     + self._rebuttal_hint(session, material, prepared_counter) if not is_last_round 
                                    else "Prepare your closing statement, summarizing your main points and addressing the counter-arguments.",
-                'session_complete': is_last_round,
+                'session_complete': False,
                 'opponent_argument': opponent_counter if not is_last_round else None
             }
             
-        except json.JSONDecodeError as e:
-            # Fallback response if JSON parsing fails
+        except StructuredOutputError as e:
+            # Fallback response if the model output could not be parsed
             return {
                 'round': current_round,
                 'total_rounds': session['total_rounds'],
                 'feedback': {
                     'error': 'Failed to process response',
                     'details': str(e),
-                    'raw_response': response[:500] if 'response' in locals() else 'No response generated'
+                    'raw_response': e.raw[:500] or 'No response generated'
                 },
                 'next_round_prompt': "Let's continue with the debate. Please proceed to the next round.",
                 'session_complete': False
@@ -277,6 +521,11 @@ class DebateService:
     async def _process_final_round(self, session: Dict, transcript: str, audio_metrics: Optional[Dict] = None) -> Dict:
         """Process the final round of the debate
         
+        Judging is split into content, delivery and overall-verdict requests
+        that run concurrently and are merged into one analysis, so latency is
+        bounded by the slowest section and a malformed section only loses
+        itself.
+        
         Args:
             session: The debate session data
             transcript: User's speech transcript
@@ -287,11 +536,14 @@ class DebateService:
         """
         # Prepare audio metrics and debate summary
         audio_analysis = self._format_audio_metrics(audio_metrics) if audio_metrics else {}
-        debate_summary = self._get_debate_summary(session)
+        debate_summary = self._get_debate_summary(session, max_tokens=self.DEBATE_SUMMARY_TOKEN_BUDGET)
+        final_statement = token_budget.truncate(transcript, self.TRANSCRIPT_TOKEN_BUDGET)
+        speech_metrics = json.dumps(audio_analysis, indent=2) if audio_metrics else 'No audio metrics available'
+        notes = await self._context_section(session, transcript)
         
-        prompt = f"""
-        You are an expert debate judge analyzing the final statement of a debate. 
-        Provide comprehensive feedback in valid JSON format.
+        content_prompt = f"""
+        You are an expert debate judge analyzing the content of a debate's final statement. 
+        Provide feedback in valid JSON format.
         
         DEBATE TOPIC: {session['topic']}
         USER'S POSITION: {session['user_side']}
@@ -300,49 +552,104 @@ class DebateService:
         {debate_summary}
         
         FINAL STATEMENT TRANSCRIPT:
-        {transcript}
+        {final_statement}
         
-        SPEECH METRICS:
-        {json.dumps(audio_analysis, indent=2) if audio_metrics else 'No audio metrics available'}
+        {notes}
         
         YOUR TASK:
         1. Evaluate how well the final statement summarizes the user's position
         2. Assess how effectively it addresses previous counter-arguments
         3. Analyze the overall persuasiveness and impact
-        4. Provide feedback on delivery, tone, and rhetoric
-        5. Offer a comprehensive evaluation of the entire debate performance
         
         RESPONSE FORMAT (must be valid JSON):
         {{
-            "content_analysis": {{
-                "summary_quality": 0-100,
-                "rebuttal_handling": 0-100,
-                "argument_strength": 0-100,
-                "persuasiveness": 0-100,
-                "key_points_covered": ["point 1", "point 2"],
-                "missed_opportunities": ["opportunity 1", "opportunity 2"]
-            }},
-            "delivery_analysis": {{
-                "delivery_score": 0-100,
-                "tone_score": 0-100,
-                "pace_score": 0-100,
-                "clarity_score": 0-100,
-                "tone_analysis": "Analysis of speaker's tone and emotion",
-                "pace_analysis": "Analysis of speaking rate and rhythm",
-                "clarity_analysis": "Analysis of speech clarity and enunciation"
-            }},
-            "final_evaluation": {{
-                "overall_score": 0-100,
-                "key_strengths": ["strength 1", "strength 2"],
-                "areas_for_improvement": ["area 1", "area 2"],
-                "final_feedback": "Comprehensive final feedback on the entire debate performance"
-            }}
+            "summary_quality": 0-100,
+            "rebuttal_handling": 0-100,
+            "argument_strength": 0-100,
+            "persuasiveness": 0-100,
+            "key_points_covered": ["point 1", "point 2"],
+            "missed_opportunities": ["opportunity 1", "opportunity 2"]
         }}
         """
         
+        delivery_prompt = f"""
+        You are an expert speech coach analyzing the delivery of a debate's final statement. 
+        Provide feedback in valid JSON format.
+        
+        FINAL STATEMENT TRANSCRIPT:
+        {final_statement}
+        
+        SPEECH METRICS:
+        {speech_metrics}
+        
+        YOUR TASK:
+        1. Provide feedback on delivery, tone, and rhetoric
+        2. Rate each aspect on a scale of 0-100
+        
+        RESPONSE FORMAT (must be valid JSON):
+        {{
+            "delivery_score": 0-100,
+            "tone_score": 0-100,
+            "pace_score": 0-100,
+            "clarity_score": 0-100,
+            "tone_analysis": "Analysis of speaker's tone and emotion",
+            "pace_analysis": "Analysis of speaking rate and rhythm",
+            "clarity_analysis": "Analysis of speech clarity and enunciation"
+        }}
+        """
+        
+        verdict_prompt = f"""
+        You are an expert debate judge giving the final verdict on a whole debate performance. 
+        Provide feedback in valid JSON format.
+        
+        DEBATE TOPIC: {session['topic']}
+        USER'S POSITION: {session['user_side']}
+        
+        DEBATE SUMMARY:
+        {debate_summary}
+        
+        FINAL STATEMENT TRANSCRIPT:
+        {final_statement}
+        
+        YOUR TASK:
+        Offer a comprehensive evaluation of the entire debate performance.
+        
+        RESPONSE FORMAT (must be valid JSON):
+        {{
+            "overall_score": 0-100,
+            "key_strengths": ["strength 1", "strength 2"],
+            "areas_for_improvement": ["area 1", "area 2"],
+            "final_feedback": "Comprehensive final feedback on the entire debate performance"
+        }}
+        """
+        
+        sections = {
+            'content_analysis': (content_prompt, ClosingContentAnalysis),
+            'delivery_analysis': (delivery_prompt, ClosingDeliveryAnalysis),
+            'final_evaluation': (verdict_prompt, FinalEvaluation),
+        }
+        results = await asyncio.gather(
+            *(self._get_section(prompt, schema) for prompt, schema in sections.values()),
+            return_exceptions=True
+        )
+        
+        merged = {}
+        errors = []
+        for name, result in zip(sections, results):
+            if isinstance(result, (LLMUnavailableError, StructuredOutputError)):
+                logger.warning("Final round section %s failed: %s", name, str(result)[:200])
+                errors.append(result)
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                merged[name] = result
+        
         try:
-            response = self._get_ai_response(prompt)
-            analysis = json.loads(response)
+            if not merged:
+                # Nothing usable came back; report it like any other failed round
+                raise errors[0]
+            
+            analysis = FinalRoundAnalysis(**merged, failed_sections=[name for name in sections if name not in merged])
             
             # Store the final round data
             current_round = session['current_round']
@@ -351,8 +658,10 @@ class DebateService:
                 'transcript': transcript,
                 'analysis': analysis,
                 'audio_metrics': audio_metrics,
+                'prompt_tokens': sum(token_budget.count(prompt) for prompt, _ in sections.values()),
                 'timestamp': datetime.utcnow().isoformat()
             }
+            self._update_rolling_summary(session, current_round)
             
             # Mark session as complete
             session['status'] = 'completed'
@@ -364,25 +673,45 @@ class DebateService:
             return {
                 'round': current_round,
                 'total_rounds': session['total_rounds'],
-                'feedback': analysis,
+                'feedback': analysis.model_dump(),
                 'overall_score': overall_score,
                 'session_complete': True,
                 'debate_summary': self._get_debate_summary(session, include_transcripts=False)
             }
             
-        except json.JSONDecodeError as e:
-            # Fallback response if JSON parsing fails
+        except StructuredOutputError as e:
+            # Fallback response if the model output could not be parsed
             return {
                 'round': session['current_round'],
                 'total_rounds': session['total_rounds'],
                 'feedback': {
                     'error': 'Failed to process final round',
                     'details': str(e),
-                    'raw_response': response[:500] if 'response' in locals() else 'No response generated'
+                    'raw_response': e.raw[:500] or 'No response generated'
                 },
                 'session_complete': True
             }
     
+    async def _get_section(self, prompt: str, schema: Type[T]) -> T:
+        """Request one independently retried section of a fanned-out evaluation
+        
+        Transport failures are already retried by the LLM client; this adds
+        retries for responses that come back but cannot be parsed.
+        
+        Args:
+            prompt: The section prompt
+            schema: Pydantic model for the section
+            
+        Returns:
+            The parsed section
+        """
+        for attempt in range(self.SECTION_ATTEMPTS):
+            try:
+                return await self._get_ai_response(prompt, schema, max_tokens=self.SECTION_MAX_TOKENS)
+            except StructuredOutputError:
+                if attempt == self.SECTION_ATTEMPTS - 1:
+                    raise
+    
     def _calculate_overall_score(self, session: Dict) -> Dict:
         """Calculate overall debate performance metrics across all rounds
         
@@ -403,40 +732,10 @@ class DebateService:
                 'overall_assessment': 'Incomplete debate'
             }
         
-        # Initialize score accumulators
-        content_scores = []
-        delivery_scores = []
-        category_scores = {}
-        
-        # Calculate scores for each round
-        for i, (round_num, round_data) in enumerate(rounds.items(), 1):
-            analysis = round_data.get('analysis', {})
-            
-            # Extract content analysis scores
-            content_analysis = analysis.get('content_analysis', {})
-            if content_analysis:
-                content_scores.extend([
-                    content_analysis.get('structure_score', 0),
-                    content_analysis.get('clarity_score', 0),
-                    content_analysis.get('argument_strength', 0),
-                    content_analysis.get('relevance_score', 0),
-                    content_analysis.get('persuasiveness', 0)
-                ])
-            
-            # Extract delivery analysis scores
-            delivery_analysis = analysis.get('delivery_analysis', {})
-            if delivery_analysis:
-                delivery_scores.extend([
-                    delivery_analysis.get('tone_score', 0),
-                    delivery_analysis.get('pace_score', 0),
-                    delivery_analysis.get('clarity_score', 0),
-                    delivery_analysis.get('pauses_score', 0)
-                ])
-        
-        # Calculate average scores (filter out 0s to not skew the average)
-        avg_content = sum(score for score in content_scores if score > 0) / max(1, len([s for s in content_scores if s > 0]))
-        avg_delivery = sum(score for score in delivery_scores if score > 0) / max(1, len([s for s in delivery_scores if s > 0]))
-        overall_score = (avg_content * 0.7) + (avg_delivery * 0.3)  # Weighted average
+        analyses = [round_data.get('analysis') for round_data in rounds.values()]
+        avg_content, avg_delivery, overall_score = self._weighted_scores(
+            [analysis for analysis in analyses if analysis is not None]
+        )
         
         # Generate overall assessment
         assessment = self._generate_overall_assessment(session, overall_score)
@@ -450,76 +749,92 @@ class DebateService:
             'overall_assessment': assessment
         }
     
-    def _get_ai_response(self, prompt: str, model: str = "google/gemma-3-4b-it:free") -> str:
-        """Get response from the AI model
+    def round_score(self, analysis) -> Optional[float]:
+        """Score of a single round out of 100, or None if the coach gave none
+        
+        The closing round uses the judge's overall verdict; other rounds use
+        the same content/delivery weighting as the debate's average score.
+        """
+        final_evaluation = getattr(analysis, 'final_evaluation', None)
+        if final_evaluation is not None and final_evaluation.overall_score > 0:
+            return float(final_evaluation.overall_score)
+        _, _, score = self._weighted_scores([analysis])
+        return round(score, 1) if score > 0 else None
+    
+    def _weighted_scores(self, analyses: List) -> Tuple[float, float, float]:
+        """Average content score, average delivery score and their 70/30 weighted blend"""
+        content_scores = []
+        delivery_scores = []
+        
+        # Fields a round type does not have count as 0
+        for analysis in analyses:
+            # Extract content analysis scores
+            content_analysis = analysis.content_analysis
+            content_scores.extend(
+                getattr(content_analysis, field, 0)
+                for field in ('structure_score', 'clarity_score', 'argument_strength',
+                              'relevance_score', 'persuasiveness')
+            )
+            
+            # Extract delivery analysis scores
+            delivery_analysis = analysis.delivery_analysis
+            delivery_scores.extend(
+                getattr(delivery_analysis, field, 0)
+                for field in ('tone_score', 'pace_score', 'clarity_score', 'pauses_score')
+            )
+        
+        # Calculate average scores (filter out 0s to not skew the average)
+        avg_content = sum(score for score in content_scores if score > 0) / max(1, len([s for s in content_scores if s > 0]))
+        avg_delivery = sum(score for score in delivery_scores if score > 0) / max(1, len([s for s in delivery_scores if s > 0]))
+        return avg_content, avg_delivery, (avg_content * 0.7) + (avg_delivery * 0.3)  # Weighted average
+    
+    async def _get_ai_response(self, prompt: str, schema: Type[T], models: Optional[List[str]] = None,
+                               max_tokens: int = RESPONSE_MAX_TOKENS) -> T:
+        """Get a typed response from the AI model
         
         Args:
             prompt: The prompt to send to the AI
-            model: The model to use (default: google/gemma-3-4b-it:free)
+            schema: Pydantic model the response is parsed into
+            models: Models to try in order (default: the client's configured fallback list)
+            max_tokens: Completion token cap
             
         Returns:
-            str: The AI's response as a string
+            The parsed response as an instance of schema
+            
+        Raises:
+            LLMUnavailableError: If no model answered before the request deadline
+            StructuredOutputError: If the response could not be parsed into schema
         """
+        # Add system message to ensure JSON response
+        messages = [
+            {
+                "role": "system", 
+                "content": "You are a helpful assistant that always responds with valid JSON. Do not include any text before or after the JSON object."
+            },
+            {"role": "user", "content": prompt}
+        ]
+        
         try:
-            # Add system message to ensure JSON response
-            messages = [
-                {
-                    "role": "system", 
-                    "content": "You are a helpful assistant that always responds with valid JSON. Do not include any text before or after the JSON object."
-                },
-                {"role": "user", "content": prompt}
-            ]
-            
-            completion = self.client.chat.completions.create(
-                model=model,
-                messages=messages,
+            response = await self.llm.complete(
+                messages,
+                models=models,
                 response_format={"type": "json_object"},  # Force JSON response
                 temperature=0.3,  # Lower temperature for more focused responses
-                max_tokens=2000
+                max_tokens=max_tokens,
+                extra_headers={"X-Title": "Reherz Debate Coach"}
             )
-            
-            response = completion.choices[0].message.content
-            
-            # Clean and validate the response
-            response = response.strip()
-            
-            # If the response starts with markdown code block, extract the JSON
-            if response.startswith('```json'):
-                response = response[response.find('{') : response.rfind('}') + 1]
-            elif response.startswith('```'):
-                response = response[response.find('\n') + 1 : response.rfind('```')]
-            
-            # Ensure the response is a valid JSON string
-            try:
-                parsed = json.loads(response)
-                return json.dumps(parsed, ensure_ascii=False)
-            except json.JSONDecodeError as e:
-                print(f"Failed to parse AI response as JSON: {str(e)}")
-                print(f"Response content: {response[:500]}...")
-                # Try to extract JSON from the response
-                try:
-                    start = response.find('{')
-                    end = response.rfind('}') + 1
-                    if start >= 0 and end > start:
-                        parsed = json.loads(response[start:end])
-                        return json.dumps(parsed, ensure_ascii=False)
-                except:
-                    pass
-                
-                # If all else fails, wrap the response in a JSON object
-                return json.dumps({
-                    "error": "Failed to parse AI response",
-                    "raw_response": response[:1000]
-                })
-                
-        except Exception as e:
-            error_msg = f"Error getting AI response: {str(e)}"
-            print(error_msg)
-            # Fallback response if API fails
-            return json.dumps({
-                "error": "Failed to get AI analysis. Please try again.",
-                "details": str(e)[:500]  # Truncate long error messages
-            })
+        except LLMUnavailableError as e:
+            # Surface the outage to the caller instead of storing an error blob as round analysis
+            logger.error("Error getting AI response: %s", e)
+            raise
+        
+        try:
+            return parse_structured(response, schema)
+        except StructuredOutputError as e:
+            logger.warning("Failed to parse AI response as %s: %s", schema.__name__, str(e)[:200])
+            # Raw responses are large; as a debug record they are sampled with the request
+            logger.debug("Response content: %s", response[:500])
+            raise
 
     def _format_audio_metrics(self, audio_metrics: Dict) -> Dict:
         """Format audio metrics for the AI prompt
@@ -561,40 +876,63 @@ class DebateService:
                              else "Excessive filler words"
             },
             "clarity": {
-                "articulation_rate": audio_metrics.get('articulation_rate', 0),
-                "assessment": "Clear articulation" if audio_metrics.get('articulation_rate', 0) > 0.9 
+                "articulation_rate": f"{audio_metrics.get('articulation_rate', 0):.1f} syllables/s",
+                "assessment": "Clear articulation" if 3.5 <= audio_metrics.get('articulation_rate', 0) <= 6.5 
+                             else "Rushed articulation" if audio_metrics.get('articulation_rate', 0) > 6.5 
                              else "Could improve articulation"
             }
         }
 
-    def _get_rounds_summary(self, session: Dict, max_length: int = 1000) -> str:
-        """Generate a summary of previous rounds
+    def _update_rolling_summary(self, session: Dict, round_num: int) -> None:
+        """Fold a freshly stored round into the session's cached summaries
+        
+        Called once per round, right after the round data is stored, so
+        prompt assembly never has to walk the full round history again.
+        
+        Args:
+            session: The debate session data
+            round_num: The round that was just stored
+        """
+        round_data = session['rounds'][round_num]
+        analysis = round_data.get('analysis')
+        
+        if round_data['type'] == 'opening':
+            label = 'OPENING'
+        elif 'rebuttal' in round_data['type']:
+            label = 'REBUTTAL'
+        else:
+            label = round_data['type'].upper()
+        feedback = token_budget.truncate(
+            getattr(analysis, 'feedback_summary', None) or 'No summary',
+            self.ROUND_LINE_TOKEN_BUDGET
+        )
+        session['summary_lines'].append(f"ROUND {round_num} ({label}): {feedback}")
+        session['summary_blocks'].append(self._format_round_block(round_num, round_data))
+        
+        session['rounds_summary'] = token_budget.fit_lines(
+            session['summary_lines'],
+            self.ROUNDS_SUMMARY_TOKEN_BUDGET
+        )
+    
+    def _get_rounds_summary(self, session: Dict) -> str:
+        """Return the cached, token-budgeted summary of previous rounds
         
         Args:
             session: The debate session data
-            max_length: Maximum length of the summary
             
         Returns:
             str: Concise summary of previous rounds
         """
-        if not session.get('rounds'):
-            return "No previous rounds completed."
-            
-        summary = []
-        for round_num, round_data in sorted(session['rounds'].items()):
-            if round_data['type'] == 'opening':
-                summary.append(f"ROUND {round_num} (OPENING): {round_data.get('analysis', {}).get('feedback_summary', 'No summary')[:200]}...")
-            elif 'rebuttal' in round_data['type']:
-                summary.append(f"ROUND {round_num} (REBUTTAL): {round_data.get('analysis', {}).get('feedback_summary', 'No summary')[:200]}...")
-        
-        return "\n".join(summary)[:max_length]
+        return session.get('rounds_summary') or "No previous rounds completed."
     
-    def _get_debate_summary(self, session: Dict, include_transcripts: bool = False) -> str:
+    def _get_debate_summary(self, session: Dict, include_transcripts: bool = False,
+                            max_tokens: Optional[int] = None) -> str:
         """Generate a comprehensive summary of the debate
         
         Args:
             session: The debate session data
             include_transcripts: Whether to include full transcripts
+            max_tokens: Optional token budget; older rounds are dropped first
             
         Returns:
             str: Detailed debate summary
@@ -602,61 +940,86 @@ class DebateService:
         if not session.get('rounds'):
             return "No debate rounds completed."
             
-        summary = [
+        header = "\n".join([
             f"DEBATE TOPIC: {session['topic']}",
             f"USER'S POSITION: {session['user_side'].upper()}",
             f"TOTAL ROUNDS: {session.get('total_rounds', 3)}",
             "=" * 50
-        ]
+        ])
+        
+        if include_transcripts:
+            blocks = [
+                self._format_round_block(round_num, round_data, include_transcripts=True)
+                for round_num, round_data in sorted(session['rounds'].items())
+            ]
+        else:
+            blocks = session['summary_blocks']
+        
+        if max_tokens is None:
+            return "\n".join([header] + blocks)
         
-        for round_num, round_data in sorted(session['rounds'].items()):
-            round_type = round_data['type'].upper()
-            summary.append(f"\nROUND {round_num}: {round_type}")
-            summary.append("-" * 50)
-            
-            if include_transcripts and 'transcript' in round_data:
-                summary.append("\nUSER'S SPEECH:")
-                summary.append(round_data['transcript'])
-                summary.append("")
-            
-            if 'analysis' in round_data and round_data['analysis']:
-                analysis = round_data['analysis']
-                summary.append("ANALYSIS:")
-                
-                # Add content analysis
-                if 'content_analysis' in analysis:
-                    content = analysis['content_analysis']
-                    summary.append("  Content:")
-                    for key, value in content.items():
-                        if isinstance(value, list):
-                            if value:  # Only include non-empty lists
-                                summary.append(f"    {key.replace('_', ' ').title()}: {', '.join(str(v) for v in value[:5])}" + 
-                                             ("..." if len(value) > 5 else ""))
-                        elif isinstance(value, dict):
-                            pass  # Skip nested dicts for now
-                        else:
-                            summary.append(f"    {key.replace('_', ' ').title()}: {value}")
-                
-                # Add delivery analysis
-                if 'delivery_analysis' in analysis:
-                    delivery = analysis['delivery_analysis']
-                    summary.append("\n  Delivery:")
-                    for key, value in delivery.items():
-                        if isinstance(value, dict) or isinstance(value, list):
-                            continue
-                        if 'score' in key or 'count' in key or 'wpm' in key:
-                            summary.append(f"    {key.replace('_', ' ').title()}: {value}")
-                
-                # Add overall feedback
-                if 'feedback_summary' in analysis:
-                    summary.append("\n  Feedback:")
-                    summary.append(f"    {analysis['feedback_summary']}")
-                
-                # Add suggestions if available
-                if 'suggested_improvements' in analysis and analysis['suggested_improvements']:
-                    summary.append("\n  Suggested Improvements:")
-                    for i, suggestion in enumerate(analysis['suggested_improvements'][:3], 1):
-                        summary.append(f"    {i}. {suggestion}")
+        remaining = max_tokens - token_budget.count(header)
+        return "\n".join([header, token_budget.fit_lines(blocks, remaining)])
+    
+    def _format_round_block(self, round_num: int, round_data: Dict, include_transcripts: bool = False) -> str:
+        """Format one round for the debate summary
+        
+        Args:
+            round_num: The round number
+            round_data: The stored round data
+            include_transcripts: Whether to include the full transcript
+            
+        Returns:
+            str: Multi-line summary block for the round
+        """
+        round_type = round_data['type'].upper()
+        summary = [f"\nROUND {round_num}: {round_type}", "-" * 50]
+        
+        if include_transcripts and 'transcript' in round_data:
+            summary.append("\nUSER'S SPEECH:")
+            summary.append(round_data['transcript'])
+            summary.append("")
+        
+        analysis = round_data.get('analysis')
+        if analysis is not None:
+            summary.append("ANALYSIS:")
+            
+            # Add content analysis
+            if 'content_analysis' in type(analysis).model_fields:
+                content = analysis.content_analysis.model_dump()
+                summary.append("  Content:")
+                for key, value in content.items():
+                    if isinstance(value, list):
+                        if value:  # Only include non-empty lists
+                            summary.append(f"    {key.replace('_', ' ').title()}: {', '.join(str(v) for v in value[:5])}" + 
+                                         ("..." if len(value) > 5 else ""))
+                    elif isinstance(value, dict):
+                        pass  # Skip nested dicts for now
+                    else:
+                        summary.append(f"    {key.replace('_', ' ').title()}: {value}")
+            
+            # Add delivery analysis
+            if 'delivery_analysis' in type(analysis).model_fields:
+                delivery = analysis.delivery_analysis.model_dump()
+                summary.append("\n  Delivery:")
+                for key, value in delivery.items():
+                    if isinstance(value, dict) or isinstance(value, list):
+                        continue
+                    if 'score' in key or 'count' in key or 'wpm' in key:
+                        summary.append(f"    {key.replace('_', ' ').title()}: {value}")
+            
+            # Add overall feedback
+            feedback_summary = getattr(analysis, 'feedback_summary', None)
+            if feedback_summary:
+                summary.append("\n  Feedback:")
+                summary.append(f"    {token_budget.truncate(feedback_summary, self.ROUND_LINE_TOKEN_BUDGET * 2)}")
+            
+            # Add suggestions if available
+            suggested_improvements = getattr(analysis, 'suggested_improvements', None)
+            if suggested_improvements:
+                summary.append("\n  Suggested Improvements:")
+                for i, suggestion in enumerate(suggested_improvements[:3], 1):
+                    summary.append(f"    {i}. {suggestion}")
         
         return "\n".join(summary)
     
@@ -0,0 +1,135 @@
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import torch
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# How the emotion model is executed: "eager", "trace" (TorchScript, frozen)
+# or "compile" (torch.compile, needs a working C++ toolchain on CPU)
+EMOTION_BACKEND = os.getenv("EMOTION_BACKEND", "trace")
+# Input lengths, in seconds, that compiled graphs are built for
+EMOTION_BUCKET_SECONDS = [
+    float(value) for value in os.getenv("EMOTION_BUCKET_SECONDS", "2,5,10,20,30").split(",")
+]
+
+
+class _LogitsOnly(torch.nn.Module):
+    """Return bare logits so the graph has a single tensor output"""
+
+    def __init__(self, model: torch.nn.Module):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_values: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        return self.model(input_values=input_values, attention_mask=attention_mask).logits
+
+
+class BucketedEmotionModel:
+    """wav2vec2 classifier run on a few fixed input lengths
+
+    Every input is zero-padded up to the next bucket length, with an
+    attention mask so the padding is left out of the pooled representation.
+    Each bucket gets its own traced or compiled graph, built the first time
+    that bucket is used or by warm_up(), and reused for every later input
+    that falls into it. Inputs longer than the largest bucket are scored in
+    consecutive windows whose logits are averaged by length. The mask keeps
+    padding out of attention and pooling; wav2vec2-base's group norm in the
+    conv front end still sees it, which shifts logits slightly
+    (tools/benchmark_emotion.py reports by how much).
+    """
+
+    def __init__(self, model: torch.nn.Module, sr: int = 16000,
+                 backend: str = EMOTION_BACKEND, bucket_seconds: List[float] = EMOTION_BUCKET_SECONDS):
+        if backend not in ("eager", "trace", "compile"):
+            raise ValueError(f"Unknown emotion backend {backend!r}; expected eager, trace or compile")
+        self.model = model.eval()
+        self.config = model.config
+        self.device = next(model.parameters()).device
+        self.backend = backend
+        self.sr = sr
+        self.buckets = sorted(int(seconds * sr) for seconds in bucket_seconds)
+        self._module = _LogitsOnly(self.model).eval()
+        self._graphs: Dict[int, Any] = {}
+        self._lock = threading.Lock()
+
+    def bucket_for(self, length: int) -> int:
+        """Smallest bucket that holds length samples (the largest if none does)"""
+        for bucket in self.buckets:
+            if length <= bucket:
+                return bucket
+        return self.buckets[-1]
+
+    def _graph(self, bucket: int):
+        if self.backend == "eager":
+            return self._module
+        graph = self._graphs.get(bucket)
+        if graph is not None:
+            return graph
+        with self._lock:
+            if bucket not in self._graphs:
+                example = (
+                    torch.zeros(1, bucket, device=self.device),
+                    torch.ones(1, bucket, dtype=torch.long, device=self.device),
+                )
+                try:
+                    with torch.no_grad():
+                        if self.backend == "trace":
+                            graph = torch.jit.freeze(torch.jit.trace(self._module, example, check_trace=False))
+                        else:
+                            graph = torch.compile(self._module, dynamic=False)
+                        # Run once so tracing optimisations or compilation happen now
+                        graph(*example)
+                except Exception as e:
+                    logger.warning("Could not %s emotion model for %.0fs inputs, running eagerly: %s",
+                                   self.backend, bucket / self.sr, e)
+                    graph = self._module
+                self._graphs[bucket] = graph
+            return self._graphs[bucket]
+
+    def _pad(self, values: np.ndarray, bucket: int) -> Tuple[torch.Tensor, torch.Tensor]:
+        input_values = torch.zeros(1, bucket, device=self.device)
+        attention_mask = torch.zeros(1, bucket, dtype=torch.long, device=self.device)
+        input_values[0, :len(values)] = torch.from_numpy(values)
+        attention_mask[0, :len(values)] = 1
+        return input_values, attention_mask
+
+    def logits(self, input_values: np.ndarray) -> torch.Tensor:
+        """Class logits for one normalised waveform from the feature extractor
+
+        Args:
+            input_values: 1-D float32 input_values, unpadded
+
+        Returns:
+            torch.Tensor: Logits of shape (1, num_labels)
+        """
+        input_values = np.asarray(input_values, dtype=np.float32)
+        # Equal windows, so a long input never ends in a sliver too short to classify
+        count = -(-len(input_values) // self.buckets[-1]) or 1
+        step = -(-len(input_values) // count) or 1
+        windows = [input_values[start:start + step] for start in range(0, max(1, len(input_values)), step)]
+        total = None
+        with torch.no_grad():
+            for window in windows:
+                bucket = self.bucket_for(len(window))
+                logits = self._graph(bucket)(*self._pad(window, bucket)) * len(window)
+                total = logits if total is None else total + logits
+        return total / max(1, len(input_values))
+
+    def warm_up(self) -> None:
+        """Build the graph for every bucket now instead of on first use"""
+        for bucket in self.buckets:
+            self._graph(bucket)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "bucket_seconds": [bucket / self.sr for bucket in self.buckets],
+            "built_buckets": [bucket / self.sr for bucket in sorted(self._graphs)],
+        }
@@ -0,0 +1,160 @@
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from dotenv import load_dotenv
+
+from services.llm_client import LatencyTracker
+
+load_dotenv()
+
+INTERACTIVE = "interactive"  # Live debate rounds, someone is waiting on the answer
+NORMAL = "normal"            # Speech uploads on /api/process-audio
+BATCH = "batch"              # Background jobs and bulk work
+PRIORITY_CLASSES = (INTERACTIVE, NORMAL, BATCH)
+PRIORITY_RANK = {INTERACTIVE: 0, NORMAL: 1, BATCH: 2}
+
+
+class SchedulerWaitCancelled(Exception):
+    """Raised when a caller's cancel event fires while it is still queued"""
+
+
+class _Waiter:
+    def __init__(self, priority: str, seq: int):
+        self.priority = priority
+        self.seq = seq
+        self.enqueued_at = time.monotonic()
+
+    def effective_rank(self, now: float, aging_seconds: float) -> float:
+        # Every aging_seconds spent waiting promotes the request by one class
+        return PRIORITY_RANK[self.priority] - (now - self.enqueued_at) / aging_seconds
+
+
+class InferenceScheduler:
+    """Hands out a fixed number of analysis slots by priority class
+
+    Each class may hold at most its share of the slots at once, and NORMAL
+    and BATCH together never hold more than slots - interactive_reserve, so
+    a live debate round always finds a slot bulk work cannot take. (With a
+    single slot nothing can be reserved.) When a slot frees up it
+    goes to the waiter with the best rank among classes that still have room.
+    A waiter's rank improves the longer it waits, so batch work is delayed
+    under load but never starved.
+    """
+
+    def __init__(self, slots: int = 2, shares: Optional[Dict[str, int]] = None,
+                 aging_seconds: float = 30.0, interactive_reserve: int = 1):
+        self.slots = max(1, slots)
+        self.interactive_reserve = max(0, min(self.slots - 1, interactive_reserve))
+        shares = shares or {}
+        self.shares = {
+            priority: max(1, min(self.slots, shares.get(priority, self.slots)))
+            for priority in PRIORITY_CLASSES
+        }
+        self.aging_seconds = max(0.001, aging_seconds)
+        self._cond = threading.Condition()
+        self._waiting: List[_Waiter] = []
+        self._running = {priority: 0 for priority in PRIORITY_CLASSES}
+        self._completed = {priority: 0 for priority in PRIORITY_CLASSES}
+        self._wait_times = {priority: LatencyTracker() for priority in PRIORITY_CLASSES}
+        self._seq = itertools.count()
+
+    def _has_room(self, priority: str) -> bool:
+        if sum(self._running.values()) >= self.slots or self._running[priority] >= self.shares[priority]:
+            return False
+        if priority == INTERACTIVE:
+            return True
+        bulk = self._running[NORMAL] + self._running[BATCH]
+        return bulk < self.slots - self.interactive_reserve
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        now = time.monotonic()
+        eligible = [waiter for waiter in self._waiting if self._has_room(waiter.priority)]
+        if not eligible:
+            return None
+        return min(eligible, key=lambda waiter: (waiter.effective_rank(now, self.aging_seconds), waiter.seq))
+
+    @contextmanager
+    def slot(self, priority: str = NORMAL, cancel_event: Optional[threading.Event] = None) -> Iterator[float]:
+        """Block until a slot is granted for this priority class, then hold it
+
+        Args:
+            priority: One of INTERACTIVE, NORMAL or BATCH
+            cancel_event: Optional event that abandons the wait once set
+
+        Yields:
+            float: Seconds spent waiting in the queue
+        """
+        if priority not in PRIORITY_RANK:
+            raise ValueError(f"Unknown priority class: {priority}")
+
+        waiter = _Waiter(priority, next(self._seq))
+        with self._cond:
+            self._waiting.append(waiter)
+            try:
+                while self._next_waiter() is not waiter:
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise SchedulerWaitCancelled(f"Cancelled while queued as {priority}")
+                    # Wake periodically: aging and cancellation change the outcome without a notify
+                    self._cond.wait(timeout=0.25)
+            finally:
+                self._waiting.remove(waiter)
+                # The next waiter (possibly of another class with room) may now go
+                self._cond.notify_all()
+            waited = time.monotonic() - waiter.enqueued_at
+            self._running[priority] += 1
+            self._wait_times[priority].record(waited)
+
+        try:
+            yield waited
+        finally:
+            with self._cond:
+                self._running[priority] -= 1
+                self._completed[priority] += 1
+                self._cond.notify_all()
+
+    def run(self, priority: str, fn: Callable[..., Any], *args,
+            cancel_event: Optional[threading.Event] = None, **kwargs) -> Any:
+        """Call fn(*args, **kwargs) once a slot for the priority class is free"""
+        with self.slot(priority, cancel_event):
+            return fn(*args, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            classes = {}
+            for priority in PRIORITY_CLASSES:
+                waits = self._wait_times[priority]
+                p50 = waits.percentile(50)
+                p99 = waits.percentile(99)
+                classes[priority] = {
+                    "share": self.shares[priority],
+                    "running": self._running[priority],
+                    "queued": sum(1 for waiter in self._waiting if waiter.priority == priority),
+                    "completed": self._completed[priority],
+                    "queue_wait_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                    "queue_wait_p99_ms": round(p99 * 1000, 1) if p99 is not None else None,
+                }
+            return {"slots": self.slots, "interactive_reserve": self.interactive_reserve,
+                    "aging_seconds": self.aging_seconds, "classes": classes}
+
+
+def _share(priority: str, default: int) -> int:
+    return int(os.getenv(f"ANALYSIS_SHARE_{priority.upper()}", str(default)))
+
+
+_slots = int(os.getenv("ANALYSIS_SLOTS", "2"))
+
+# Bulk classes together leave ANALYSIS_INTERACTIVE_RESERVE slots free for live debate rounds
+analysis_scheduler = InferenceScheduler(
+    slots=_slots,
+    shares={
+        INTERACTIVE: _share(INTERACTIVE, _slots),
+        NORMAL: _share(NORMAL, max(1, _slots - 1)),
+        BATCH: _share(BATCH, 1),
+    },
+    aging_seconds=float(os.getenv("ANALYSIS_AGING_SECONDS", "30")),
+    interactive_reserve=int(os.getenv("ANALYSIS_INTERACTIVE_RESERVE", "1"))
+)
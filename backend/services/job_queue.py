@@ -0,0 +1,429 @@
+import contextvars
+import ipaddress
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Callbacks go only to public addresses unless their host is listed here
+# (e.g. "localhost" in development); the server would otherwise POST results
+# to anything the client names, including internal services
+CALLBACK_ALLOWED_HOSTS = {
+    host.strip().lower() for host in os.getenv("JOB_CALLBACK_ALLOWED_HOSTS", "").split(",") if host.strip()
+}
+CALLBACK_TIMEOUT_SECONDS = float(os.getenv("JOB_CALLBACK_TIMEOUT_SECONDS", "10"))
+JOB_DB_PATH = os.getenv(
+    "JOB_DB_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "jobs.db")
+)
+# Finished jobs are pruned from the shared table at most this often
+PRUNE_INTERVAL_SECONDS = 60.0
+# How often a worker checks the shared table for cancels of the jobs it runs
+CANCEL_POLL_SECONDS = float(os.getenv("JOB_CANCEL_POLL_SECONDS", "1"))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = {SUCCEEDED, FAILED, CANCELLED}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT,
+    progress REAL NOT NULL,
+    error TEXT,
+    result TEXT,
+    callback_url TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs (finished_at);
+"""
+
+
+def check_callback_url(url: str) -> None:
+    """Raise ValueError unless url is http(s) and its host resolves only to public addresses
+
+    Hosts in JOB_CALLBACK_ALLOWED_HOSTS skip the address check. The host is
+    resolved again just before each callback, but a hostile DNS server can
+    still answer differently in between, so internal services that must
+    not be reachable should also be firewalled from this server.
+    """
+    parsed = urllib.parse.urlsplit(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise ValueError("callback_url must be an http(s) URL with a host")
+    host = parsed.hostname.lower()
+    if host in CALLBACK_ALLOWED_HOSTS:
+        return
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, parsed.port or 80, proto=socket.IPPROTO_TCP)}
+    except socket.gaierror:
+        raise ValueError(f"callback_url host {host} does not resolve")
+    for address in addresses:
+        if not ipaddress.ip_address(address.split("%")[0]).is_global:
+            raise ValueError(f"callback_url host {host} resolves to a non-public address")
+
+
+class _NoRedirects(urllib.request.HTTPRedirectHandler):
+    # A redirect could point the callback at an address check_callback_url refused
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+_callback_opener = urllib.request.build_opener(_NoRedirects)
+
+
+class Job:
+    """State of one background job, shared between the API and its worker"""
+
+    def __init__(self, kind: str, callback_url: Optional[str] = None):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.status = QUEUED
+        self.stage = "queued"
+        self.progress = 0.0
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.callback_url = callback_url
+        self.cancel_event = threading.Event()
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.future = None
+        self._cleanup: Optional[Callable[[], None]] = None
+        self._on_report: Optional[Callable[["Job"], None]] = None
+
+    def report(self, stage: str, progress: float) -> None:
+        """Record the stage the worker is in and how far along it is (0-1)"""
+        self.stage = stage
+        self.progress = round(max(self.progress, min(1.0, progress)), 3)
+        if self._on_report is not None:
+            self._on_report(self)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobStore:
+    """Job state in SQLite, so every server worker can answer for every job
+
+    A job runs in the worker that accepted it. That worker writes the job's
+    state here at each transition and progress report. Other workers serve
+    status and results from this table and pass cancellation through the
+    cancel_requested flag, which the owner polls for while its jobs are
+    unfinished and also reads at each report. A worker that dies leaves its
+    jobs as they were last written.
+    """
+
+    def __init__(self, path: str = JOB_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # Opened on first use so a preloading master never holds a handle its workers inherit
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def save(self, job: Job) -> bool:
+        """Write the job's state and return whether another worker asked to cancel it"""
+        result = json.dumps(job.result, default=str) if job.finished and job.result is not None else None
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "INSERT INTO jobs (id, kind, status, stage, progress, error, result, callback_url, "
+                    "created_at, started_at, finished_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (id) DO UPDATE SET status = excluded.status, stage = excluded.stage, "
+                    "progress = excluded.progress, error = excluded.error, result = excluded.result, "
+                    "started_at = excluded.started_at, finished_at = excluded.finished_at",
+                    (job.id, job.kind, job.status, job.stage, job.progress, job.error, result,
+                     job.callback_url, job.created_at, job.started_at, job.finished_at)
+                )
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job.id,)).fetchone()
+        return bool(row and row[0])
+
+    def load(self, job_id: str) -> Optional[Job]:
+        """A read-only copy of a job, or None if it is unknown or pruned"""
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT id, kind, status, stage, progress, error, result, callback_url, "
+                "created_at, started_at, finished_at FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = Job(row[1], row[7])
+        job.id, job.status, job.stage, job.progress, job.error = row[0], row[2], row[3], row[4], row[5]
+        job.result = json.loads(row[6]) if row[6] is not None else None
+        job.created_at, job.started_at, job.finished_at = row[8], row[9], row[10]
+        return job
+
+    def cancel_requested(self, job_ids: List[str]) -> List[str]:
+        """Which of the given jobs another worker asked to cancel"""
+        if not job_ids:
+            return []
+        placeholders = ", ".join("?" * len(job_ids))
+        with self._lock:
+            rows = self._connection().execute(
+                f"SELECT id FROM jobs WHERE cancel_requested = 1 AND id IN ({placeholders})",
+                job_ids
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def request_cancel(self, job_id: str) -> None:
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+
+    def prune(self, ttl: float, max_finished: int) -> None:
+        """Same retention as JobManager applies in memory, across all workers"""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM jobs WHERE finished_at < ?", (time.time() - ttl,))
+                conn.execute(
+                    "DELETE FROM jobs WHERE finished_at IS NOT NULL AND id NOT IN "
+                    "(SELECT id FROM jobs WHERE finished_at IS NOT NULL ORDER BY finished_at DESC LIMIT ?)",
+                    (max_finished,)
+                )
+
+
+class JobManager:
+    """Runs jobs on a bounded worker pool and keeps finished results for a while
+
+    Work functions are called as fn(job, *args). They should call job.report()
+    as they progress and stop early once job.cancel_event is set. Finished
+    jobs are kept until there are more than max_finished of them or they are
+    older than ttl seconds, whichever comes first.
+
+    Without a store, jobs exist only in this process, and a server running
+    several workers would answer 404 for jobs another worker accepted. With
+    a JobStore, get() and cancel() also work for those jobs, and a watcher
+    thread passes cancels made elsewhere on to the jobs running here within
+    CANCEL_POLL_SECONDS, even while they wait for a slot or transcribe.
+    """
+
+    def __init__(self, workers: int = 1, max_finished: int = 100, ttl: float = 3600.0,
+                 store: Optional[JobStore] = None):
+        self.store = store
+        self._last_store_prune = 0.0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job-worker")
+        # Completion callbacks are sent from here, so neither a cancelling
+        # caller nor a job worker waits on the callback host
+        self._notifier = ThreadPoolExecutor(max_workers=2, thread_name_prefix="job-callback")
+        self._watcher: Optional[threading.Thread] = None
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_finished = max_finished
+        self.ttl = ttl
+
+    def submit(self, kind: str, fn: Callable[..., Any], *args,
+               callback_url: Optional[str] = None,
+               cleanup: Optional[Callable[[], None]] = None) -> Job:
+        """Queue fn for background execution and return its job immediately
+
+        Args:
+            kind: Short label for the kind of work
+            fn: Work function, called as fn(job, *args)
+            callback_url: Optional URL that receives the job state and result when done;
+                check it with check_callback_url first
+            cleanup: Optional function run once the job is over, even if it never started
+
+        Returns:
+            Job: The queued job
+        """
+        job = Job(kind, callback_url)
+        job._cleanup = cleanup
+        job._on_report = self._save
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+            self._start_watcher()
+        self._save(job)
+        # The job logs under the request id of the upload that queued it
+        job.future = self._executor.submit(contextvars.copy_context().run, self._run, job, fn, args)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """The job if this process runs it, else its last state from the store"""
+        with self._lock:
+            self._prune()
+            job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            job = self.store.load(job_id)
+        return job
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Ask a job to stop; queued jobs never start, running ones stop at their next check
+
+        Never blocks on the job's cleanup or callback. A job running in another
+        worker is flagged in the store, and that worker's watcher stops it.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            job = self.store.load(job_id)
+            if job is not None and not job.finished:
+                self.store.request_cancel(job_id)
+            return job
+        if job is None or job.finished:
+            return job
+        job.cancel_event.set()
+        if job.future is not None and job.future.cancel():
+            # Never started, so _run will not get to record the outcome or clean up
+            self._finish(job, CANCELLED)
+            self._notifier.submit(contextvars.copy_context().run, self._release_and_notify, job)
+        return job
+
+    def _run(self, job: Job, fn: Callable[..., Any], args: tuple) -> None:
+        try:
+            # Picks up a cancel requested through another worker while queued
+            self._save(job)
+            if job.cancel_event.is_set():
+                self._finish(job, CANCELLED)
+                return
+            job.status = RUNNING
+            job.started_at = time.time()
+            self._save(job)
+            try:
+                job.result = fn(job, *args)
+            except Exception as e:
+                if job.cancel_event.is_set():
+                    self._finish(job, CANCELLED)
+                else:
+                    job.error = str(e)
+                    self._finish(job, FAILED)
+                return
+            self._finish(job, CANCELLED if job.cancel_event.is_set() else SUCCEEDED)
+        finally:
+            self._release(job)
+            if job.callback_url:
+                self._notifier.submit(contextvars.copy_context().run, self._notify, job)
+
+    def _finish(self, job: Job, status: str) -> None:
+        job.status = status
+        job.finished_at = time.time()
+        if status == SUCCEEDED:
+            job.report("done", 1.0)
+        else:
+            job.stage = status
+            if status == CANCELLED:
+                job.result = None
+        self._save(job)
+
+    def _save(self, job: Job) -> None:
+        if self.store is None:
+            return
+        try:
+            if self.store.save(job):
+                job.cancel_event.set()
+        except sqlite3.Error as e:
+            # The job itself carries on; only other workers' view of it is stale
+            logger.warning("Could not store state of job %s: %s", job.id, e)
+
+    def _release_and_notify(self, job: Job) -> None:
+        self._release(job)
+        self._notify(job)
+
+    def _release(self, job: Job) -> None:
+        cleanup, job._cleanup = job._cleanup, None
+        if cleanup:
+            try:
+                cleanup()
+            except Exception as e:
+                logger.warning("Job cleanup failed for %s: %s", job.id, e)
+
+    def _notify(self, job: Job) -> None:
+        if not job.callback_url:
+            return
+        payload = {**job.to_dict(), "result": job.result}
+        request = urllib.request.Request(
+            job.callback_url,
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        try:
+            check_callback_url(job.callback_url)
+            _callback_opener.open(request, timeout=CALLBACK_TIMEOUT_SECONDS).close()
+        except Exception as e:
+            logger.warning("Job callback to %s failed: %s", job.callback_url, e)
+
+    def _start_watcher(self) -> None:
+        # Started with the first job, so it runs in the server worker rather
+        # than a preloading master; called with self._lock held
+        if self.store is None or (self._watcher is not None and self._watcher.is_alive()):
+            return
+        self._watcher = threading.Thread(target=self._watch_cancels, name="job-cancel-watcher", daemon=True)
+        self._watcher.start()
+
+    def _watch_cancels(self) -> None:
+        while True:
+            time.sleep(CANCEL_POLL_SECONDS)
+            with self._lock:
+                pending = [job.id for job in self._jobs.values() if not job.finished]
+            try:
+                cancelled = self.store.cancel_requested(pending)
+            except sqlite3.Error as e:
+                logger.warning("Could not check for cancelled jobs: %s", e)
+                continue
+            for job_id in cancelled:
+                self.cancel(job_id)
+
+    def _prune(self) -> None:
+        """Drop expired finished jobs, then the oldest ones beyond the retention cap"""
+        now = time.time()
+        finished = [job for job in self._jobs.values() if job.finished]
+        for job in finished:
+            if now - job.finished_at > self.ttl:
+                del self._jobs[job.id]
+        finished = [job for job in self._jobs.values() if job.finished]
+        for job in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job.id]
+        if self.store is not None and now - self._last_store_prune > PRUNE_INTERVAL_SECONDS:
+            self._last_store_prune = now
+            try:
+                self.store.prune(self.ttl, self.max_finished)
+            except sqlite3.Error as e:
+                logger.warning("Could not prune stored jobs: %s", e)
@@ -0,0 +1,247 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+import openai
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "https://openrouter.ai/api/v1"
+# The free tier stalls and rate-limits often, so fall back to the paid
+# endpoint of the same model before giving up.
+DEFAULT_MODELS = "google/gemma-3-4b-it:free,google/gemma-3-4b-it"
+
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class LLMUnavailableError(Exception):
+    """Raised when no configured model produced a response before the deadline"""
+
+
+class EmptyResponseError(Exception):
+    """Raised when the provider answers without any completion content"""
+
+
+def _parse_models(value: Optional[str]) -> List[str]:
+    return [model.strip() for model in (value or "").split(",") if model.strip()]
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies for one model"""
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+        self.successes = 0
+        self.failures = 0
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+        self.successes += 1
+
+    def record_failure(self) -> None:
+        self.failures += 1
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Return the given latency percentile in seconds, or None without samples"""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+        return ordered[index]
+
+    def snapshot(self) -> Dict:
+        p50 = self.percentile(50)
+        p99 = self.percentile(99)
+        return {
+            "successes": self.successes,
+            "failures": self.failures,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p99_ms": round(p99 * 1000, 1) if p99 is not None else None,
+        }
+
+
+class ResilientLLMClient:
+    """Chat completion client with deadlines, retries, hedging and model fallback
+
+    Each call gets one overall deadline. Within it, models are tried in the
+    configured order. Retryable failures (timeouts, 429s, 5xx) are retried
+    with full-jitter exponential backoff. If a request runs past the
+    model's observed latency percentile, a duplicate is sent and the first
+    answer wins.
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        models: Optional[List[str]] = None,
+        deadline: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        hedge_percentile: Optional[float] = None,
+        hedge_min_samples: int = 20,
+        backoff_base: float = 0.5,
+        backoff_cap: float = 8.0,
+    ):
+        self.client = AsyncOpenAI(
+            base_url=base_url or os.getenv("OPENROUTER_BASE_URL", DEFAULT_BASE_URL),
+            api_key=api_key or os.getenv("OPENROUTER_API_KEY"),
+            default_headers={
+                "HTTP-Referer": "http://localhost:3000",
+                "X-Title": "Reherz Speak Coach"
+            },
+            # Retries are handled here so they share the request deadline
+            max_retries=0
+        )
+        self.models = models or _parse_models(os.getenv("OPENROUTER_MODELS", DEFAULT_MODELS))
+        self.deadline = deadline or float(os.getenv("LLM_DEADLINE_SECONDS", "45"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("LLM_MAX_RETRIES", "2"))
+        self.hedge_percentile = hedge_percentile or float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+        self.hedge_min_samples = hedge_min_samples
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.latency: Dict[str, LatencyTracker] = {}
+
+    def _tracker(self, model: str) -> LatencyTracker:
+        if model not in self.latency:
+            self.latency[model] = LatencyTracker()
+        return self.latency[model]
+
+    async def complete(
+        self,
+        messages: List[Dict],
+        models: Optional[List[str]] = None,
+        deadline: Optional[float] = None,
+        **params
+    ) -> str:
+        """Return the content of the first successful chat completion
+
+        Args:
+            messages: Chat messages to send
+            models: Models to try in order (default: the configured list)
+            deadline: Seconds allowed for the whole call, retries included
+            **params: Extra arguments for chat.completions.create
+
+        Returns:
+            str: The completion text
+
+        Raises:
+            LLMUnavailableError: If every model failed or the deadline passed
+        """
+        loop = asyncio.get_running_loop()
+        deadline_at = loop.time() + (deadline or self.deadline)
+        errors = []
+
+        for model in models or self.models:
+            for attempt in range(self.max_retries + 1):
+                remaining = deadline_at - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    return await self._hedged_call(model, messages, remaining, params)
+                except Exception as e:
+                    errors.append(f"{model}: {type(e).__name__}: {str(e)[:200]}")
+                    if not self._is_retryable(e) or attempt == self.max_retries:
+                        break
+                    backoff = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+                    backoff = max(backoff, self._retry_after(e))
+                    if backoff >= deadline_at - loop.time():
+                        break
+                    await asyncio.sleep(backoff)
+
+        detail = "; ".join(errors[-3:]) if errors else "deadline exceeded before any attempt"
+        raise LLMUnavailableError(f"No model produced a response: {detail}")
+
+    async def _hedged_call(self, model: str, messages: List[Dict], remaining: float, params: Dict) -> str:
+        """Run one attempt, sending a duplicate if it runs slower than usual"""
+        tracker = self._tracker(model)
+        hedge_after = None
+        if len(tracker.samples) >= self.hedge_min_samples:
+            hedge_after = tracker.percentile(self.hedge_percentile)
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        tasks = [asyncio.ensure_future(self._call(model, messages, remaining, params))]
+        try:
+            if hedge_after is not None and hedge_after < remaining:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+                if not done:
+                    tasks.append(asyncio.ensure_future(
+                        self._call(model, messages, remaining - (loop.time() - started), params)
+                    ))
+
+            pending = set(tasks)
+            last_error: Optional[BaseException] = None
+            while pending:
+                timeout = remaining - (loop.time() - started)
+                if timeout <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    last_error = task.exception()
+            if last_error is not None:
+                raise last_error
+            raise asyncio.TimeoutError(f"{model} did not respond within {remaining:.1f}s")
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def _call(self, model: str, messages: List[Dict], timeout: float, params: Dict) -> str:
+        tracker = self._tracker(model)
+        started = time.perf_counter()
+        try:
+            completion = await self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                timeout=timeout,
+                **params
+            )
+            if not completion.choices or not completion.choices[0].message.content:
+                raise EmptyResponseError(f"{model} returned an empty completion")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            tracker.record_failure()
+            raise
+        elapsed = time.perf_counter() - started
+        tracker.record(elapsed)
+        logger.debug("LLM call completed", extra={"model": model, "duration_ms": round(elapsed * 1000, 1)})
+        return completion.choices[0].message.content
+
+    @staticmethod
+    def _is_retryable(error: BaseException) -> bool:
+        if isinstance(error, (asyncio.TimeoutError, EmptyResponseError,
+                              openai.APITimeoutError, openai.APIConnectionError)):
+            return True
+        if isinstance(error, openai.APIStatusError):
+            return error.status_code in RETRYABLE_STATUS_CODES
+        return False
+
+    @staticmethod
+    def _retry_after(error: BaseException) -> float:
+        """Seconds the provider asked us to wait, if it said so"""
+        response = getattr(error, "response", None)
+        if response is None:
+            return 0.0
+        try:
+            return float(response.headers.get("retry-after", 0))
+        except (TypeError, ValueError):
+            return 0.0
+
+    def stats(self) -> Dict[str, Dict]:
+        """Per-model success/failure counts and p50/p99 latency"""
+        return {model: tracker.snapshot() for model, tracker in self.latency.items()}
+
+
+# Shared instance so latency statistics cover every caller
+llm_client = ResilientLLMClient()
@@ -0,0 +1,167 @@
+import ctypes
+import gc
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+UNLOADED = "unloaded"
+LOADING = "loading"
+LOADED = "loaded"
+
+
+def _release_memory() -> None:
+    """Hand freed tensor memory back to the OS instead of keeping it in the allocator"""
+    gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass  # Not glibc; the allocator keeps the pages until reuse
+
+
+class ResidentModel:
+    """A model that is unloaded after sitting idle and reloaded on next use
+
+    Callers wrap each use in `with model.use() as loaded:`. The first caller
+    after an unload performs the reload while later ones wait for it, so a
+    burst of requests triggers a single load. A model is never unloaded while
+    any caller is using it. idle_seconds <= 0 keeps it resident forever.
+
+    A model loaded before a fork (gunicorn's preload_app) is never unloaded
+    in the child: its pages are shared copy-on-write with the parent, which
+    keeps them, so unloading would free nothing and the reload would make
+    a private copy. Idle unloading therefore only saves memory when models
+    are loaded after the fork; gunicorn.conf.py turns preloading off by
+    default when MODEL_IDLE_SECONDS is set.
+    """
+
+    def __init__(self, name: str, loader: Callable[[], Any], idle_seconds: float = 0.0):
+        self.name = name
+        self.idle_seconds = idle_seconds
+        self._loader = loader
+        self._value: Any = None
+        self._cond = threading.Condition()
+        self.state = UNLOADED
+        self.in_use = 0
+        self.last_used: Optional[float] = None
+        self.loads = 0
+        self.unloads = 0
+        self.last_load_seconds: Optional[float] = None
+        self.loaded_pid: Optional[int] = None
+
+    @property
+    def inherited(self) -> bool:
+        """Whether the loaded weights came from a parent process through fork"""
+        return self.state == LOADED and self.loaded_pid != os.getpid()
+
+    def load(self) -> Any:
+        """Load the model now if it is not resident, and return it"""
+        with self._cond:
+            while self.state == LOADING:
+                self._cond.wait()
+            if self.state == LOADED:
+                return self._value
+            self.state = LOADING
+        started = time.monotonic()
+        try:
+            value = self._loader()
+        except BaseException:
+            with self._cond:
+                self.state = UNLOADED
+                self._cond.notify_all()
+            raise
+        with self._cond:
+            self._value = value
+            self.state = LOADED
+            self.loaded_pid = os.getpid()
+            self.loads += 1
+            self.last_load_seconds = round(time.monotonic() - started, 2)
+            self.last_used = time.monotonic()
+            self._cond.notify_all()
+        return value
+
+    @contextmanager
+    def use(self) -> Iterator[Any]:
+        """Hold the model loaded for the duration of the block"""
+        with self._cond:
+            self.in_use += 1
+        try:
+            yield self.load()
+        finally:
+            with self._cond:
+                self.in_use -= 1
+                self.last_used = time.monotonic()
+
+    def unload_if_idle(self, now: Optional[float] = None) -> bool:
+        """Drop the model if nobody is using it and it has been idle long enough"""
+        now = time.monotonic() if now is None else now
+        with self._cond:
+            if (self.idle_seconds <= 0 or self.state != LOADED or self.in_use or self.inherited
+                    or now - self.last_used < self.idle_seconds):
+                return False
+            self._value = None
+            self.state = UNLOADED
+            self.unloads += 1
+        _release_memory()
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            idle = None
+            if self.last_used is not None and not self.in_use:
+                idle = round(time.monotonic() - self.last_used, 1)
+            return {
+                "state": self.state,
+                "in_use": self.in_use,
+                "idle_seconds": idle,
+                "unload_after_seconds": self.idle_seconds if self.idle_seconds > 0 and not self.inherited else None,
+                "shared_with_parent": self.inherited,
+                "loads": self.loads,
+                "unloads": self.unloads,
+                "last_load_seconds": self.last_load_seconds,
+            }
+
+
+class IdleReaper:
+    """Background thread that periodically unloads idle ResidentModels
+
+    The thread starts on the first call to start(), not at import, so it is
+    created in each forked worker rather than in a preloading master.
+    """
+
+    def __init__(self, models: List[ResidentModel], interval: float = 30.0):
+        self.models = models
+        self.interval = interval
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        if not any(model.idle_seconds > 0 for model in self.models):
+            return
+        inherited = [model.name for model in self.models if model.idle_seconds > 0 and model.inherited]
+        if inherited:
+            logger.warning("Idle unloading disabled for %s: loaded before fork and shared with the parent; "
+                           "set PRELOAD_APP=0 to load models per worker", ", ".join(inherited))
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="model-reaper", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            for model in self.models:
+                try:
+                    if model.unload_if_idle():
+                        logger.info("Unloaded idle model %s", model.name)
+                except Exception as e:
+                    logger.warning("Failed to unload %s: %s", model.name, e)
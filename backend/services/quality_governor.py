@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List
+
+from dotenv import load_dotenv
+
+from services.admission import AdmissionController, admission_controller
+from services.inference_scheduler import NORMAL, InferenceScheduler, analysis_scheduler
+
+load_dotenv()
+
+# Each level keeps every degradation of the levels before it
+FULL = 0            # Beam search with sampling on the primary ASR model
+GREEDY = 1          # Greedy decoding
+SMALL_MODEL = 2     # Greedy decoding on the smaller fallback ASR model
+TONE_WINDOWED = 3   # Tone classified on a window of the recording instead of all of it
+TONE_SKIPPED = 4    # Tone stage skipped
+QUALITY_LEVEL_NAMES = {
+    FULL: "full",
+    GREEDY: "greedy",
+    SMALL_MODEL: "small_model",
+    TONE_WINDOWED: "tone_windowed",
+    TONE_SKIPPED: "tone_skipped",
+}
+
+
+def _parse_thresholds(value: str) -> List[float]:
+    return [float(item) for item in value.split(",") if item.strip()]
+
+
+class QualityGovernor:
+    """Picks how much analysis quality to trade for speed under the current load
+
+    Two signals are read: the number of analyses waiting for a scheduler slot
+    and the estimated cost of admitted work that has not started yet. Each
+    has a list of ascending thresholds, one per degradation level. Crossing
+    the n-th threshold of either signal selects level n. The level in effect
+    is recorded over time so it can be graphed next to latency.
+    """
+
+    def __init__(self, scheduler: InferenceScheduler, admission: AdmissionController,
+                 queue_thresholds: List[float], wait_thresholds: List[float],
+                 history_size: int = 500):
+        self.scheduler = scheduler
+        self.admission = admission
+        self.queue_thresholds = queue_thresholds
+        self.wait_thresholds = wait_thresholds
+        self._lock = threading.Lock()
+        self._level = FULL
+        self._since = time.time()
+        self._seconds_at_level = {level: 0.0 for level in QUALITY_LEVEL_NAMES}
+        self._analyses_at_level = {level: 0 for level in QUALITY_LEVEL_NAMES}
+        self._transitions = deque(maxlen=history_size)
+
+    @staticmethod
+    def _level_for(value: float, thresholds: List[float]) -> int:
+        level = FULL
+        for index, threshold in enumerate(thresholds[:TONE_SKIPPED]):
+            if value >= threshold:
+                level = index + 1
+        return level
+
+    def _set_level(self, level: int) -> None:
+        now = time.time()
+        self._seconds_at_level[self._level] += now - self._since
+        self._since = now
+        if level != self._level:
+            self._transitions.append({"at": now, "from": self._level, "to": level})
+            self._level = level
+
+    def select_level(self) -> int:
+        """Evaluate the current load and return the quality level to analyze at"""
+        queued = sum(stats["queued"] for stats in self.scheduler.stats()["classes"].values())
+        wait = self.admission.queued_wait(NORMAL)
+        level = max(self._level_for(queued, self.queue_thresholds),
+                    self._level_for(wait, self.wait_thresholds))
+        with self._lock:
+            self._set_level(level)
+            self._analyses_at_level[level] += 1
+        return level
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._set_level(self._level)
+            return {
+                "current_level": self._level,
+                "current": QUALITY_LEVEL_NAMES[self._level],
+                "queue_thresholds": self.queue_thresholds,
+                "wait_thresholds_seconds": self.wait_thresholds,
+                "seconds_at_level": {
+                    QUALITY_LEVEL_NAMES[level]: round(seconds, 1)
+                    for level, seconds in self._seconds_at_level.items()
+                },
+                "analyses_at_level": {
+                    QUALITY_LEVEL_NAMES[level]: count
+                    for level, count in self._analyses_at_level.items()
+                },
+                "transitions": list(self._transitions),
+            }
+
+
+quality_governor = QualityGovernor(
+    analysis_scheduler,
+    admission_controller,
+    queue_thresholds=_parse_thresholds(os.getenv("QUALITY_QUEUE_THRESHOLDS", "2,4,6,8")),
+    wait_thresholds=_parse_thresholds(os.getenv("QUALITY_WAIT_THRESHOLDS", "10,20,30,45"))
+)
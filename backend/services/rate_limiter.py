@@ -0,0 +1,35 @@
+import asyncio
+import time
+
+
+class AsyncTokenBucket:
+    """Token bucket for pacing outbound calls from async code
+
+    Tokens refill continuously at `rate` per second up to `burst`. Each
+    acquire takes one token, waiting until one is available. rate must be
+    positive; a bucket that never refills would block forever.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        if rate <= 0:
+            raise ValueError(f"Token bucket rate must be positive, got {rate}")
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        # The lock makes waiters queue in arrival order instead of racing for refills
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
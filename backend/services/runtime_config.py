@@ -0,0 +1,104 @@
+import glob
+import os
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Server processes; gunicorn.conf.py starts this many workers
+WORKERS = max(1, int(os.getenv("WEB_CONCURRENCY", "2")))
+# Pin each worker to its own physical cores so workers don't migrate onto each other's
+CPU_AFFINITY = os.getenv("CPU_AFFINITY", "0") == "1"
+# torch intra-op threads per worker; 0 means the worker's share of physical cores
+TORCH_INTRA_OP_THREADS = int(os.getenv("TORCH_INTRA_OP_THREADS", "0"))
+# torch inter-op threads per worker; the analysis models run few independent ops
+TORCH_INTER_OP_THREADS = int(os.getenv("TORCH_INTER_OP_THREADS", "1"))
+
+# What configure_worker applied in this process, None until it has run
+applied_config: Optional[Dict[str, object]] = None
+
+
+def physical_cores() -> List[List[int]]:
+    """Logical CPUs this process may use, grouped by the physical core they share
+
+    Hyperthread siblings share one core's execution units, so two torch
+    threads on siblings are barely faster than one. Reads the Linux sysfs
+    topology; elsewhere every logical CPU counts as its own core.
+    """
+    available = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+    cores: Dict[tuple, List[int]] = {}
+    for cpu in available:
+        base = f"/sys/devices/system/cpu/cpu{cpu}/topology"
+        try:
+            with open(f"{base}/physical_package_id") as f:
+                package = int(f.read())
+            with open(f"{base}/core_id") as f:
+                core = int(f.read())
+        except (OSError, ValueError):
+            package, core = 0, cpu
+        cores.setdefault((package, core), []).append(cpu)
+    return [cpus for _, cpus in sorted(cores.items())]
+
+
+def worker_cores(index: int, workers: int = WORKERS) -> List[List[int]]:
+    """The contiguous block of physical cores that belongs to one worker
+
+    Cores are split as evenly as possible; with more workers than cores,
+    workers share cores round-robin.
+    """
+    cores = physical_cores()
+    if workers >= len(cores):
+        return [cores[index % len(cores)]]
+    per_worker, extra = divmod(len(cores), workers)
+    start = index * per_worker + min(index, extra)
+    return cores[start:start + per_worker + (1 if index < extra else 0)]
+
+
+def intra_op_threads(workers: int = WORKERS) -> int:
+    """torch intra-op threads for each worker: its share of physical cores unless set"""
+    if TORCH_INTRA_OP_THREADS > 0:
+        return TORCH_INTRA_OP_THREADS
+    return max(1, len(physical_cores()) // workers)
+
+
+def configure_worker(index: Optional[int] = None, workers: int = WORKERS) -> Dict[str, object]:
+    """Apply thread counts and, if enabled, CPU pinning to the current process
+
+    Called once per worker right after fork (gunicorn's post_fork hook), before
+    the worker runs any torch work. The thread count set here is the default
+    every thread of the worker picks up when it first runs a torch op.
+
+    Args:
+        index: The worker's position among its siblings; only used for pinning
+        workers: How many workers share the machine
+
+    Returns:
+        Dict describing what was applied, for logging
+    """
+    global applied_config
+    import torch
+
+    applied: Dict[str, object] = {"intra_op_threads": intra_op_threads(workers)}
+    if CPU_AFFINITY and index is not None and hasattr(os, "sched_setaffinity"):
+        cores = worker_cores(index, workers)
+        cpus = sorted(cpu for core in cores for cpu in core)
+        os.sched_setaffinity(0, cpus)
+        applied["cpus"] = cpus
+        if TORCH_INTRA_OP_THREADS <= 0:
+            applied["intra_op_threads"] = len(cores)
+
+    torch.set_num_threads(applied["intra_op_threads"])
+    try:
+        torch.set_num_interop_threads(TORCH_INTER_OP_THREADS)
+        applied["inter_op_threads"] = TORCH_INTER_OP_THREADS
+    except RuntimeError:
+        # The inter-op pool already started (e.g. in a preloading master); it keeps its size
+        applied["inter_op_threads"] = torch.get_num_interop_threads()
+    applied_config = applied
+    return applied
+
+
+def numa_nodes() -> int:
+    """Number of NUMA nodes, for reporting alongside the core layout"""
+    return max(1, len(glob.glob("/sys/devices/system/node/node[0-9]*")))
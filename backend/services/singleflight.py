@@ -0,0 +1,45 @@
+import asyncio
+import hashlib
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+def text_hash(text: str) -> str:
+    """Stable digest of a transcript, used to key identical requests"""
+    return hashlib.sha256((text or "").strip().encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """Coalesce identical in-flight calls so only one of them does the work
+
+    The first caller for a key starts the work. Callers that arrive with the
+    same key while it is pending await the same future. The work is
+    shielded, so one caller disconnecting does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        future = self._inflight.get(key)
+        if future is None:
+            self.started += 1
+            future = asyncio.ensure_future(fn())
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(future)
+
+    def _forget(self, key: Hashable, future: asyncio.Future) -> None:
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        # Mark the exception as retrieved even if every caller went away
+        if not future.cancelled():
+            future.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {"inflight": len(self._inflight), "started": self.started, "coalesced": self.coalesced}
@@ -0,0 +1,74 @@
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+
+from services.inference_scheduler import analysis_scheduler
+
+load_dotenv()
+
+# Whether independent analysis stages of one request run at the same time
+CONCURRENT_STAGES = os.getenv("ANALYSIS_CONCURRENT_STAGES", "1") == "1"
+
+
+class StagePool:
+    """Small thread pool that runs one request's independent stages side by side
+
+    The heavy stages spend their time in torch or NumPy kernels that release
+    the GIL, so threads are enough to overlap them. The executor is created on
+    first use, so it belongs to each forked worker rather than a preloading
+    master. Each stage's wall time is recorded in the timings dict passed in.
+
+    Stages do not get their own torch thread counts. torch.set_num_threads
+    sets torch's intra-op pool and MKL for the whole process, so a stage
+    changing it would change it for every stage and request running beside
+    it, and the last one to restore would win. All stages share the worker's
+    intra-op threads from runtime_config.configure_worker instead.
+    """
+
+    def __init__(self, workers: int, concurrent: bool = True):
+        self.workers = max(1, workers)
+        self.concurrent = concurrent
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="analysis-stage")
+            return self._executor
+
+    def run(self, stage: str, fn: Callable[..., Any], *args,
+            timings: Optional[Dict[str, float]] = None, **kwargs) -> Any:
+        """Run a stage on the calling thread"""
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            if timings is not None:
+                timings[stage] = round(time.perf_counter() - started, 3)
+
+    def submit(self, stage: str, fn: Callable[..., Any], *args,
+               timings: Optional[Dict[str, float]] = None, **kwargs) -> Future:
+        """Start a stage on the pool; with concurrency off it runs right away"""
+        if not self.concurrent:
+            future: Future = Future()
+            try:
+                future.set_result(self.run(stage, fn, *args, timings=timings, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+            return future
+        # Carry the request's context (its log request id) onto the pool thread
+        return self._get_executor().submit(contextvars.copy_context().run, self.run, stage, fn, *args,
+                                           timings=timings, **kwargs)
+
+
+# Two side stages per running analysis (tone and tempo) while ASR runs on the caller
+stage_pool = StagePool(
+    workers=int(os.getenv("ANALYSIS_STAGE_WORKERS", str(2 * analysis_scheduler.slots))),
+    concurrent=CONCURRENT_STAGES,
+)
@@ -0,0 +1,204 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" writes one object per line for log shippers; "text" is easier to read locally
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# Records waiting for the writer thread; when full, new records are dropped and counted
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Records below this level are verbose and subject to per-endpoint sampling
+SAMPLED_BELOW = logging.WARNING
+REQUEST_ID_HEADER = "X-Request-ID"
+
+
+def _parse_rates(value: str) -> Dict[str, float]:
+    """Parse "/api/process-audio=0.1,/api/jobs=0.5" into path prefix -> keep probability"""
+    rates = {}
+    for item in value.split(","):
+        if "=" in item:
+            prefix, rate = item.split("=", 1)
+            rates[prefix.strip()] = max(0.0, min(1.0, float(rate)))
+    return rates
+
+
+# Share of requests whose verbose records are kept, by longest matching path prefix
+LOG_SAMPLE_RATES = _parse_rates(os.getenv("LOG_SAMPLE_RATES", ""))
+LOG_SAMPLE_DEFAULT = float(os.getenv("LOG_SAMPLE_DEFAULT", "1.0"))
+
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+endpoint_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("endpoint", default=None)
+# Decided once per request so a sampled request keeps all of its verbose lines
+sampled_var: contextvars.ContextVar[bool] = contextvars.ContextVar("log_sampled", default=True)
+
+# Attributes every LogRecord has; anything else was passed through extra= and is logged as a field
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id", "endpoint"}
+
+
+def sample_rate(path: str) -> float:
+    matches = [prefix for prefix in LOG_SAMPLE_RATES if path.startswith(prefix)]
+    return LOG_SAMPLE_RATES[max(matches, key=len)] if matches else LOG_SAMPLE_DEFAULT
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps records with the current request and drops unsampled verbose ones
+
+    Runs in the thread that logs, where the request's context variables are
+    visible; the writer thread only sees the stamped copy. Pass
+    extra={"always_log": True} to exempt a record from sampling.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        record.endpoint = endpoint_var.get()
+        if record.levelno < SAMPLED_BELOW and not sampled_var.get():
+            return getattr(record, "always_log", False)
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of waiting when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Like the base class, resolve the message and traceback now (args may
+        # change after the call), but keep the traceback out of the message
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            "endpoint": getattr(record, "endpoint", None),
+        }
+        entry.update({key: value for key, value in vars(record).items()
+                      if key not in _RECORD_FIELDS and key != "always_log"})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+_handler: Optional[NonBlockingQueueHandler] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _writer() -> logging.Handler:
+    stream = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "json":
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+    return stream
+
+
+def _start_listener() -> None:
+    global _listener
+    _listener = logging.handlers.QueueListener(_handler.queue, _writer(), respect_handler_level=False)
+    _listener.start()
+
+
+def _restart_after_fork() -> None:
+    # The writer thread does not survive fork, and the inherited queue may be
+    # mid-operation; each worker gets a fresh queue and its own writer
+    if _handler is None:
+        return
+    _handler.queue = queue.Queue(LOG_QUEUE_SIZE)
+    _handler.dropped = 0
+    _start_listener()
+
+
+def _stop_listener() -> None:
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+def configure_logging() -> None:
+    """Route the root logger through a bounded queue to a background writer thread
+
+    Logging calls only stamp the record with the request id and enqueue it;
+    formatting and stdout writes happen on the writer thread, so no request
+    waits on log I/O. Safe to call more than once. Forked workers (gunicorn
+    with preload) start their own writer automatically.
+    """
+    global _handler
+    if _handler is not None:
+        return
+    _handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    _handler.addFilter(RequestContextFilter())
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(LOG_LEVEL)
+    _start_listener()
+    os.register_at_fork(after_in_child=_restart_after_fork)
+    atexit.register(_stop_listener)
+
+
+def dropped_records() -> int:
+    """Records discarded because the writer fell behind (this process)"""
+    return _handler.dropped if _handler is not None else 0
+
+
+async def request_context(request, call_next):
+    """HTTP middleware: request id, sampling decision and one latency line per request
+
+    The id comes from the X-Request-ID header when the client sends one and
+    is echoed back, so client-side timings can be joined to these logs.
+    """
+    request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+    path = request.url.path
+    tokens = (
+        request_id_var.set(request_id),
+        endpoint_var.set(f"{request.method} {path}"),
+        sampled_var.set(random.random() < sample_rate(path)),
+    )
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        response.headers[REQUEST_ID_HEADER] = request_id
+        return response
+    finally:
+        logging.getLogger("reherz.access").info(
+            "request finished",
+            extra={"status": status_code, "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+                   "always_log": True}
+        )
+        for var, token in zip((request_id_var, endpoint_var, sampled_var), tokens):
+            var.reset(token)
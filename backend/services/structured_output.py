@@ -0,0 +1,275 @@
+import json
+import re
+from typing import Annotated, Any, Dict, List, Optional, Type, TypeVar
+
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field, ValidationError
+
+T = TypeVar("T", bound=BaseModel)
+
+_FENCE_RE = re.compile(r"^```[a-zA-Z]*\s*\n?(.*?)(?:\n?```\s*)?$", re.DOTALL)
+_DANGLING_KEY_RE = re.compile(r'[{,]\s*"(?:[^"\\]|\\.)*"\s*:?\s*$')
+_NUMBER_RE = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+class StructuredOutputError(Exception):
+    """Raised when an LLM response cannot be turned into the expected schema"""
+
+    def __init__(self, message: str, raw: str = ""):
+        super().__init__(message)
+        self.raw = raw
+
+
+# --- Field coercion -------------------------------------------------------
+# Small models often answer "85/100" or "85" for scores and a bare string
+# where a list was asked for; accept those instead of failing the round.
+
+def _coerce_score(value: Any) -> float:
+    if value is None or isinstance(value, bool):
+        return 0.0
+    if isinstance(value, (int, float)):
+        number = float(value)
+    else:
+        match = _NUMBER_RE.search(str(value))
+        number = float(match.group()) if match else 0.0
+    return max(0.0, min(100.0, number))
+
+
+def _coerce_count(value: Any) -> int:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(value)
+    match = _NUMBER_RE.search(str(value or ""))
+    return int(float(match.group())) if match else 0
+
+
+def _coerce_text(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        return " ".join(str(v) for v in value)
+    return str(value)
+
+
+def _coerce_list(value: Any) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(v) for v in value if v is not None]
+    return [str(value)]
+
+
+Score = Annotated[float, BeforeValidator(_coerce_score)]
+Count = Annotated[int, BeforeValidator(_coerce_count)]
+Text = Annotated[str, BeforeValidator(_coerce_text)]
+TextList = Annotated[List[str], BeforeValidator(_coerce_list)]
+
+
+class _Schema(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+
+# --- Opening round --------------------------------------------------------
+
+class OpeningContentAnalysis(_Schema):
+    structure_score: Score = 0
+    clarity_score: Score = 0
+    argument_strength: Score = 0
+    key_points_identified: TextList = []
+    missing_elements: TextList = []
+
+
+class OpeningDeliveryAnalysis(_Schema):
+    pace_score: Score = 0
+    tone_score: Score = 0
+    pauses_score: Score = 0
+    filler_word_count: Count = 0
+    wpm: Count = 0
+    tone_analysis: Text = ""
+    pace_analysis: Text = ""
+
+
+class OpeningRoundAnalysis(_Schema):
+    content_analysis: OpeningContentAnalysis = Field(default_factory=OpeningContentAnalysis)
+    delivery_analysis: OpeningDeliveryAnalysis = Field(default_factory=OpeningDeliveryAnalysis)
+    feedback_summary: Text = ""
+    suggested_improvements: TextList = []
+    opponent_argument: Optional[Text] = None
+
+
+# --- Rebuttal rounds ------------------------------------------------------
+
+class RebuttalContentAnalysis(_Schema):
+    relevance_score: Score = 0
+    logical_consistency: Score = 0
+    persuasiveness: Score = 0
+    fallacies_identified: TextList = []
+    points_addressed: TextList = []
+    points_missed: TextList = []
+
+
+class RebuttalDeliveryAnalysis(_Schema):
+    pace_score: Score = 0
+    tone_score: Score = 0
+    clarity_score: Score = 0
+    filler_word_count: Count = 0
+    wpm: Count = 0
+    tone_analysis: Text = ""
+    pace_analysis: Text = ""
+    clarity_analysis: Text = ""
+
+
+class MiddleRoundAnalysis(_Schema):
+    content_analysis: RebuttalContentAnalysis = Field(default_factory=RebuttalContentAnalysis)
+    delivery_analysis: RebuttalDeliveryAnalysis = Field(default_factory=RebuttalDeliveryAnalysis)
+    feedback_summary: Text = ""
+    suggested_improvements: TextList = []
+    opponent_counter: Optional[Text] = None
+
+
+# --- Closing round --------------------------------------------------------
+
+class ClosingContentAnalysis(_Schema):
+    summary_quality: Score = 0
+    rebuttal_handling: Score = 0
+    argument_strength: Score = 0
+    persuasiveness: Score = 0
+    key_points_covered: TextList = []
+    missed_opportunities: TextList = []
+
+
+class ClosingDeliveryAnalysis(_Schema):
+    delivery_score: Score = 0
+    tone_score: Score = 0
+    pace_score: Score = 0
+    clarity_score: Score = 0
+    tone_analysis: Text = ""
+    pace_analysis: Text = ""
+    clarity_analysis: Text = ""
+
+
+class FinalEvaluation(_Schema):
+    overall_score: Score = 0
+    key_strengths: TextList = []
+    areas_for_improvement: TextList = []
+    final_feedback: Text = ""
+
+
+class FinalRoundAnalysis(_Schema):
+    content_analysis: ClosingContentAnalysis = Field(default_factory=ClosingContentAnalysis)
+    delivery_analysis: ClosingDeliveryAnalysis = Field(default_factory=ClosingDeliveryAnalysis)
+    final_evaluation: FinalEvaluation = Field(default_factory=FinalEvaluation)
+    # Sections whose sub-request failed and were left at their defaults
+    failed_sections: TextList = []
+
+
+# --- Topic prefetch -------------------------------------------------------
+
+class TopicMaterial(_Schema):
+    opposing_arguments: TextList = []
+    rebuttal_prompts: TextList = []
+    evidence_angles: TextList = []
+
+
+# --- Speech feedback (/api/generate-ai-response) --------------------------
+
+class SpeechFeedback(_Schema):
+    suggestions: TextList
+    feedback: Text
+    score: Score
+
+
+# --- Parsing --------------------------------------------------------------
+
+def _strip_fences(text: str) -> str:
+    match = _FENCE_RE.match(text)
+    return match.group(1).strip() if match else text
+
+
+def _close_truncated(fragment: str) -> str:
+    """Close any string, array and object left open by a cut-off completion"""
+    stack = []
+    in_string = False
+    escaped = False
+    for ch in fragment:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+
+    if in_string:
+        fragment += '"'
+    fragment = fragment.rstrip().rstrip(",:").rstrip()
+    # A key with no value yet ({"a": 1, "b") cannot be completed; drop it
+    if stack and stack[-1] == "}":
+        dangling = _DANGLING_KEY_RE.search(fragment)
+        if dangling:
+            fragment = fragment[:dangling.start() + 1].rstrip(",")
+    return fragment + "".join(reversed(stack))
+
+
+def parse_json_object(text: str) -> Dict[str, Any]:
+    """Extract a JSON object from an LLM completion in a single pass
+
+    Handles markdown fences, prose before or after the object, and
+    completions truncated by max_tokens.
+
+    Raises:
+        StructuredOutputError: If no JSON object can be recovered
+    """
+    raw = text or ""
+    body = _strip_fences(raw.strip())
+    start = body.find("{")
+    if start < 0:
+        raise StructuredOutputError("Response contains no JSON object", raw)
+
+    try:
+        parsed, _ = json.JSONDecoder().raw_decode(body, start)
+        if isinstance(parsed, dict):
+            return parsed
+    except json.JSONDecodeError:
+        pass
+
+    # Truncated output: close it, and if a half-written value still breaks
+    # parsing, back off to the previous comma and try again.
+    fragment = body[start:]
+    for _ in range(20):
+        try:
+            parsed = json.loads(_close_truncated(fragment))
+            if isinstance(parsed, dict):
+                return parsed
+        except json.JSONDecodeError:
+            pass
+        cut = fragment.rfind(",")
+        if cut <= 0:
+            break
+        fragment = fragment[:cut]
+
+    raise StructuredOutputError("Response is not valid JSON and could not be repaired", raw)
+
+
+def parse_structured(text: str, schema: Type[T]) -> T:
+    """Parse an LLM completion straight into a typed schema object
+
+    Args:
+        text: Raw completion text
+        schema: Pydantic model describing the expected response
+
+    Returns:
+        The validated schema instance
+
+    Raises:
+        StructuredOutputError: If the text is not recoverable JSON or does not fit the schema
+    """
+    data = parse_json_object(text)
+    try:
+        return schema.model_validate(data)
+    except ValidationError as e:
+        raise StructuredOutputError(f"Response does not match {schema.__name__}: {e}", text or "")
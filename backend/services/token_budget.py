@@ -0,0 +1,108 @@
+import logging
+from typing import List, Optional
+
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+# OpenRouter models do not publish their tokenizers, so cl100k_base is used as
+# a close, model-agnostic estimate of prompt size.
+DEFAULT_ENCODING = "cl100k_base"
+
+
+class _ApproximateEncoding:
+    """Fallback of roughly four characters per token when BPE ranks are unavailable"""
+
+    CHARS_PER_TOKEN = 4
+
+    def encode(self, text: str, disallowed_special=()) -> List[str]:
+        step = self.CHARS_PER_TOKEN
+        return [text[i:i + step] for i in range(0, len(text), step)]
+
+    def decode(self, tokens: List[str]) -> str:
+        return "".join(tokens)
+
+
+class TokenBudget:
+    def __init__(self, encoding_name: str = DEFAULT_ENCODING):
+        self.encoding_name = encoding_name
+        self._encoding = None
+
+    @property
+    def encoding(self):
+        # Loaded lazily: the first call may need to fetch the BPE ranks
+        if self._encoding is None:
+            try:
+                self._encoding = tiktoken.get_encoding(self.encoding_name)
+            except Exception as e:
+                # Offline hosts cannot download the ranks; budgets still need to hold
+                logger.warning("Could not load tiktoken encoding %s, approximating: %s", self.encoding_name, str(e)[:200])
+                self._encoding = _ApproximateEncoding()
+        return self._encoding
+
+    def count(self, text: Optional[str]) -> int:
+        """Return the number of tokens in the given text"""
+        if not text:
+            return 0
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: Optional[str], max_tokens: int, suffix: str = "...") -> str:
+        """Cut text down to at most max_tokens tokens
+
+        Args:
+            text: Text to truncate
+            max_tokens: Maximum number of tokens to keep
+            suffix: Marker appended when the text was shortened
+
+        Returns:
+            str: The original text if it fits, otherwise its leading tokens plus suffix
+        """
+        if not text or max_tokens <= 0:
+            return ""
+        tokens = self.encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        return self.encoding.decode(tokens[:max_tokens]).rstrip() + suffix
+
+    def fit_lines(self, lines: List[str], max_tokens: int, keep_first: bool = True) -> str:
+        """Join lines newest-first until the token budget is spent
+
+        Older lines are dropped before newer ones. When keep_first is set the
+        first line (e.g. the opening round) is always kept if it fits, because
+        later rounds keep referring back to it.
+
+        Args:
+            lines: Lines in chronological order
+            max_tokens: Token budget for the joined result
+            keep_first: Whether to pin the first line
+
+        Returns:
+            str: Lines that fit in the budget, in chronological order
+        """
+        if not lines:
+            return ""
+
+        remaining = max_tokens
+        head: List[str] = []
+        if keep_first:
+            first_cost = self.count(lines[0]) + 1
+            if first_cost <= remaining:
+                head = [lines[0]]
+                remaining -= first_cost
+            lines = lines[1:]
+
+        tail: List[str] = []
+        for line in reversed(lines):
+            cost = self.count(line) + 1  # +1 for the joining newline
+            if cost > remaining:
+                break
+            tail.append(line)
+            remaining -= cost
+
+        if head and len(tail) < len(lines):
+            head.append("...")
+        return "\n".join(head + list(reversed(tail)))
+
+
+# Shared instance so the encoding is only loaded once per process
+token_budget = TokenBudget()
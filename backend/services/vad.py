@@ -0,0 +1,146 @@
+import os
+from typing import List, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+VAD_ENABLED = os.getenv("VAD_ENABLED", "1") == "1"
+
+
+class SpeechRegions:
+    """Speech spans of a recording and the mapping back to its timeline
+
+    regions holds (start, end) sample indices into the original audio. audio()
+    joins just those spans, and to_original() converts a time in the joined
+    audio back to the matching time in the recording.
+    """
+
+    def __init__(self, regions: List[Tuple[int, int]], sr: int):
+        self.regions = regions
+        self.sr = sr
+        lengths = np.array([end - start for start, end in regions], dtype=np.int64)
+        self._joined_ends = np.cumsum(lengths)
+        self._joined_starts = self._joined_ends - lengths
+
+    @property
+    def speech_seconds(self) -> float:
+        return float(self._joined_ends[-1]) / self.sr if self.regions else 0.0
+
+    def audio(self, y: np.ndarray) -> np.ndarray:
+        if not self.regions:
+            return y[:0]
+        return np.concatenate([y[start:end] for start, end in self.regions])
+
+    def to_original(self, seconds: float, is_end: bool = False) -> float:
+        """Map a time in the joined audio to the original recording
+
+        A time exactly on the seam between two regions belongs to the end of
+        the earlier one when is_end is set, otherwise to the start of the later.
+        """
+        if not self.regions:
+            return seconds
+        sample = seconds * self.sr
+        side = "left" if is_end else "right"
+        index = int(np.searchsorted(self._joined_ends, sample, side=side))
+        index = min(index, len(self.regions) - 1)
+        offset = sample - self._joined_starts[index]
+        return (self.regions[index][0] + offset) / self.sr
+
+    def chunks(self, max_seconds: float = 30.0) -> List["SpeechRegions"]:
+        """Group regions into pieces of at most max_seconds of speech each
+
+        Whisper only sees 30 seconds at a time. Regions are packed whole
+        where possible; a single region longer than the limit is cut into
+        consecutive pieces.
+        """
+        limit = int(max_seconds * self.sr)
+        pieces: List[Tuple[int, int]] = []
+        for start, end in self.regions:
+            while end - start > limit:
+                pieces.append((start, start + limit))
+                start += limit
+            pieces.append((start, end))
+
+        chunks: List[SpeechRegions] = []
+        current: List[Tuple[int, int]] = []
+        length = 0
+        for start, end in pieces:
+            if current and length + (end - start) > limit:
+                chunks.append(SpeechRegions(current, self.sr))
+                current, length = [], 0
+            current.append((start, end))
+            length += end - start
+        if current:
+            chunks.append(SpeechRegions(current, self.sr))
+        return chunks
+
+
+def detect_speech(y: np.ndarray, sr: int, frame_ms: float = 30.0, threshold_db: float = 12.0,
+                  min_silence_ms: float = 400.0, min_speech_ms: float = 120.0,
+                  pad_ms: float = 150.0) -> SpeechRegions:
+    """Find speech in a recording from frame energy
+
+    A frame is speech when its level is threshold_db above the recording's
+    noise floor (its 10th percentile frame level). Silences shorter than
+    min_silence_ms are bridged so ordinary pauses between words stay inside
+    a region, bursts shorter than min_speech_ms are dropped as clicks, and
+    each region is padded by pad_ms so word onsets are not clipped.
+
+    Args:
+        y: Mono audio samples
+        sr: Sample rate of y
+
+    Returns:
+        SpeechRegions: The detected speech spans, possibly empty
+    """
+    frame = max(1, int(sr * frame_ms / 1000))
+    n_frames = len(y) // frame
+    if n_frames == 0:
+        return SpeechRegions([(0, len(y))] if len(y) else [], sr)
+
+    # Non-overlapping frames: one reshape instead of a per-frame loop
+    frames = y[:n_frames * frame].reshape(n_frames, frame)
+    level_db = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+    noise_floor = np.percentile(level_db, 10)
+    is_speech = level_db > max(noise_floor + threshold_db, level_db.max() - 50)
+
+    # Bridge short silences, then drop short bursts
+    is_speech = _fill_runs(is_speech, False, int(min_silence_ms / frame_ms))
+    is_speech = _fill_runs(is_speech, True, int(min_speech_ms / frame_ms))
+
+    edges = np.diff(np.concatenate(([0], is_speech.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1) * frame
+    ends = np.flatnonzero(edges == -1) * frame
+    if n_frames * frame < len(y) and len(ends) and ends[-1] == n_frames * frame:
+        ends[-1] = len(y)
+
+    pad = int(sr * pad_ms / 1000)
+    regions: List[Tuple[int, int]] = []
+    for start, end in zip(starts, ends):
+        start, end = max(0, int(start) - pad), min(len(y), int(end) + pad)
+        if regions and start <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+    return SpeechRegions(regions, sr)
+
+
+def _fill_runs(mask: np.ndarray, value: bool, max_run: int) -> np.ndarray:
+    """Flip runs of `value` no longer than max_run frames to the opposite value
+
+    Silence runs touching either end of the recording are left alone: they
+    are leading or trailing silence, not a gap to bridge.
+    """
+    if max_run <= 0:
+        return mask
+    mask = mask.copy()
+    edges = np.diff(np.concatenate(([0], (mask == value).astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    for start, end in zip(starts, ends):
+        at_edge = start == 0 or end == len(mask)
+        if end - start <= max_run and (value or not at_edge):
+            mask[start:end] = not value
+    return mask
@@ -0,0 +1,113 @@
+"""Offline checks for analysis history: delivery scoring, analytics and debate recording.
+
+Runs without a server, models or network. The debate check drives
+DebateService against tools/fake_openrouter.py in-process and records rounds
+the way POST /api/debate/round does.
+
+Usage:
+    python test_analysis_store.py
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+
+os.environ.setdefault("OPENROUTER_API_KEY", "offline")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "tools"))
+
+import httpx  # noqa: E402
+from openai import AsyncOpenAI  # noqa: E402
+
+from fake_openrouter import create_app  # noqa: E402
+from services.analysis_store import DEBATE, SPEECH, AnalysisStore, score_delivery  # noqa: E402
+from services.debate_service import DebateService  # noqa: E402
+from services.llm_client import llm_client  # noqa: E402
+
+
+def temp_store() -> AnalysisStore:
+    return AnalysisStore(os.path.join(tempfile.mkdtemp(prefix="reherz-test-"), "history.db"))
+
+
+def test_score_delivery():
+    scores = score_delivery({"wpm": 155, "filler_words_per_minute": 1.0,
+                             "avg_pause_duration": 1.0, "articulation_rate": 5.0})
+    assert scores == {"pace_score": 100.0, "filler_score": 100.0, "pause_score": 100.0,
+                      "clarity_score": 100.0, "overall_score": 100.0}, scores
+
+    # Same pace band as the debate coach: 150-160 wpm, 2 points per wpm outside it
+    assert score_delivery({"wpm": 145})["pace_score"] == 90.0
+    assert score_delivery({"wpm": 170})["pace_score"] == 80.0
+
+    # Metrics a selective analysis skipped are left out of the overall score
+    partial = score_delivery({"wpm": 170})
+    assert partial["filler_score"] is None and partial["overall_score"] == 80.0
+    assert score_delivery({})["overall_score"] is None
+
+
+def test_analytics():
+    store = temp_store()
+    for wpm in (120, 140, 160, 180):
+        store.record("alice", SPEECH, {"wpm": wpm, "transcript": "hello there"})
+    store.record("bob", SPEECH, {"wpm": 100})
+    store.record("alice", DEBATE, {"wpm": 150}, overall_score=70)
+
+    result = store.analytics("alice", SPEECH, window=2)
+    assert result["sessions"] == 4, result
+    wpm = result["metrics"]["wpm"]
+    assert wpm["latest"] == 180 and wpm["mean"] == 150
+    assert wpm["rolling_average"] == [130.0, 150.0, 170.0]
+    assert wpm["percentile_vs_users"] == 50.0  # above bob, not above herself
+    assert wpm["percentile_vs_own_history"] == 75.0
+    assert wpm["trend_per_week"] is None  # history spans less than a day
+
+    # Rows added after the first call are picked up by the incremental cache
+    store.record("alice", SPEECH, {"wpm": 200})
+    assert store.analytics("alice", SPEECH)["sessions"] == 5
+
+    latest = store.latest("alice", DEBATE)
+    assert latest["overall_score"] == 70 and latest["session_type"] == DEBATE
+    assert store.analytics("nobody", SPEECH) == {"user_id": "nobody", "session_type": SPEECH,
+                                                 "sessions": 0, "metrics": {}}
+
+
+def test_debate_rounds_recorded_once_with_scores():
+    store = temp_store()
+    fake = create_app(argparse.Namespace(latency="fixed:0", stall_rate=0.0, stall_seconds=0.0,
+                                         rate_limit_rate=0.0, retry_after=0.0, error_rate=0.0,
+                                         malformed_rate=0.0))
+    llm_client.client = AsyncOpenAI(
+        base_url="http://fake-openrouter/v1", api_key="offline", max_retries=0,
+        http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=fake))
+    )
+    service = DebateService()
+
+    async def debate():
+        session_id = service.start_debate_session("Should AI be regulated?", "affirmative", 3)
+
+        async def record_round(result, coach_score):
+            store.record("carol", DEBATE, {"transcript": "..."}, session_id, coach_score)
+
+        final = None
+        for number in range(1, 4):
+            final = await service.process_round(session_id, f"Round {number} speech about AI regulation.",
+                                                on_scored=record_round)
+        # A client retrying the closing round gets the stored result and no new row
+        retried = await service.process_round(session_id, "Round 3 speech about AI regulation.",
+                                              on_scored=record_round)
+        assert retried is final
+        return final
+
+    final = asyncio.run(debate())
+    result = store.analytics("carol", DEBATE)
+    assert result["sessions"] == 3, result["sessions"]
+    scores = result["metrics"]["overall_score"]
+    assert len(scores["rolling_average"]) == 3, scores
+    assert scores["latest"] == final["feedback"]["final_evaluation"]["overall_score"], scores
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"PASS {name}")
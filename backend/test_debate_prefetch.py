@@ -0,0 +1,75 @@
+"""Offline checks for prefetched opposing arguments in debate rounds.
+
+Drives DebateService against tools/fake_openrouter.py in-process.
+
+Usage:
+    python test_debate_prefetch.py
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+os.environ.setdefault("OPENROUTER_API_KEY", "offline")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "tools"))
+
+import httpx  # noqa: E402
+from openai import AsyncOpenAI  # noqa: E402
+
+from fake_openrouter import create_app  # noqa: E402
+from services.debate_service import DebateService  # noqa: E402
+from services.llm_client import llm_client  # noqa: E402
+from services.structured_output import TopicMaterial  # noqa: E402
+
+MATERIAL = TopicMaterial(
+    opposing_arguments=["Prepared argument one.", "Prepared argument two."],
+    rebuttal_prompts=["Rebuttal prompt one.", "Rebuttal prompt two."],
+)
+
+
+def use_fake_openrouter():
+    fake = create_app(argparse.Namespace(latency="fixed:0", stall_rate=0.0, stall_seconds=0.0,
+                                         rate_limit_rate=0.0, retry_after=0.0, error_rate=0.0,
+                                         malformed_rate=0.0))
+    llm_client.client = AsyncOpenAI(
+        base_url="http://fake-openrouter/v1", api_key="offline", max_retries=0,
+        http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=fake))
+    )
+
+
+def test_missed_prefetch_keeps_first_prepared_argument():
+    use_fake_openrouter()
+    service = DebateService()
+    service.PREFETCH_WAIT_SECONDS = 0.05
+
+    async def debate():
+        session_id = service.start_debate_session("Should AI be regulated?", "affirmative", 4)
+        session = service.debate_sessions[session_id]
+
+        # Topic material that arrives only after the opening round gave up waiting
+        async def slow_prefetch():
+            await asyncio.sleep(0.3)
+            session['topic_material'] = MATERIAL
+            return MATERIAL
+
+        session['prefetch_task'].cancel()
+        session['prefetch_task'] = asyncio.get_running_loop().create_task(slow_prefetch())
+
+        opening = await service.process_round(session_id, "Round 1 speech about AI regulation.")
+        assert opening['opponent_argument'] not in MATERIAL.opposing_arguments, opening['opponent_argument']
+        assert session['prepared_arguments_used'] == 0
+
+        await session['prefetch_task']
+        rebuttal = await service.process_round(session_id, "Round 2 speech about AI regulation.")
+        assert rebuttal['opponent_argument'] == "Prepared argument one.", rebuttal['opponent_argument']
+        assert rebuttal['next_round_prompt'].endswith("Consider: Rebuttal prompt one.")
+        assert session['prepared_arguments_used'] == 1
+
+    asyncio.run(debate())
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"PASS {name}")
@@ -0,0 +1,63 @@
+"""Offline checks for InferenceScheduler priority classes and the interactive reserve.
+
+Usage:
+    python test_inference_scheduler.py
+"""
+import threading
+import time
+
+from services.inference_scheduler import BATCH, INTERACTIVE, NORMAL, InferenceScheduler
+
+
+def default_scheduler(slots: int = 2) -> InferenceScheduler:
+    # The same shares the shared analysis_scheduler uses by default
+    return InferenceScheduler(slots=slots, shares={INTERACTIVE: slots, NORMAL: max(1, slots - 1), BATCH: 1})
+
+
+def hold(scheduler: InferenceScheduler, priority: str, granted: threading.Event, release: threading.Event):
+    with scheduler.slot(priority):
+        granted.set()
+        release.wait(5)
+
+
+def test_bulk_work_leaves_a_slot_for_interactive():
+    scheduler = default_scheduler()
+    release = threading.Event()
+    normal, batch = threading.Event(), threading.Event()
+    threads = [threading.Thread(target=hold, args=(scheduler, NORMAL, normal, release)),
+               threading.Thread(target=hold, args=(scheduler, BATCH, batch, release))]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.3)
+    # Bulk classes together stop at slots - 1, so one of the two queues
+    assert normal.is_set() != batch.is_set()
+
+    started = time.monotonic()
+    with scheduler.slot(INTERACTIVE) as waited:
+        assert waited < 0.1 and time.monotonic() - started < 0.1, waited
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert normal.is_set() and batch.is_set()
+    assert scheduler.stats()["classes"][BATCH]["completed"] == 1
+
+
+def test_interactive_can_use_every_slot():
+    scheduler = default_scheduler()
+    with scheduler.slot(INTERACTIVE):
+        with scheduler.slot(INTERACTIVE) as waited:
+            assert waited < 0.1
+
+
+def test_single_slot_reserves_nothing():
+    scheduler = default_scheduler(slots=1)
+    assert scheduler.interactive_reserve == 0
+    with scheduler.slot(BATCH) as waited:
+        assert waited < 0.1
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"PASS {name}")
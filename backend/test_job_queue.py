@@ -0,0 +1,90 @@
+"""Offline checks for background jobs shared between server workers.
+
+Two JobManagers on one JobStore stand in for two gunicorn workers.
+
+Usage:
+    python test_job_queue.py
+"""
+import os
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("JOB_CANCEL_POLL_SECONDS", "0.1")
+
+from services import job_queue  # noqa: E402
+from services.inference_scheduler import BATCH, INTERACTIVE, InferenceScheduler  # noqa: E402
+from services.job_queue import CANCELLED, SUCCEEDED, JobManager, JobStore  # noqa: E402
+
+
+def shared_store() -> JobStore:
+    return JobStore(os.path.join(tempfile.mkdtemp(prefix="reherz-test-"), "jobs.db"))
+
+
+def wait_for(condition, timeout: float = 3.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_cancel_from_another_worker_during_slot_wait():
+    store = shared_store()
+    owner, other = JobManager(store=store), JobManager(store=store)
+    scheduler = InferenceScheduler(slots=1)
+    ran = threading.Event()
+
+    def work(job):
+        # Like run_audio_job: waits for a slot without reporting progress
+        with scheduler.slot(BATCH, job.cancel_event):
+            ran.set()
+
+    release = threading.Event()
+    holder = threading.Thread(target=lambda: scheduler.run(INTERACTIVE, release.wait, 5))
+    holder.start()
+    assert wait_for(lambda: scheduler.stats()["classes"][INTERACTIVE]["running"] == 1)
+
+    job = owner.submit("audio", work)
+    assert wait_for(lambda: scheduler.stats()["classes"][BATCH]["queued"] == 1)
+    other.cancel(job.id)
+
+    assert wait_for(lambda: job.finished), job.to_dict()
+    release.set()
+    holder.join()
+    assert job.status == CANCELLED and not ran.is_set()
+    assert wait_for(lambda: other.get(job.id).status == CANCELLED)
+
+
+def test_slow_callback_does_not_hold_a_job_worker():
+    calls = []
+
+    class SlowOpener:
+        def open(self, request, timeout=None):
+            calls.append(request.full_url)
+            time.sleep(1.0)
+            raise OSError("callback host unreachable")
+
+    original_opener = job_queue._callback_opener
+    job_queue._callback_opener = SlowOpener()
+    job_queue.CALLBACK_ALLOWED_HOSTS.add("callback.test")
+    try:
+        manager = JobManager(workers=1, store=shared_store())
+        started = time.monotonic()
+        jobs = [manager.submit("audio", lambda job: "ok", callback_url="http://callback.test/done")
+                for _ in range(2)]
+        assert wait_for(lambda: all(job.finished for job in jobs), timeout=0.5)
+        assert time.monotonic() - started < 0.5
+        assert all(job.status == SUCCEEDED for job in jobs)
+        assert wait_for(lambda: len(calls) == 2)
+    finally:
+        job_queue._callback_opener = original_opener
+        job_queue.CALLBACK_ALLOWED_HOSTS.discard("callback.test")
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"PASS {name}")
@@ -0,0 +1,93 @@
+"""Offline checks for ResidentModel loading, idle unloading and fork sharing.
+
+Uses a fake loader, so no model weights are downloaded.
+
+Usage:
+    python test_model_residency.py
+"""
+import os
+import threading
+import time
+
+from services.model_residency import LOADED, ResidentModel
+
+
+class FakeLoader:
+    def __init__(self, seconds: float = 0.0):
+        self.seconds = seconds
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.seconds)
+        return object()
+
+
+def test_concurrent_callers_share_one_load():
+    loader = FakeLoader(seconds=0.2)
+    model = ResidentModel("fake", loader, idle_seconds=60)
+    results = []
+
+    def use():
+        with model.use() as value:
+            results.append(value)
+
+    threads = [threading.Thread(target=use) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert loader.calls == 1, loader.calls
+    assert len(results) == 8 and len({id(value) for value in results}) == 1
+
+
+def test_idle_unload_and_reload():
+    loader = FakeLoader()
+    model = ResidentModel("fake", loader, idle_seconds=10)
+    model.load()
+    now = time.monotonic()
+    assert not model.unload_if_idle(now)
+    assert model.unload_if_idle(now + 11)
+    assert model.state != LOADED and model.unloads == 1
+
+    with model.use():
+        pass
+    assert loader.calls == 2 and model.stats()["loads"] == 2
+
+    # Resident forever without an idle timeout
+    pinned = ResidentModel("pinned", FakeLoader(), idle_seconds=0)
+    pinned.load()
+    assert not pinned.unload_if_idle(time.monotonic() + 10 ** 6)
+
+
+def test_in_use_model_is_not_unloaded():
+    model = ResidentModel("fake", FakeLoader(), idle_seconds=1)
+    with model.use():
+        assert not model.unload_if_idle(time.monotonic() + 100)
+    assert model.unload_if_idle(time.monotonic() + 100)
+
+
+def test_model_inherited_through_fork_is_not_unloaded():
+    model = ResidentModel("fake", FakeLoader(), idle_seconds=1)
+    model.load()
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # The parent still maps these pages, so unloading here would free nothing
+        ok = model.inherited and model.stats()["shared_with_parent"] and not model.unload_if_idle(time.monotonic() + 100)
+        os.write(write_fd, b"1" if ok else b"0")
+        os._exit(0)
+    os.close(write_fd)
+    child_ok = os.read(read_fd, 1)
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+    assert child_ok == b"1"
+    assert not model.inherited
+    assert model.unload_if_idle(time.monotonic() + 100)
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"PASS {name}")
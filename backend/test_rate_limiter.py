@@ -0,0 +1,40 @@
+"""Offline checks for AsyncTokenBucket pacing.
+
+Usage:
+    python test_rate_limiter.py
+"""
+import asyncio
+import time
+
+from services.rate_limiter import AsyncTokenBucket
+
+
+def test_burst_then_paced():
+    bucket = AsyncTokenBucket(rate=20, burst=3)
+
+    async def take(count):
+        started = time.monotonic()
+        for _ in range(count):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    # The burst is free; the next 4 tokens refill at 20 per second
+    assert asyncio.run(take(3)) < 0.05
+    elapsed = asyncio.run(take(4))
+    assert 0.15 <= elapsed < 0.4, elapsed
+
+
+def test_rejects_non_positive_rate():
+    for rate in (0, -1):
+        try:
+            AsyncTokenBucket(rate=rate, burst=4)
+        except ValueError:
+            continue
+        raise AssertionError(f"rate={rate} was accepted")
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"PASS {name}")
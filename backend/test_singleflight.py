@@ -0,0 +1,85 @@
+"""Offline checks for SingleFlight request coalescing.
+
+Usage:
+    python test_singleflight.py
+"""
+import asyncio
+
+from services.singleflight import SingleFlight, text_hash
+
+
+def test_identical_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"score": 80}
+
+    async def main():
+        return await asyncio.gather(*(flight.do("same", work) for _ in range(5)), flight.do("other", work))
+
+    results = asyncio.run(main())
+    assert len(calls) == 2, calls
+    assert all(result is results[0] for result in results[:5])
+    assert flight.stats() == {"inflight": 0, "started": 2, "coalesced": 4}
+
+
+def test_finished_key_runs_again():
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        return len(calls)
+
+    async def main():
+        return await flight.do("key", work), await flight.do("key", work)
+
+    assert asyncio.run(main()) == (1, 2)
+
+
+def test_error_reaches_every_waiter():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("provider down")
+
+    async def main():
+        return await asyncio.gather(*(flight.do("key", fail) for _ in range(3)), return_exceptions=True)
+
+    errors = asyncio.run(main())
+    assert all(isinstance(error, RuntimeError) for error in errors), errors
+    assert flight.stats()["inflight"] == 0
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        first = asyncio.ensure_future(flight.do("key", work))
+        second = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second, first.cancelled()
+
+    assert asyncio.run(main()) == ("done", True)
+
+
+def test_text_hash_ignores_surrounding_whitespace():
+    assert text_hash("  hello world\n") == text_hash("hello world")
+    assert text_hash("hello") != text_hash("Hello")
+    assert text_hash(None) == text_hash("")
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"PASS {name}")
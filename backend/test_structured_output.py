@@ -0,0 +1,64 @@
+"""Offline checks for the structured output repair parser.
+
+Usage:
+    python test_structured_output.py
+"""
+from services.structured_output import (
+    FinalRoundAnalysis, SpeechFeedback, StructuredOutputError, parse_json_object, parse_structured
+)
+
+
+def test_fenced_and_wrapped_in_prose():
+    assert parse_json_object('```json\n{"a": 1}\n```') == {"a": 1}
+    assert parse_json_object('Here you go: {"a": {"b": [1, 2]}} Hope it helps!') == {"a": {"b": [1, 2]}}
+
+
+def test_truncated_completions_are_closed():
+    assert parse_json_object('{"a": 1, "b": [1, 2') == {"a": 1, "b": [1, 2]}
+    assert parse_json_object('{"a": "cut off mid-str') == {"a": "cut off mid-str"}
+    # A key with no value yet is dropped
+    assert parse_json_object('{"a": 1, "b"') == {"a": 1}
+    # A half-written value is backed off to the previous comma
+    assert parse_json_object('{"a": 1, "b": {"c": tr') == {"a": 1}
+
+
+def test_unrecoverable_text_raises():
+    for text in ("no json here", "", None):
+        try:
+            parse_json_object(text)
+        except StructuredOutputError:
+            continue
+        raise AssertionError(f"{text!r} was accepted")
+
+
+def test_schema_coercion():
+    feedback = parse_structured('{"suggestions": "Slow down", "feedback": ["Good", "pace"], "score": "85/100"}',
+                                SpeechFeedback)
+    assert feedback.suggestions == ["Slow down"]
+    assert feedback.feedback == "Good pace" and feedback.score == 85.0
+    assert parse_structured('{"suggestions": [], "feedback": "", "score": 250}', SpeechFeedback).score == 100.0
+
+
+def test_truncated_nested_schema_keeps_defaults():
+    text = '{"content_analysis": {"summary_quality": 80}, "final_evaluation": {"overall_score": 72, "key_str'
+    result = parse_structured(text, FinalRoundAnalysis)
+    assert result.content_analysis.summary_quality == 80
+    assert result.final_evaluation.overall_score == 72
+    assert result.final_evaluation.key_strengths == []
+    assert result.delivery_analysis.delivery_score == 0
+
+
+def test_missing_required_fields_raise():
+    try:
+        parse_structured('{"feedback": "ok"}', SpeechFeedback)
+    except StructuredOutputError as e:
+        assert e.raw == '{"feedback": "ok"}'
+    else:
+        raise AssertionError("incomplete feedback was accepted")
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"PASS {name}")
@@ -0,0 +1,56 @@
+"""Offline checks for TokenBudget.fit_lines and truncate.
+
+Uses the four-characters-per-token approximation so counts are exact
+without downloading tiktoken's BPE ranks.
+
+Usage:
+    python test_token_budget.py
+"""
+from services.token_budget import TokenBudget, _ApproximateEncoding
+
+
+def approximate_budget() -> TokenBudget:
+    budget = TokenBudget()
+    budget._encoding = _ApproximateEncoding()
+    return budget
+
+
+# Each round line is 8 characters: 2 tokens, 3 with its newline
+ROUNDS = [f"round {n:02d}" for n in range(1, 6)]
+
+
+def test_everything_fits():
+    assert approximate_budget().fit_lines(ROUNDS, 100) == "\n".join(ROUNDS)
+    assert approximate_budget().fit_lines([], 100) == ""
+
+
+def test_newest_lines_kept_with_first_pinned():
+    # First line 3 tokens, then room for the two newest
+    result = approximate_budget().fit_lines(ROUNDS, 9)
+    assert result.split("\n") == ["round 01", "...", "round 04", "round 05"], result
+
+
+def test_without_pinning_only_newest():
+    result = approximate_budget().fit_lines(ROUNDS, 9, keep_first=False)
+    assert result.split("\n") == ["round 03", "round 04", "round 05"], result
+
+
+def test_first_line_dropped_when_it_alone_is_too_big():
+    lines = ["x" * 400] + ROUNDS[1:]
+    result = approximate_budget().fit_lines(lines, 6)
+    assert result.split("\n") == ["round 04", "round 05"], result
+
+
+def test_truncate():
+    budget = approximate_budget()
+    assert budget.truncate("short", 10) == "short"
+    assert budget.truncate("abcdefghijkl", 2) == "abcdefgh..."
+    assert budget.truncate("anything", 0) == "" and budget.truncate(None, 5) == ""
+    assert budget.count("abcdefghi") == 3 and budget.count(None) == 0
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"PASS {name}")
@@ -0,0 +1,150 @@
+"""Find the worker count and torch thread layout with the best analysis throughput.
+
+For every candidate configuration (workers x torch threads per worker x CPU
+pinning) this starts gunicorn with gunicorn.conf.py, sends a fixed number of
+/api/process-audio requests with a recording, several in flight per worker,
+and records throughput and latency percentiles. It then recommends the
+configuration with the highest throughput whose p95 latency meets the target,
+and prints the environment variables that select it. Admission control is
+relaxed during the runs so requests queue instead of being turned away.
+Linux only, and slow: every candidate loads the models afresh.
+
+Usage:
+    python tools/autotune_runtime.py --audio speech.webm --target-p95 20
+    python tools/autotune_runtime.py --audio speech.webm --workers 1 2 --threads 2 4 --requests 30
+"""
+import argparse
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import httpx
+
+from measure_worker_memory import BACKEND_DIR, wait_until_ready
+
+sys.path.insert(0, BACKEND_DIR)
+
+from services.runtime_config import numa_nodes, physical_cores  # noqa: E402
+
+# Requests in flight per worker: one per analysis slot keeps every slot busy
+IN_FLIGHT_PER_WORKER = int(os.getenv("ANALYSIS_SLOTS", "2"))
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def candidates(cores: int, workers: Optional[List[int]], threads: Optional[List[int]],
+               affinity: List[bool]) -> List[Dict[str, int]]:
+    """Powers of two workers up to the core count, each with a full and a half thread share by default"""
+    worker_counts = workers or sorted({w for w in (1, 2, 4, 8, 16) if w <= cores} | {cores})
+    configs = []
+    for count in worker_counts:
+        share = max(1, cores // count)
+        for thread_count in threads or sorted({share, max(1, share // 2)}):
+            for pinned in affinity:
+                configs.append({"workers": count, "threads": thread_count, "affinity": int(pinned)})
+    return configs
+
+
+def send(url: str, audio: bytes, filename: str, timeout: float) -> Dict[str, float]:
+    started = time.perf_counter()
+    try:
+        response = httpx.post(url, files={"file": (filename, audio)}, timeout=timeout)
+        status = str(response.status_code)
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    return {"seconds": time.perf_counter() - started, "ok": status == "200"}
+
+
+def measure(config: Dict[str, int], audio: bytes, filename: str, requests: int,
+            port: int, timeout: float) -> Dict[str, float]:
+    env = {
+        **os.environ,
+        "WEB_CONCURRENCY": str(config["workers"]),
+        "TORCH_INTRA_OP_THREADS": str(config["threads"]),
+        "CPU_AFFINITY": str(config["affinity"]),
+        "BIND": f"127.0.0.1:{port}",
+        "ANALYSIS_DEADLINE_SECONDS": "3600",
+    }
+    master = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}/api/process-audio"
+    in_flight = config["workers"] * IN_FLIGHT_PER_WORKER
+    try:
+        wait_until_ready(f"http://127.0.0.1:{port}/", master, config["workers"], timeout)
+        with ThreadPoolExecutor(max_workers=in_flight) as pool:
+            # One untimed round so each worker has run every model once
+            list(pool.map(lambda _: send(url, audio, filename, timeout), range(in_flight)))
+            started = time.perf_counter()
+            results = list(pool.map(lambda _: send(url, audio, filename, timeout), range(requests)))
+            elapsed = time.perf_counter() - started
+    finally:
+        master.send_signal(signal.SIGTERM)
+        try:
+            master.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            master.kill()
+
+    latencies = [result["seconds"] for result in results if result["ok"]]
+    return {
+        **config,
+        "per_min": round(len(latencies) / elapsed * 60, 2),
+        "p50": round(statistics.median(latencies), 2) if latencies else float("inf"),
+        "p95": round(percentile(latencies, 95), 2) if latencies else float("inf"),
+        "errors": len(results) - len(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--audio", required=True, help="Recording to upload, in any format ffmpeg reads")
+    parser.add_argument("--target-p95", type=float, default=30.0, help="Latency target in seconds")
+    parser.add_argument("--requests", type=int, default=20, help="Timed requests per configuration")
+    parser.add_argument("--workers", type=int, nargs="+", help="Worker counts to try")
+    parser.add_argument("--threads", type=int, nargs="+", help="torch intra-op threads per worker to try")
+    parser.add_argument("--affinity", choices=["on", "off", "both"], default="both")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds to wait for a server or a request")
+    args = parser.parse_args()
+
+    with open(args.audio, "rb") as f:
+        audio = f.read()
+    filename = os.path.basename(args.audio)
+    cores = len(physical_cores())
+    affinity = {"on": [True], "off": [False], "both": [False, True]}[args.affinity]
+    configs = candidates(cores, args.workers, args.threads, affinity)
+    print(f"{cores} physical cores, {os.cpu_count()} logical CPUs, {numa_nodes()} NUMA node(s); "
+          f"{len(configs)} configurations, p95 target {args.target_p95:.1f}s")
+
+    columns = ("workers", "threads", "affinity", "per_min", "p50", "p95", "errors")
+    print("".join(f"{name:>10}" for name in columns))
+    rows = []
+    for config in configs:
+        row = measure(config, audio, filename, args.requests, args.port, args.timeout)
+        rows.append(row)
+        print("".join(f"{row[name]:>10}" for name in columns))
+
+    meeting = [row for row in rows if row["p95"] <= args.target_p95 and not row["errors"]]
+    if meeting:
+        best = max(meeting, key=lambda row: row["per_min"])
+        print(f"\nBest throughput within the p95 target: {best['per_min']} analyses/min at p95 {best['p95']}s")
+    else:
+        best = min(rows, key=lambda row: row["p95"])
+        print(f"\nNo configuration met the p95 target; lowest p95 is {best['p95']}s")
+    print(f"WEB_CONCURRENCY={best['workers']} TORCH_INTRA_OP_THREADS={best['threads']} CPU_AFFINITY={best['affinity']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Measure the bucketed emotion model against plain eager inference on CPU.
+
+For each input length, times the original path (the model called eagerly on
+the exact input length) and the bucketed path for each backend (input padded
+to its bucket and run through a traced or compiled graph). Graph build time
+is reported separately and excluded from the per-call numbers, as it is paid
+once per worker at startup. The last column is the largest absolute
+difference in logits from eager: the mask keeps padding out of attention and
+pooling, but wav2vec2-base's group norm still sees it, so expect small drift.
+
+Usage:
+    python tools/benchmark_emotion.py --lengths 3 7 12 25 --runs 10
+    python tools/benchmark_emotion.py --backends trace compile --threads 4
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+import torch
+from transformers import AutoFeatureExtractor, AutoModelForAudioClassification
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.emotion_runtime import BucketedEmotionModel  # noqa: E402
+
+
+def time_calls(fn, runs: int) -> float:
+    """Median milliseconds per call, after one untimed call"""
+    fn()
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="superb/wav2vec2-base-superb-er")
+    parser.add_argument("--lengths", type=float, nargs="+", default=[3, 7, 12, 25], help="Input lengths in seconds")
+    parser.add_argument("--backends", nargs="+", default=["trace"], choices=["trace", "compile"])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads; 0 keeps the default")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    extractor = AutoFeatureExtractor.from_pretrained(args.model)
+    model = AutoModelForAudioClassification.from_pretrained(args.model).eval()
+    sr = extractor.sampling_rate
+
+    classifiers = {}
+    for backend in args.backends:
+        classifier = BucketedEmotionModel(model, sr=sr, backend=backend)
+        started = time.perf_counter()
+        classifier.warm_up()
+        classifiers[backend] = classifier
+        print(f"{backend}: built {len(classifier.buckets)} bucket graphs in {time.perf_counter() - started:.1f}s")
+    print(f"torch threads: {torch.get_num_threads()}")
+
+    rng = np.random.default_rng(0)
+    header = f"{'seconds':>8}{'eager_ms':>10}" + "".join(f"{name + '_ms':>12}{'speedup':>9}{'max_diff':>10}" for name in classifiers)
+    print(header)
+    for seconds in args.lengths:
+        y = (0.1 * rng.standard_normal(int(seconds * sr))).astype(np.float32)
+        values = extractor(y, sampling_rate=sr, return_tensors="np").input_values[0]
+        tensor = torch.from_numpy(values)[None]
+
+        def eager():
+            with torch.no_grad():
+                return model(input_values=tensor).logits
+
+        eager_ms = time_calls(eager, args.runs)
+        reference = eager()
+        row = f"{seconds:>8.1f}{eager_ms:>10.1f}"
+        for classifier in classifiers.values():
+            bucketed_ms = time_calls(lambda: classifier.logits(values), args.runs)
+            diff = (classifier.logits(values) - reference).abs().max().item()
+            row += f"{bucketed_ms:>12.1f}{eager_ms / bucketed_ms:>8.2f}x{diff:>10.4f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
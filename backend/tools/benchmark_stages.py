@@ -0,0 +1,74 @@
+"""Compare sequential and concurrent analysis stages for a single request.
+
+Loads the real models once, then analyses the same recording with the stage
+pool switched off (stages one after another) and on (tone and tempo run
+beside transcription). For each mode it reports the median end-to-end
+latency next to the sum and the maximum of the per-stage times: sequential
+latency tracks the sum, concurrent latency should approach the slowest
+stage. Run it on a multi-core CPU with a speech recording of realistic length.
+
+Usage:
+    python tools/benchmark_stages.py --audio speech.wav --runs 5
+    TORCH_INTRA_OP_THREADS=8 python tools/benchmark_stages.py --audio speech.wav
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_analysis import audio_analyzer  # noqa: E402
+from services.stage_pool import stage_pool  # noqa: E402
+
+
+def run_mode(audio_path: str, concurrent: bool, runs: int) -> Dict[str, float]:
+    stage_pool.concurrent = concurrent
+    # One untimed pass so lazy initialisation is not charged to either mode
+    audio_analyzer.analyze_audio(audio_path)
+
+    latencies: List[float] = []
+    stage_times: Dict[str, List[float]] = {}
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = audio_analyzer.analyze_audio(audio_path)
+        latencies.append(time.perf_counter() - started)
+        if result["status"] != "success":
+            raise RuntimeError(result["message"])
+        for stage, seconds in result["analysis"]["stage_seconds"].items():
+            stage_times.setdefault(stage, []).append(seconds)
+
+    medians = {stage: statistics.median(times) for stage, times in stage_times.items()}
+    return {
+        "latency": statistics.median(latencies),
+        "stage_sum": sum(medians.values()),
+        "stage_max": max(medians.values()),
+        **medians,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--audio", required=True, help="WAV file to analyse")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"CPU cores: {os.cpu_count()}, torch intra-op threads: {torch.get_num_threads()}")
+    rows = {
+        "sequential": run_mode(args.audio, False, args.runs),
+        "concurrent": run_mode(args.audio, True, args.runs),
+    }
+    columns = ["latency", "stage_sum", "stage_max", "transcript", "tone", "tempo", "prosody"]
+    print(f"{'mode':>12}" + "".join(f"{name:>11}" for name in columns) + "   (median seconds)")
+    for mode, row in rows.items():
+        print(f"{mode:>12}" + "".join(f"{row.get(name, 0.0):>11.3f}" for name in columns))
+    speedup = rows["sequential"]["latency"] / rows["concurrent"]["latency"]
+    print(f"Concurrent speedup: {speedup:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
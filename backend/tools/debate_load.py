@@ -0,0 +1,124 @@
+"""Concurrent debate load generator for app.py.
+
+Simulates N users, each running full start -> rounds -> final debates against
+the backend, then reports throughput, latency percentiles and error rates per
+endpoint. Pair with tools/fake_openrouter.py to measure capacity offline.
+
+Usage:
+    python tools/debate_load.py --users 20 --debates-per-user 3 --rounds 3
+"""
+import argparse
+import asyncio
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import httpx
+
+SPEECHES = [
+    "Good afternoon. Artificial intelligence should be regulated because unchecked systems already "
+    "make decisions about credit, hiring and policing without accountability.",
+    "My opponent claims regulation stifles innovation, but clear rules create the trust that "
+    "adoption depends on, just as safety standards did for aviation.",
+    "In closing, the question is not whether AI will be governed, but whether it will be governed "
+    "deliberately by the public or by default by a few companies.",
+]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.completed_debates = 0
+
+    def record(self, name: str, seconds: float, status: str):
+        self.latencies[name].append(seconds)
+        if status != "200":
+            self.errors[name][status] += 1
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def timed(client: httpx.AsyncClient, recorder: Recorder, name: str, method: str, url: str, **kwargs):
+    started = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kwargs)
+        status = str(response.status_code)
+    except httpx.HTTPError as e:
+        response, status = None, type(e).__name__
+    recorder.record(name, time.perf_counter() - started, status)
+    return response if status == "200" else None
+
+
+async def run_debate(client: httpx.AsyncClient, recorder: Recorder, rounds: int, user: int):
+    response = await timed(client, recorder, "start", "POST", "/api/debate/start", json={
+        "topic": "Should AI be regulated?",
+        "user_side": "affirmative" if user % 2 == 0 else "negative",
+        "total_rounds": rounds
+    })
+    if response is None:
+        return
+    session_id = response.json()["session_id"]
+
+    for round_number in range(1, rounds + 1):
+        name = "opening" if round_number == 1 else "final" if round_number == rounds else "middle"
+        speech = SPEECHES[min(round_number - 1, len(SPEECHES) - 1)]
+        response = await timed(client, recorder, f"round_{name}", "POST", "/api/debate/round",
+                               data={"session_id": session_id, "transcript": speech})
+        if response is None:
+            return
+        if response.json().get("session_complete"):
+            break
+    recorder.completed_debates += 1
+
+
+async def run_user(client: httpx.AsyncClient, recorder: Recorder, args: argparse.Namespace, user: int):
+    for _ in range(args.debates_per_user):
+        await run_debate(client, recorder, args.rounds, user)
+        if args.think_time:
+            await asyncio.sleep(args.think_time)
+
+
+async def run(args: argparse.Namespace):
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(run_user(client, recorder, args, user) for user in range(args.users)))
+        elapsed = time.perf_counter() - started
+    report(recorder, elapsed)
+
+
+def report(recorder: Recorder, elapsed: float):
+    total_requests = sum(len(v) for v in recorder.latencies.values())
+    total_errors = sum(sum(v.values()) for v in recorder.errors.values())
+    print(f"\nElapsed: {elapsed:.1f}s")
+    print(f"Debates completed: {recorder.completed_debates} ({recorder.completed_debates / elapsed:.2f}/s)")
+    print(f"Requests: {total_requests} ({total_requests / elapsed:.2f}/s), "
+          f"errors: {total_errors} ({100 * total_errors / max(1, total_requests):.1f}%)\n")
+    print(f"{'endpoint':<16}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}  errors")
+    for name, values in sorted(recorder.latencies.items()):
+        errors = ", ".join(f"{code}x{count}" for code, count in sorted(recorder.errors[name].items())) or "-"
+        print(f"{name:<16}{len(values):>7}"
+              f"{percentile(values, 50) * 1000:>10.0f}{percentile(values, 95) * 1000:>10.0f}"
+              f"{percentile(values, 99) * 1000:>10.0f}{max(values) * 1000:>10.0f}  {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--users", type=int, default=10, help="Concurrent simulated users")
+    parser.add_argument("--debates-per-user", type=int, default=1)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--think-time", type=float, default=0.0, help="Seconds between debates per user")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
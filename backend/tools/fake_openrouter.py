@@ -0,0 +1,209 @@
+"""Local stand-in for the OpenRouter (OpenAI-compatible) chat completions API.
+
+Serves canned JSON that matches the schemas DebateService (including topic
+prefetch and the fanned-out closing-round sections) and generate_ai_feedback
+ask for. Latency, error rates and malformed output can be
+configured, so capacity work can run offline and without spending credits.
+
+Usage:
+    python tools/fake_openrouter.py --port 8001 --latency lognormal:1.5,0.5 --error-rate 0.02
+    OPENROUTER_BASE_URL=http://localhost:8001/v1 OPENROUTER_API_KEY=fake uvicorn app:app
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from typing import Callable, Dict
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """Build a latency sampler from 'fixed:S', 'uniform:LO,HI' or 'lognormal:MEDIAN,SIGMA'"""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "lognormal":
+        mu = math.log(values[0])
+        return lambda: random.lognormvariate(mu, values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def _scores(*names: str) -> Dict[str, int]:
+    return {name: random.randint(55, 95) for name in names}
+
+
+def canned_response(prompt: str) -> Dict:
+    """Pick a canned JSON body matching the schema the prompt asks for"""
+    if "opposing_arguments" in prompt:
+        return {
+            "opposing_arguments": [
+                "Heavy regulation slows innovation and pushes AI research to less careful jurisdictions.",
+                "Regulation written today will be obsolete tomorrow, and compliance burdens fall hardest on small developers.",
+                "Existing consumer protection and anti-discrimination law already covers most AI harms.",
+                "Regulators lack the technical expertise to write rules that are both effective and enforceable."
+            ],
+            "rebuttal_prompts": [
+                "Which jurisdictions have regulated technology without losing their research base?",
+                "How can principles-based rules stay current as the technology changes?",
+                "Where do existing laws fail to reach automated decisions?",
+                "What institutions already combine technical and regulatory expertise?"
+            ],
+            "evidence_angles": ["EU AI Act risk tiers", "Aviation and medical device certification", "Documented algorithmic bias audits"]
+        }
+    # Closing-round judging is requested as three separate sections
+    if "key_strengths" in prompt:
+        return {
+            "overall_score": random.randint(55, 95),
+            "key_strengths": ["Clear structure", "Direct rebuttals"],
+            "areas_for_improvement": ["More evidence", "Stronger closing line"],
+            "final_feedback": "A well organised case that would benefit from concrete evidence."
+        }
+    if "summary_quality" in prompt:
+        return {
+            **_scores("summary_quality", "rebuttal_handling", "argument_strength", "persuasiveness"),
+            "key_points_covered": ["Restated the core harm", "Answered the innovation point"],
+            "missed_opportunities": ["Quantify the risk", "Cite a precedent"]
+        }
+    if "delivery_score" in prompt:
+        return {
+            **_scores("delivery_score", "tone_score", "pace_score", "clarity_score"),
+            "tone_analysis": "Confident and steady.",
+            "pace_analysis": "Comfortable pace with a rushed ending.",
+            "clarity_analysis": "Clear enunciation throughout."
+        }
+    if "points_addressed" in prompt:
+        return {
+            "content_analysis": {
+                **_scores("relevance_score", "logical_consistency", "persuasiveness"),
+                "fallacies_identified": ["Slippery slope"],
+                "points_addressed": ["Innovation cost"],
+                "points_missed": ["Enforcement feasibility"]
+            },
+            "delivery_analysis": {
+                **_scores("pace_score", "tone_score", "clarity_score"),
+                "filler_word_count": random.randint(0, 6),
+                "wpm": random.randint(120, 175),
+                "tone_analysis": "Assertive.",
+                "pace_analysis": "Slightly fast.",
+                "clarity_analysis": "Mostly clear."
+            },
+            "feedback_summary": "You engaged the opposing point directly but left enforcement unaddressed.",
+            "suggested_improvements": ["Signpost each rebuttal", "Close with impact"],
+            "opponent_counter": "Regulation written today will be obsolete tomorrow, and the compliance burden falls hardest on small developers."
+        }
+    if "key_points_identified" in prompt:
+        return {
+            "content_analysis": {
+                **_scores("structure_score", "clarity_score", "argument_strength"),
+                "key_points_identified": ["Privacy", "Bias", "Autonomy"],
+                "missing_elements": ["Evidence", "Definition of regulation"]
+            },
+            "delivery_analysis": {
+                **_scores("pace_score", "tone_score", "pauses_score"),
+                "filler_word_count": random.randint(0, 6),
+                "wpm": random.randint(120, 175),
+                "tone_analysis": "Measured and confident.",
+                "pace_analysis": "Even pace."
+            },
+            "feedback_summary": "A clear opening with three strong themes that need supporting evidence.",
+            "suggested_improvements": ["Define the motion", "Add one statistic per point"],
+            "opponent_argument": "Heavy regulation slows innovation and pushes AI research to less careful jurisdictions."
+        }
+    return {
+        "suggestions": ["Slow down in the introduction", "Reduce filler words", "End with a call to action"],
+        "feedback": "Well structured speech with good energy; tighten transitions between sections.",
+        "score": random.randint(55, 95),
+        "counter_arguments": ["Cost of implementation", "Unintended consequences"],
+        "delivery_tips": "Pause after key points.",
+        "evidence_suggestions": "Cite a recent study."
+    }
+
+
+def create_app(args: argparse.Namespace) -> FastAPI:
+    app = FastAPI(title="Fake OpenRouter")
+    sample_latency = parse_latency(args.latency)
+    stats = {"requests": 0, "errors": 0, "rate_limited": 0, "stalled": 0, "malformed": 0}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+
+        roll = random.random()
+        if roll < args.stall_rate:
+            stats["stalled"] += 1
+            await asyncio.sleep(args.stall_seconds)
+        else:
+            await asyncio.sleep(max(0.0, sample_latency()))
+
+        roll = random.random()
+        if roll < args.rate_limit_rate:
+            stats["rate_limited"] += 1
+            return JSONResponse(
+                status_code=429,
+                content={"error": {"message": "Rate limit exceeded", "code": 429}},
+                headers={"Retry-After": str(args.retry_after)}
+            )
+        if roll < args.rate_limit_rate + args.error_rate:
+            stats["errors"] += 1
+            return JSONResponse(status_code=502, content={"error": {"message": "Upstream error", "code": 502}})
+
+        content = json.dumps(canned_response(prompt))
+        if random.random() < args.malformed_rate:
+            stats["malformed"] += 1
+            # Mimic the usual failure modes: fenced output or a completion cut off mid-object
+            content = f"```json\n{content}\n```" if random.random() < 0.5 else content[: len(content) * 2 // 3]
+
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake-model"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": len(prompt) // 4,
+                "completion_tokens": len(content) // 4,
+                "total_tokens": (len(prompt) + len(content)) // 4
+            }
+        }
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", default="lognormal:1.0,0.4",
+                        help="fixed:S | uniform:LO,HI | lognormal:MEDIAN,SIGMA (seconds)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 502")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="Fraction of requests that stall")
+    parser.add_argument("--stall-seconds", type=float, default=60.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0,
+                        help="Fraction of responses that are fenced or truncated JSON")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Measure per-worker and total memory of app.py as the worker count grows.
+
+Starts gunicorn with gunicorn.conf.py for each worker count, waits until the
+server answers, then reads /proc/<pid>/smaps_rollup for the master and every
+worker. RSS counts shared pages once per process, so PSS (shared pages split
+between the processes mapping them) is the number to sum for the real total.
+Run with --no-preload to compare against one model copy per worker. Linux only.
+
+Usage:
+    python tools/measure_worker_memory.py --workers 1 2 4
+    python tools/measure_worker_memory.py --workers 1 2 4 --no-preload
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def read_rollup(pid: int) -> Dict[str, int]:
+    """Memory counters for one process, in MiB"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            key = parts[0].rstrip(":")
+            if key in FIELDS:
+                values[key] = int(parts[1]) // 1024
+    return values
+
+
+def child_pids(pid: int) -> List[int]:
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(child) for child in f.read().split()]
+
+
+def wait_until_ready(url: str, master: subprocess.Popen, workers: int, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if master.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with code {master.returncode}")
+        try:
+            if httpx.get(url, timeout=2).status_code == 200 and len(child_pids(master.pid)) >= workers:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(1)
+    raise TimeoutError(f"Server not ready after {timeout:.0f}s")
+
+
+def measure(workers: int, preload: bool, port: int, timeout: float) -> Dict[str, int]:
+    env = {
+        **os.environ,
+        "WEB_CONCURRENCY": str(workers),
+        "PRELOAD_APP": "1" if preload else "0",
+        "BIND": f"127.0.0.1:{port}",
+    }
+    master = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_ready(f"http://127.0.0.1:{port}/", master, workers, timeout)
+        # Let workers finish any lazy initialisation triggered by the first request
+        time.sleep(2)
+        master_mem = read_rollup(master.pid)
+        worker_mems = [read_rollup(pid) for pid in child_pids(master.pid)]
+    finally:
+        master.send_signal(signal.SIGTERM)
+        try:
+            master.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            master.kill()
+
+    everyone = [master_mem] + worker_mems
+    return {
+        "workers": workers,
+        "master_rss": master_mem["Rss"],
+        "worker_rss": max(mem["Rss"] for mem in worker_mems),
+        "worker_private": max(mem["Private_Clean"] + mem["Private_Dirty"] for mem in worker_mems),
+        "total_rss": sum(mem["Rss"] for mem in everyone),
+        "total_pss": sum(mem["Pss"] for mem in everyone),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--no-preload", action="store_true", help="Load the models separately in each worker")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds to wait for models to load")
+    args = parser.parse_args()
+
+    mode = "one copy per worker" if args.no_preload else "preload-then-fork"
+    print(f"Mode: {mode} (all values MiB)")
+    header = ("workers", "master_rss", "worker_rss", "worker_private", "total_rss", "total_pss")
+    print("".join(f"{name:>16}" for name in header))
+    for workers in args.workers:
+        row = measure(workers, not args.no_preload, args.port, args.timeout)
+        print("".join(f"{row[name]:>16}" for name in header))
+
+
+if __name__ == "__main__":
+    main()
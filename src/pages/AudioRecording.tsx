@@ -328,10 +328,10 @@ const AudioRecording = () => {
       const analysisResult = await analysisResponse.json();
       console.log('Audio analysis:', analysisResult);
 
-      // Calculate WPM (words per minute)
+      // Speaking rate comes from the backend's word timestamps; fall back to the
+      // recording timer only if an older backend did not send one
       const wordCount = analysisResult.transcript.split(/\s+/).length;
-      const minutes = elapsedTime / 60;
-      const wpm = Math.round(wordCount / minutes) || 0;
+      const wpm = Math.round(analysisResult.analysis?.wpm ?? wordCount / (elapsedTime / 60)) || 0;
 
       // Create real audio analysis data
       const audioAnalysis = {